@@ -1,41 +1,72 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g, abort
 from flask_cors import CORS
-from cerebras.cloud.sdk import Cerebras
 import os
 from dotenv import load_dotenv
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
 from models import db, User, Chat, Message
+from history import chat_history, HISTORY_LIMIT
+from chat_turns import ChatTurnRecord
+from transfer import export_gzip, import_lines, ImportFormatError
+from search import search_messages, SearchUnavailable
+from fallback import fallback_responder
+from context import (
+    build_context, split_history, rolling_summaries, estimate_tokens, message_tokens, SUMMARY_TOKEN_BUDGET,
+)
+from hedging import model_dispatcher
+from model_health import model_health, ModelsUnavailableError
+from response_cache import response_cache, cache_key as prompt_key
+from coalesce import single_flight, async_single_flight, stream_flights, worker_flight_lock
+from rate_limit import rate_limiter, client_ip
+from pagination import keyset_page, page_size, InvalidCursor
+from etags import etag_for, not_modified, conditional, bump_user_chats, bump_chat_owner
+from migrations import run_migrations
+from db_config import database_url, engine_options, redact_url
+from supabase_sync import SupabaseSyncWorker
+from jobs import create_job_runner
+from clients import LazyClient, preload
+from json_provider import FastJSONProvider
+from logs import get_logger
+from metrics import (
+    registry, instrument_engines, HTTP_REQUESTS, HTTP_LATENCY, MODEL_CALL_LATENCY, MODEL_TTFT, CACHE_LOOKUPS,
+    RATE_LIMITED,
+)
+from sqlalchemy import update
 from datetime import datetime
-import threading
 import base64
-
-try:
-    from supabase import create_client, Client
-except ImportError:
-    create_client = None
-    Client = None
-
+import gzip
+import io
+import json
+import time
+import threading
 
 # Load environment variables
 load_dotenv()
 
+log = get_logger('app')
+# Time every database statement for /metrics
+instrument_engines()
+
 app = Flask(__name__)
+# orjson for jsonify() and request.json when installed; datetimes render as ISO 8601
+app.json = FastJSONProvider(app)
 
 # Enable CORS with explicit settings for Production
+CORS_ORIGINS = ["https://zara-ai-sri.vercel.app", "http://localhost:3000", "http://localhost:3005"]
 CORS(app, resources={
     r"/api/*": {
-        "origins": ["https://zara-ai-sri.vercel.app", "http://localhost:3000", "http://localhost:3005"],
+        "origins": CORS_ORIGINS,
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization", "Access-Control-Allow-Origin"],
+        "allow_headers": ["Content-Type", "Authorization", "Access-Control-Allow-Origin", "If-None-Match"],
+        "expose_headers": ["X-Before-Cursor", "X-After-Cursor", "X-Next-Offset", "ETag"],
         "supports_credentials": True
     }
 })
 
 @app.errorhandler(500)
 def internal_error(error):
-    print(f"Server Error: {error}")
+    log.error("Server error", error=str(error))
     response = jsonify({'error': 'Internal Server Error', 'msg': str(error)})
     return response, 500
 
@@ -46,11 +77,14 @@ def not_found(error):
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024 # 50MB limit
 
 # Database Configuration
+# DATABASE_URL selects the backend (e.g. PostgreSQL); without it we use a local SQLite file.
 # Use absolute path for safety on Render
 basedir = os.path.abspath(os.path.dirname(__file__))
 db_path = os.path.join(basedir, 'zara.db')
-app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+app.config['SQLALCHEMY_DATABASE_URI'] = database_url(db_path)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Pool and connection tuning for the chosen backend (WAL pragmas for SQLite, pre-ping for Postgres)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'super-secret-key-change-me')
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = 3600 * 24 * 30  # 30 days in seconds
 
@@ -67,22 +101,17 @@ def init_db_if_needed():
     if is_db_initialized:
         return
 
-    # Use absolute path for safety on Render
-    print(f"Checking database at: {db_path}")
-    if not os.path.exists(db_path):
-        print("Database file not found. Creating tables...")
-        with app.app_context():
-            try:
-                db.create_all()
-                print("Database tables created successfully!")
-                is_db_initialized = True
-            except Exception as e:
-                print(f"Error creating database tables: {e}")
-    else:
-        print("Database file exists. Skipping creation.")
-        is_db_initialized = True
+    log.info("Checking database", url=redact_url(app.config['SQLALCHEMY_DATABASE_URI']))
+    # Migrations create a fresh database and upgrade existing zara.db files in place
+    with app.app_context():
+        try:
+            applied = run_migrations(db.engine)
+            log.info("Database schema up to date", applied=applied or 'none')
+            is_db_initialized = True
+        except Exception as e:
+            log.error("Error migrating database", error=str(e))
 
-print("App loaded. Database will compile on first request.")
+log.info("App loaded. Database will compile on first request.")
 
 @jwt.expired_token_loader
 def expired_token_callback(jwt_header, jwt_payload):
@@ -99,29 +128,59 @@ def missing_token_callback(error):
 # Configure Supabase (Optional)
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase = None
 
-if SUPABASE_URL and SUPABASE_KEY and create_client:
-    try:
-        supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        print("Supabase Client configured successfully!")
-    except Exception as e:
-        print(f"Failed to configure Supabase: {e}")
+def create_supabase_client():
+    if not (SUPABASE_URL and SUPABASE_KEY):
+        return None
+    # supabase pulls in a large dependency tree, so it is only imported when first used
+    from supabase import create_client
+    client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    log.info("Supabase client configured")
+    return client
+
+supabase = LazyClient('Supabase client', create_supabase_client)
+
+def create_supabase_sync():
+    # Only once the client resolves: a worker without one would keep every row in its outbox forever
+    if not (SUPABASE_URL and SUPABASE_KEY):
+        return None
+    if supabase.get() is None:
+        log.warning("Supabase sync disabled: the Supabase client could not be created")
+        return None
+    return SupabaseSyncWorker(supabase.get)
+
+# One bounded, batching sync pipeline instead of a thread per row; built by
+# the first sync job, so the client is resolved off the request path
+supabase_sync = LazyClient('Supabase sync', create_supabase_sync)
+
+# Work that can wait until the reply is sent (titles, summaries, Supabase mirroring)
+background_jobs = create_job_runner(app.app_context)
 
 # Configure Cerebras API
 # Always read from environment variables (Render or local)
 CEREBRAS_API_KEY = os.getenv("CEREBRAS_API_KEY")
 
-cerebras_client = None
 if not CEREBRAS_API_KEY:
-    print("WARNING: CEREBRAS_API_KEY not found!")
-else:
-    print("CEREBRAS_API_KEY loaded successfully")
-    try:
-        cerebras_client = Cerebras(api_key=CEREBRAS_API_KEY)
-        print("Cerebras Client initialized successfully!")
-    except Exception as e:
-        print(f"Failed to initialize Cerebras client: {e}")
+    log.warning("CEREBRAS_API_KEY not found")
+
+def create_cerebras_client():
+    if not CEREBRAS_API_KEY:
+        return None
+    from cerebras.cloud.sdk import Cerebras
+    client = Cerebras(api_key=CEREBRAS_API_KEY)
+    log.info("Cerebras client initialized")
+    return client
+
+cerebras = LazyClient('Cerebras client', create_cerebras_client)
+
+def load_semantic_cache():
+    # numpy and the on-disk index load with the first chat turn, not at import
+    from semantic_cache import semantic_cache
+    return semantic_cache
+
+semantic = LazyClient('Semantic cache', load_semantic_cache)
+
+preload(supabase, supabase_sync, cerebras, semantic)
 
 ZARA_SYSTEM_PROMPT = """
 You are Zara, a highly intelligent, emotionally aware, and human-like AI assistant created and deployed by Sri.
@@ -215,20 +274,13 @@ def register():
         db.session.commit()
         
         # Sync to Supabase in background
-        if supabase:
-            def sync_user():
-                try:
-                    supabase.table('users').insert({
-                        'username': username,
-                        'email': email,
-                        # 'password_hash': hashed_password, # Removed as this column doesn't exist in Supabase
-                        'created_at': datetime.utcnow().isoformat()
-                    }).execute()
-                    print(f"User {email} synced to Supabase")
-                except Exception as se:
-                    print(f"Supabase Sync Error (Register): {se}")
-            
-            threading.Thread(target=sync_user).start()
+        if SUPABASE_URL and SUPABASE_KEY:
+            background_jobs.enqueue('supabase_sync', table='users', row={
+                'username': username,
+                'email': email,
+                # 'password_hash': hashed_password, # Removed as this column doesn't exist in Supabase
+                'created_at': datetime.utcnow().isoformat()
+            })
 
         # Auto login after register
         access_token = create_access_token(identity=str(new_user.id))
@@ -250,10 +302,11 @@ def login():
     user = User.query.filter_by(email=email).first()
 
     # If user not found locally (Render reset), check Supabase
-    if not user and supabase:
+    supabase_client = supabase.get() if not user else None
+    if supabase_client:
         try:
-            print(f"User {email} not found locally. Checking Supabase...")
-            sb_response = supabase.table('users').select('*').eq('email', email).execute()
+            log.info("User not found locally, checking Supabase", email=email)
+            sb_response = supabase_client.table('users').select('*').eq('email', email).execute()
             if sb_response.data:
                 sb_user = sb_response.data[0]
                 # Restore user to local DB
@@ -265,9 +318,9 @@ def login():
                 db.session.add(new_user)
                 db.session.commit()
                 user = new_user
-                print(f"User {email} restored from Supabase!")
+                log.info("User restored from Supabase", email=email)
         except Exception as e:
-            print(f"Supabase Login Recovery Error: {e}")
+            log.error("Supabase login recovery error", error=str(e))
 
     if user and bcrypt.check_password_hash(user.password, password):
         access_token = create_access_token(identity=str(user.id))
@@ -288,8 +341,8 @@ def get_current_user():
     # If user not found locally (Render reset), try to restore via email from JWT if possible
     # but since ID might change on reset, we usually identify by email.
     # For now, let's at least try the Supabase check if we can't find the user.
-    if not user and supabase:
-        print(f"User ID {current_user_id} not found locally. Session may need re-login or restoration.")
+    if not user and supabase.get():
+        log.warning("User not found locally; session may need re-login", user_id=current_user_id)
         return jsonify({'error': 'User not found', 'msg': 'Please login again to sync your account.'}), 404
         
     if not user:
@@ -297,12 +350,58 @@ def get_current_user():
     return jsonify(user.to_dict()), 200
 
 # Chat Endpoints
+def wants_pagination():
+    """List endpoints page only when asked to, so older clients keep getting the full list"""
+    return any(key in request.args for key in ('limit', 'before', 'after'))
+
+def paginated_response(items, older_cursor, newer_cursor, etag):
+    """
+    Keep the plain-list body of the unpaginated endpoints; cursors travel in
+    headers. X-Before-Cursor is only set while older items remain.
+    """
+    response = conditional(jsonify(items), etag)
+    if older_cursor:
+        response.headers['X-Before-Cursor'] = older_cursor
+    if newer_cursor:
+        response.headers['X-After-Cursor'] = newer_cursor
+    return response, 200
+
+def chat_list_query(user_id):
+    """The user's chats as plain LIST_COLUMNS rows: no ORM objects to build or track"""
+    return db.session.query(*(getattr(Chat, name) for name in Chat.LIST_COLUMNS)).filter(Chat.user_id == user_id)
+
+def message_list_query(chat_id):
+    """A chat's messages as plain LIST_COLUMNS rows (also EXPLAINed by check_query_plan.py)"""
+    return db.session.query(*(getattr(Message, name) for name in Message.LIST_COLUMNS)).filter(
+        Message.chat_id == chat_id)
+
 @app.route('/api/chats', methods=['GET'])
 @jwt_required()
 def get_user_chats():
     current_user_id = get_jwt_identity()
-    chats = Chat.query.filter_by(user_id=current_user_id).order_by(Chat.created_at.desc()).all()
-    return jsonify([chat.to_dict() for chat in chats]), 200
+    # Read before the rows: a write landing in between only makes the next request refetch
+    chats_version = db.session.query(User.chats_version).filter(User.id == int(current_user_id)).scalar()
+    etag = etag_for('chats', current_user_id, chats_version, request.query_string.decode())
+    if not_modified(request, etag):
+        return conditional(Response(status=304), etag)
+
+    query = chat_list_query(int(current_user_id))
+
+    if not wants_pagination():
+        chats = query.order_by(Chat.created_at.desc()).all()
+        return conditional(jsonify([Chat.row_dict(chat) for chat in chats]), etag), 200
+
+    try:
+        chats, older_cursor, newer_cursor = keyset_page(
+            query, Chat.created_at, Chat.id,
+            before=request.args.get('before'),
+            after=request.args.get('after'),
+            limit=page_size(request.args.get('limit')),
+            newest_first=True,
+        )
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    return paginated_response([Chat.row_dict(chat) for chat in chats], older_cursor, newer_cursor, etag)
 
 @app.route('/api/chats', methods=['POST'])
 @jwt_required()
@@ -313,6 +412,7 @@ def create_chat():
     
     new_chat = Chat(user_id=current_user_id, title=title)
     db.session.add(new_chat)
+    db.session.execute(bump_user_chats(int(current_user_id)))
     db.session.commit()
     
     return jsonify(new_chat.to_dict()), 201
@@ -321,13 +421,34 @@ def create_chat():
 @jwt_required()
 def get_chat_messages(chat_id):
     current_user_id = get_jwt_identity()
-    chat = Chat.query.get_or_404(chat_id)
-    
+    # Ownership and the ETag from the chat row alone; a 304 never reads a message
+    chat = db.session.query(Chat.user_id, Chat.version, Chat.created_at).filter(Chat.id == chat_id).first()
+    if chat is None:
+        abort(404)
+
     if chat.user_id != int(current_user_id):
         return jsonify({'error': 'Unauthorized'}), 403
-        
-    messages = Message.query.filter_by(chat_id=chat_id).order_by(Message.timestamp).all()
-    return jsonify([msg.to_dict() for msg in messages]), 200
+
+    etag = etag_for('messages', chat_id, chat.created_at.isoformat(), chat.version, request.query_string.decode())
+    if not_modified(request, etag):
+        return conditional(Response(status=304), etag)
+
+    query = message_list_query(chat_id)
+
+    if not wants_pagination():
+        messages = query.order_by(Message.timestamp, Message.id).all()
+        return conditional(jsonify([Message.row_dict(msg) for msg in messages]), etag), 200
+
+    try:
+        messages, older_cursor, newer_cursor = keyset_page(
+            query, Message.timestamp, Message.id,
+            before=request.args.get('before'),
+            after=request.args.get('after'),
+            limit=page_size(request.args.get('limit')),
+        )
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    return paginated_response([Message.row_dict(msg) for msg in messages], older_cursor, newer_cursor, etag)
 
 @app.route('/api/chats/<int:chat_id>', methods=['DELETE'])
 @jwt_required()
@@ -341,7 +462,10 @@ def delete_chat(chat_id):
     # Delete all messages in the chat first (foreign key constraint if not cascade)
     Message.query.filter_by(chat_id=chat_id).delete()
     db.session.delete(chat)
+    db.session.execute(bump_user_chats(chat.user_id))
     db.session.commit()
+    chat_history.invalidate(chat_id)
+    rolling_summaries.invalidate((current_user_id, chat_id))
     
     return jsonify({'message': 'Chat deleted successfully'}), 200
 
@@ -360,198 +484,549 @@ def update_chat(chat_id):
         return jsonify({'error': 'Title is required'}), 400
         
     chat.title = title
+    db.session.execute(bump_user_chats(chat.user_id))
     db.session.commit()
     
     return jsonify(chat.to_dict()), 200
 
+@app.route('/api/search', methods=['GET'])
+@jwt_required()
+def search_history():
+    """Ranked full-text search over the user's own messages (?q=, limit, offset)"""
+    current_user_id = get_jwt_identity()
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Query parameter q is required'}), 400
+    try:
+        limit = page_size(request.args.get('limit'))
+        offset = max(0, int(request.args.get('offset', 0)))
+    except (InvalidCursor, ValueError):
+        return jsonify({'error': 'Invalid limit or offset'}), 400
+
+    try:
+        results, has_more = search_messages(current_user_id, query, limit, offset)
+    except SearchUnavailable as e:
+        return jsonify({'error': str(e)}), 503
+    response = jsonify(results)
+    if has_more:
+        response.headers['X-Next-Offset'] = str(offset + limit)
+    return response, 200
+
+@app.route('/api/export', methods=['GET'])
+@jwt_required()
+def export_history():
+    """The user's chats and messages as a streamed gzip'd JSONL download"""
+    current_user_id = int(get_jwt_identity())
+    return Response(
+        stream_with_context(export_gzip(current_user_id)),
+        mimetype='application/gzip',
+        headers={'Content-Disposition': 'attachment; filename="zara-export.jsonl.gz"'}
+    )
+
+@app.route('/api/import', methods=['POST'])
+@jwt_required()
+def import_history():
+    """Load a file produced by /api/export (gzip'd, or plain JSONL) into new chats"""
+    current_user_id = int(get_jwt_identity())
+    body = request.stream
+    if request.mimetype not in ('application/x-ndjson', 'application/jsonl'):
+        body = gzip.GzipFile(fileobj=body, mode='rb')
+    try:
+        counts = import_lines(current_user_id, io.TextIOWrapper(body, encoding='utf-8'))
+    except ImportFormatError as e:
+        return jsonify({'error': 'Invalid export file', 'msg': str(e)}), 400
+    except (OSError, EOFError, UnicodeDecodeError) as e:
+        return jsonify({'error': 'Invalid export file', 'msg': f'Could not decode upload: {e}'}), 400
+    return jsonify({'message': 'Import complete', 'imported': counts}), 201
+
+# Models to try (Cerebras supported models)
+# 'cerebras-flash-latest' is the new high-speed model optimized for WSE-3
+MODEL_NAMES = [
+    'cerebras-flash-latest', # Fastest and Reliable
+    'llama-3.3-70b',        # Flagship Large Model
+    'llama3.1-8b',          # Standard Small Model
+]
+
+# Background jobs: let the model title new chats and summarize long ones
+LLM_TITLES_ENABLED = os.getenv('LLM_TITLES_ENABLED', 'false').lower() == 'true'
+LLM_SUMMARY_ENABLED = os.getenv('LLM_SUMMARY_ENABLED', 'false').lower() == 'true'
+# A summary is refreshed once this many messages it doesn't cover have fallen out of the prompt
+SUMMARY_MIN_NEW_MESSAGES = int(os.getenv('SUMMARY_MIN_NEW_MESSAGES', '8'))
+# Small, cheap model for that work
+BACKGROUND_MODEL = os.getenv('BACKGROUND_MODEL', 'llama3.1-8b')
+
+TITLE_PROMPT = ("Write a title of at most six words for the conversation below. "
+                "Reply with the title only, without quotes or punctuation at the end.")
+SUMMARY_PROMPT = ("Summarize the conversation below for an assistant who will continue it. Keep the facts, "
+                  "names, decisions and open questions; drop greetings and filler. Merge any summary so far "
+                  "with the new turns into one concise summary of short bullet points.")
+
+QUOTA_EXCEEDED_MESSAGE = "⚠️ I'm currently experiencing high traffic and have hit my daily usage limits for AI generation. Please try again later or check your API key quotas."
+FALLBACK_MODE_NOTE = "\n\n*(Note: Running in Fallback Mode due to API error)*"
+
+def check_rate_limit(current_user_id, ip):
+    """(limit key, None) when the caller may chat, else (key, Rejection); no database work"""
+    limit_key = rate_limiter.key_for(current_user_id, ip)
+    rejection = rate_limiter.check(limit_key)
+    if rejection:
+        RATE_LIMITED.inc(reason=rejection.reason)
+        log.sampled("Chat request rate limited", key=limit_key, reason=rejection.reason)
+    return limit_key, rejection
+
+def charge_chat_tokens(turn, usage, response_text):
+    """Count a model reply against the caller's daily quota, estimating when usage is missing"""
+    tokens = getattr(usage, 'total_tokens', None)
+    if not tokens:
+        tokens = sum(message_tokens(message) for message in turn['cerebras_messages']) + estimate_tokens(response_text)
+    rate_limiter.charge(turn.get('limit_key'), tokens)
+
+def save_chat_turn(turn, response_text=None):
+    """Persist the turn's messages in one transaction (non-fatal on error) and queue its follow-up jobs"""
+    record = turn['record']
+    if not record:
+        return
+    try:
+        if not record.save(response_text):
+            return
+    except Exception as db_err:
+        log.error("Database error (chat turn)", error=str(db_err))
+        return
+    if record.titled and LLM_TITLES_ENABLED:
+        background_jobs.enqueue('chat_title', chat_id=record.chat_id, limit_key=turn.get('limit_key'))
+    if turn.get('summarize'):
+        # One waiting job per chat: it folds in every turn saved before it runs
+        background_jobs.enqueue('summarize_chat', unique=True, chat_id=record.chat_id, limit_key=turn.get('limit_key'))
+
+def sync_chat_to_supabase(record, last_message, response_text):
+    """Queue a chat interaction for the background Supabase sync pipeline"""
+    if not (SUPABASE_URL and SUPABASE_KEY and record):
+        return
+    background_jobs.enqueue('supabase_sync', row={
+        'user_email': record.user_email or "Guest",
+        # 'username': name, # Removed as this column doesn't exist in Supabase
+        'user_message': last_message,
+        'bot_reply': response_text,
+        'created_at': datetime.utcnow().isoformat()
+    })
+
+def sse_event(payload):
+    """Format a payload as a single Server-Sent Events frame"""
+    return f"data: {json.dumps(payload)}\n\n"
+
+def lookup_cached_response(cache_key, scope, prompt):
+    """Exact-match cache first, then nearest paraphrase from the semantic cache"""
+    cached_text = response_cache.get(cache_key)
+    CACHE_LOOKUPS.inc(cache='response', result='miss' if cached_text is None else 'hit')
+    semantic_cache = semantic.get()
+    if cached_text is None and semantic_cache:
+        cached_text = semantic_cache.get(prompt, scope)
+        CACHE_LOOKUPS.inc(cache='semantic', result='miss' if cached_text is None else 'hit')
+    return cached_text
+
+def store_cached_response(cache_key, scope, prompt, response_text, latency):
+    response_cache.set(cache_key, response_text, latency)
+    semantic_cache = semantic.get()
+    if semantic_cache:
+        semantic_cache.set(prompt, response_text, latency, scope)
+
+def stream_cached_response(turn, response_text):
+    """Replay a cached reply over the streaming protocol as a single frame"""
+    try:
+        yield sse_event({'content': response_text})
+        yield "data: [DONE]\n\n"
+    finally:
+        finish_chat_turn(turn, response_text)
+
+def stream_chat_completion(turn):
+    """
+    Generator behind the streaming /api/chat mode.
+    Yields each token as an SSE frame the moment Cerebras sends it. The model
+    is read by a producer thread (produce_stream) that every identical
+    concurrent request joins, so N users asking the same thing cost one
+    completion. The assistant message is written once, after the last token or
+    when the client disconnects (GeneratorExit), so the database never sits in
+    front of the first byte.
+    """
+    chunks = []
+    flight, leader = stream_flights.join(
+        turn['flight_key'],
+        lambda flight: threading.Thread(target=produce_stream, args=(turn, flight), daemon=True).start())
+    try:
+        for frame, delta in flight.follow():
+            if delta:
+                chunks.append(delta)
+            yield frame
+        yield "data: [DONE]\n\n"
+    finally:
+        # Runs on normal completion and on client disconnect alike
+        stream_flights.leave(flight)
+        if chunks:
+            # Only the request that started the flight pays for its tokens
+            if leader:
+                charge_chat_tokens(turn, flight.state['usage'], ''.join(chunks))
+            finish_chat_turn(turn, ''.join(chunks))
+            log.sampled("Streamed response", chunks=len(chunks), completed=flight.state['completed'],
+                        shared=not leader)
+        else:
+            # Every model failed: the question and the fallback reply the client saw.
+            # A client gone before any reply leaves just the question.
+            save_chat_turn(turn, flight.state.get('fallback'))
+
+def publish_fallback(flight, reply):
+    """Send the failed-turn reply to a flight's readers; each request saves it with the question"""
+    flight.state['fallback'] = reply
+    flight.publish((sse_event({'content': reply}), None))
+
+def produce_stream(turn, flight):
+    """
+    Producer of a stream flight: streams from the first healthy model and
+    publishes (SSE frame, token) pairs; non-token frames carry None. Stops
+    early when every reader has gone. A reply that streamed to completion is
+    cached here, once, rather than by each request that read it.
+    Streams are coalesced within this worker only: the cross-worker lock would
+    be held until the last token, and a waiting worker can't read tokens from
+    another process, so its readers would sit on an empty response instead.
+    """
+    chunks = []
+    stream_started = time.monotonic()
+    try:
+        last_error = None
+        model_names = model_health.order(MODEL_NAMES)
+        if not model_names:
+            last_error = ModelsUnavailableError("Quota backoff: every model is rate limited or unhealthy")
+
+        for model_name in model_names:
+            started = time.monotonic()
+            try:
+                log.sampled("Trying model", model=model_name, stream=True)
+                stream = cerebras.get().chat.completions.create(
+                    model=model_name,
+                    messages=turn['cerebras_messages'],
+                    temperature=0.7,
+                    max_tokens=4096,
+                    top_p=1,
+                    stream=True,
+                )
+                for chunk in stream:
+                    if stream_flights.abandoned(turn['flight_key'], flight):
+                        return
+                    # Cerebras reports usage on the final chunk
+                    flight.state['usage'] = getattr(chunk, 'usage', None) or flight.state['usage']
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        if not chunks:
+                            MODEL_TTFT.observe(time.monotonic() - started, model=model_name)
+                        chunks.append(delta)
+                        flight.publish((sse_event({'content': delta}), delta))
+
+                if chunks:
+                    model_health.record_success(model_name, time.monotonic() - started)
+                    MODEL_CALL_LATENCY.observe(time.monotonic() - started, model=model_name, outcome='success')
+                    log.sampled("Model succeeded", model=model_name, stream=True)
+                    flight.state['completed'] = True
+                    break
+                raise ValueError(f"Empty completion from {model_name}")
+            except Exception as e:
+                log.warning("Model failed", model=model_name, error=str(e))
+                MODEL_CALL_LATENCY.observe(time.monotonic() - started, model=model_name, outcome='error')
+                model_health.record_failure(model_name, e)
+                last_error = e
+                # Tokens already reached the client, so switching models would garble the reply
+                if chunks:
+                    flight.publish((sse_event({'error': 'Stream interrupted', 'msg': str(e)}), None))
+                    break
+                continue
+
+        if not chunks:
+            publish_fallback(flight, failed_chat_reply(last_error, turn['last_message']))
+        elif flight.state['completed'] and turn['cache_key']:
+            store_cached_response(turn['cache_key'], turn['cache_scope'], turn['last_message'],
+                                  ''.join(chunks), time.monotonic() - stream_started)
+    except Exception as e:
+        log.exception("Stream producer failed", error=str(e))
+        if not chunks:
+            publish_fallback(flight, failed_chat_reply(e, turn['last_message']))
+    finally:
+        stream_flights.finish(turn['flight_key'], flight)
+
+def complete_chat_turn(turn):
+    """
+    Non-streamed reply for a turn, sharing one hedged model call with every
+    identical concurrent request. Returns (response_text, usage, paid); paid
+    is False when another request (or worker) already paid for the tokens.
+    Raises when every model failed.
+    """
+    def call():
+        with worker_flight_lock(turn['cache_key']) as locked:
+            cached_text = response_cache.peek(turn['cache_key']) if locked else None
+            if cached_text is not None:
+                return cached_text, None, False
+            generation_started = time.monotonic()
+            # Hedged dispatch over the models the circuit breaker considers healthy:
+            # the next model starts if the current one is slow or fails
+            model_name, completion = model_dispatcher.complete(
+                cerebras.get(),
+                model_health.order(MODEL_NAMES),
+                turn['cerebras_messages'],
+                temperature=0.7,
+                max_tokens=4096,
+                top_p=1,
+            )
+            response_text = completion.choices[0].message.content
+            log.sampled("Model succeeded", model=model_name)
+            if turn['cache_key']:
+                store_cached_response(turn['cache_key'], turn['cache_scope'], turn['last_message'],
+                                      response_text, time.monotonic() - generation_started)
+            return response_text, completion.usage, True
+
+    (response_text, usage, paid), shared = single_flight.do(turn['flight_key'], call)
+    return response_text, usage, paid and not shared
+
+NOT_CONFIGURED_MESSAGE = "⚠️ I'm not fully configured yet. Please add your CEREBRAS_API_KEY to the backend/.env file."
+
+def prepare_chat_turn(data, current_user_id):
+    """
+    Everything a chat turn does before calling the model: validate the payload,
+    load the chat, rebuild history, assemble the prompt and check the
+    response caches. Returns (turn, None) or (None, (payload, status)) when the
+    request can be answered without the model.
+    Shared by the WSGI view and the async server in asgi.py.
+    """
+    log.sampled("Chat request received", keys=list(data.keys()))
+    messages = data.get('messages', [])
+    chat_id = data.get('chatId')
+    # Server-side history mode: the client sends only the new turn and the
+    # backend rebuilds the context from the Message table
+    new_message = data.get('message')
+    if new_message and not messages:
+        messages = [{'role': 'user', 'content': new_message}]
+
+    if not messages:
+        return None, ({'error': 'No messages provided'}, 400)
+    
+    # Check if API key is configured (without building the sync client, which asgi.py doesn't use)
+    if not CEREBRAS_API_KEY:
+        return None, ({'role': 'assistant', 'content': NOT_CONFIGURED_MESSAGE}, 200)
+    
+    # Get the last user message
+    last_message = messages[-1]['content']
+    
+    # Load the chat and user once; the messages are written together when the turn finishes
+    try:
+        record = ChatTurnRecord.load(current_user_id, chat_id, last_message, count_unsummarized=LLM_SUMMARY_ENABLED)
+    except Exception as db_err:
+        db.session.rollback()
+        log.error("Database error (chat turn)", error=str(db_err))
+        return None, ({'error': 'Database error', 'msg': f'Failed to load chat: {str(db_err)}'}, 500)
+
+    if new_message and record and record.chat_id:
+        # Stored history plus the turn that is about to be saved
+        messages = chat_history.get(chat_id) + messages
+
+    # Format messages for Cerebras: newest turns within the token budget,
+    # older ones folded into this chat's rolling summary
+    summary_key = (current_user_id, chat_id) if current_user_id and chat_id else None
+    stored_summary = record.summary if record and record.chat_id else None
+    cerebras_messages = build_context(ZARA_SYSTEM_PROMPT, messages, summary_key, summary=stored_summary)
+    # The model-written summary is refreshed after the reply, once enough turns it doesn't
+    # cover have fallen out of the prompt: the stored messages past the summary, less the
+    # ones still in the prompt (all but the new message are stored)
+    summarize = False
+    if LLM_SUMMARY_ENABLED and summary_key and record and record.chat_id:
+        dropped, kept = split_history(messages)
+        summarize = bool(dropped) and record.unsummarized - (len(kept) - 1) >= SUMMARY_MIN_NEW_MESSAGES
+
+    # Single-turn prompts ("hi", "who are you") are served from the response cache
+    cache_key = response_cache.key_for(MODEL_NAMES, messages)
+    cache_scope = response_cache.scope_for(messages)
+    cached_text = lookup_cached_response(cache_key, cache_scope, last_message) if cache_key else None
+
+    return {
+        'current_user_id': current_user_id,
+        'chat_id': chat_id,
+        'last_message': last_message,
+        'cerebras_messages': cerebras_messages,
+        # Requests with the same full prompt share one in-flight completion
+        'flight_key': prompt_key(MODEL_NAMES, cerebras_messages),
+        'cache_key': cache_key,
+        'cache_scope': cache_scope,
+        'cached_text': cached_text,
+        'record': record,
+        'summarize': summarize,
+    }, None
+
+def finish_chat_turn(turn, response_text):
+    """Persist and mirror a successful reply (the model call that produced it caches it)"""
+    # Save both messages and a new chat's title in one transaction
+    save_chat_turn(turn, response_text)
+
+    # Sync Chat Interaction to Supabase (Background Job)
+    sync_chat_to_supabase(turn['record'], turn['last_message'], response_text)
+
+def background_completion(messages, max_tokens, limit_key=None):
+    """One short, non-streamed completion for a background job, charged to the caller's quota"""
+    client = cerebras.get()
+    if client is None:
+        raise RuntimeError("Cerebras client unavailable")
+    completion = client.chat.completions.create(
+        model=BACKGROUND_MODEL,
+        messages=messages,
+        temperature=0.3,
+        max_tokens=max_tokens,
+    )
+    rate_limiter.charge(limit_key, getattr(completion.usage, 'total_tokens', None))
+    return (completion.choices[0].message.content or '').strip()
+
+@background_jobs.task('chat_title')
+def title_chat(chat_id, limit_key=None):
+    """Replace a chat's first-message title with one the model picks (LLM_TITLES_ENABLED)"""
+    first = (
+        db.session.query(Message.content)
+        .filter(Message.chat_id == chat_id, Message.role == 'user')
+        .order_by(Message.timestamp, Message.id)
+        .first()
+    )
+    if first is None:
+        return
+    # The chat turn named it after its first message; a different title means the user renamed it
+    title = first.content[:30]
+    if db.session.query(Chat.title).filter(Chat.id == chat_id).scalar() != title:
+        return
+    reply = (
+        db.session.query(Message.content)
+        .filter(Message.chat_id == chat_id, Message.role == 'assistant')
+        .order_by(Message.timestamp, Message.id)
+        .first()
+    )
+    exchange = f"User: {first.content[:1000]}"
+    if reply:
+        exchange += f"\nAssistant: {reply.content[:1000]}"
+    generated = background_completion([
+        {'role': 'system', 'content': TITLE_PROMPT},
+        {'role': 'user', 'content': exchange},
+    ], max_tokens=24, limit_key=limit_key)
+    generated = generated.splitlines()[0].strip(' "\'*#.') if generated else ''
+    if generated and db.session.execute(
+        update(Chat).where(Chat.id == chat_id, Chat.title == title).values(title=generated[:60])
+    ).rowcount:
+        db.session.execute(bump_chat_owner(chat_id))
+        db.session.commit()
+
+@background_jobs.task('summarize_chat')
+def summarize_chat(chat_id, limit_key=None):
+    """Fold the turns that have fallen out of the prompt into the chat's stored summary"""
+    chat = db.session.query(Chat.summary, Chat.summary_message_id).filter(Chat.id == chat_id).first()
+    if chat is None:
+        return
+    rows = (
+        db.session.query(Message.id, Message.role, Message.content)
+        .filter(Message.chat_id == chat_id)
+        .order_by(Message.timestamp.desc(), Message.id.desc())
+        .limit(HISTORY_LIMIT)
+        .all()
+    )
+    rows.reverse()
+    dropped, _ = split_history([{'id': row.id, 'role': row.role, 'content': row.content} for row in rows])
+    new = [message for message in dropped if chat.summary_message_id is None or message['id'] > chat.summary_message_id]
+    if not new:
+        return
+    transcript = '\n'.join(f"{message['role']}: {message['content']}" for message in new)
+    if chat.summary:
+        transcript = f"Summary so far:\n{chat.summary}\n\nNew turns:\n{transcript}"
+    summary = background_completion([
+        {'role': 'system', 'content': SUMMARY_PROMPT},
+        {'role': 'user', 'content': transcript},
+    ], max_tokens=SUMMARY_TOKEN_BUDGET, limit_key=limit_key)
+    if not summary:
+        return
+    # Guarded on the covered message id, so an older job finishing late doesn't overwrite a newer summary
+    last_id = new[-1]['id']
+    db.session.execute(
+        update(Chat)
+        .where(Chat.id == chat_id, (Chat.summary_message_id.is_(None)) | (Chat.summary_message_id < last_id))
+        .values(summary=summary, summary_message_id=last_id)
+    )
+    db.session.commit()
+
+@background_jobs.task('supabase_sync')
+def mirror_to_supabase(row, table='messages'):
+    worker = supabase_sync.get()
+    if worker:
+        worker.enqueue(table, row)
+
+def failed_chat_reply(last_error, last_message):
+    """What the user sees when every model failed"""
+    if last_error:
+        # If all failed, provide a user-friendly message for quota limits
+        if "429" in str(last_error) or "Quota" in str(last_error):
+            return QUOTA_EXCEEDED_MESSAGE
+        log.error("All models failed", error=str(last_error))
+    log.warning("Cerebras generation failed, using fallback response")
+    return generate_fallback_response(last_message) + FALLBACK_MODE_NOTE
+
 @app.route('/api/chat', methods=['POST'])
 @jwt_required(optional=True) # Optional so guest users can still chat (if you want)
 def chat():
-    print(f"--- DIAGNOSTIC ---")
-    print(f"Checking Environment: CEREBRAS_KEY={bool(os.getenv('CEREBRAS_API_KEY'))}, SUPABASE_URL={bool(os.getenv('SUPABASE_URL'))}")
-    print(f"------------------")
+    last_message = None
     try:
+        # Rejected before the request body or the database is touched
+        limit_key, rejection = check_rate_limit(
+            get_jwt_identity(), client_ip(request.remote_addr, request.headers.get('X-Forwarded-For')))
+        if rejection:
+            return jsonify(rejection.payload()), 429, {'Retry-After': str(rejection.retry_after)}
+
         data = request.json
-        print(f"Chat request received (data keys): {list(data.keys())}")
-        messages = data.get('messages', [])
-        chat_id = data.get('chatId')
-        
-        current_user_id = get_jwt_identity()
+        turn, early = prepare_chat_turn(data, get_jwt_identity())
+        if early:
+            payload, status = early
+            return jsonify(payload), status
+        turn['limit_key'] = limit_key
+
+        last_message = turn['last_message']
+        cached_text = turn['cached_text']
+            
+        # Streaming mode: send tokens as Server-Sent Events as they arrive
+        if data.get('stream'):
+            if cached_text:
+                events = stream_cached_response(turn, cached_text)
+            else:
+                events = stream_chat_completion(turn)
+            return Response(
+                stream_with_context(events),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
+
+        if cached_text:
+            finish_chat_turn(turn, cached_text)
+            return jsonify({'role': 'assistant', 'content': cached_text})
 
-        if not messages:
-            return jsonify({'error': 'No messages provided'}), 400
-        
-        # Check if API key is configured
-        if not cerebras_client:
-            return jsonify({
-                'role': 'assistant', 
-                'content': "⚠️ I'm not fully configured yet. Please add your CEREBRAS_API_KEY to the backend/.env file."
-            })
-        
-        # Get the last user message
-        last_message = messages[-1]['content']
-        
-        # Save User Message to DB if logged in and chatId provided
-        # Save User Message to DB if logged in and chatId provided
         try:
-            if current_user_id and chat_id:
-                 # Verify chat belongs to user
-                chat_obj = Chat.query.get(chat_id)
-                if chat_obj and chat_obj.user_id == int(current_user_id):
-                    user_msg_db = Message(chat_id=chat_id, role='user', content=last_message)
-                    db.session.add(user_msg_db)
-                    
-                    # Update chat title if it's 'New Chat'
-                    if chat_obj.title == 'New Chat':
-                        chat_obj.title = last_message[:30]
-                    
-                    db.session.commit()
-        except Exception as db_err:
-            print(f"Database Error (User Message): {db_err}")
-            # Continue execution even if DB save fails, or return error?
-            # Better to continue but log it. Or if strict, return error.
-            # Let's return error to be safe as data integrity matters.
-            return jsonify({'error': 'Database error', 'msg': f'Failed to save message: {str(db_err)}'}), 500
+            try:
+                response_text, usage, paid = complete_chat_turn(turn)
+            except Exception as e:
+                response_text = failed_chat_reply(e, last_message)
+                save_chat_turn(turn, response_text)
+                return jsonify({'role': 'assistant', 'content': response_text})
 
+            if paid:
+                charge_chat_tokens(turn, usage, response_text)
+            finish_chat_turn(turn, response_text)
 
-        try:
-            # Format messages for Cerebras
-            cerebras_messages = [
-                {"role": "system", "content": ZARA_SYSTEM_PROMPT}
-            ]
-            
-            # Add conversation history
-            # We take the last 10 messages from the request
-            # Note: The request structure has 'content' and 'role'
-            for msg in messages:
-                role = "user" if msg['role'] == 'user' else "assistant"
-                content = msg['content']
-                
-                # Simple image handling: append invalid image notice if needed
-                # Cerebras standard models are text-only usually
-                
-                cerebras_messages.append({"role": role, "content": content})
-            
-            # Models to try (Cerebras supported models)
-            # 'cerebras-flash-latest' is the new high-speed model optimized for WSE-3
-            model_names = [
-                'cerebras-flash-latest', # Fastest and Reliable
-                'llama-3.3-70b',        # Flagship Large Model
-                'llama3.1-8b',          # Standard Small Model
-            ]
-            
-            response_text = None
-            last_error = None
-
-            for model_name in model_names:
-                try:
-                    print(f"Trying model: {model_name}")
-                    
-                    completion = cerebras_client.chat.completions.create(
-                        model=model_name,
-                        messages=cerebras_messages,
-                        temperature=0.7,
-                        max_tokens=4096,
-                        top_p=1,
-                        stream=False,
-                    )
-
-                    if completion.choices and completion.choices[0].message:
-                        response_text = completion.choices[0].message.content
-                        print(f"Success with model: {model_name}")
-                        break
-                        
-                except Exception as e:
-                    print(f"Failed with {model_name}: {e}")
-                    last_error = e
-                    if "429" in str(e) or "Rate limit" in str(e): continue
-                    continue
-            
-            if not response_text:
-                if last_error:
-                    # If all failed, provide a user-friendly message for quota limits
-                    if "429" in str(last_error) or "Quota" in str(last_error):
-                        return jsonify({
-                            'role': 'assistant', 
-                            'content': "⚠️ I'm currently experiencing high traffic and have hit my daily usage limits for AI generation. Please try again later or check your API key quotas."
-                        })
-                    print(f"Final error: {last_error}")
-                    # Don't crash for safety blocks, just return the safety message if set, else error
-                
-                # Check if we set a safety message inside loop
-                if not response_text:
-                    print("Cerebras generation failed. Using fallback response.")
-                    response_text = generate_fallback_response(last_message)
-                    return jsonify({
-                        'role': 'assistant',
-                        'content': response_text + "\n\n*(Note: Running in Fallback Mode due to API error)*"
-                    })
-            
-            # Save Assistant Response to DB
-            # Save Assistant Response to DB
-            if current_user_id and chat_id:
-                try:
-                    chat_obj = Chat.query.get(chat_id)
-                    if chat_obj and chat_obj.user_id == int(current_user_id):
-                        ai_msg_db = Message(chat_id=chat_id, role='assistant', content=response_text)
-                        db.session.add(ai_msg_db)
-                        db.session.commit()
-                except Exception as db_err:
-                    print(f"Database Error (Assistant Message): {db_err}")
-                    # Non-fatal, proceed to return response
-
-            # Sync Chat Interaction to Supabase (Background Thread)
-            if supabase and current_user_id:
-                try:
-                    # Fetch user info in current thread before starting background thread
-                    user = User.query.get(current_user_id)
-                    u_email = user.email if user else "Guest"
-                    u_name = user.username if user else "Guest"
-                    
-                    def sync_message(email, name, msg, reply):
-                        try:
-                            # Use the data passed from the main thread
-                            supabase.table('messages').insert({
-                                'user_email': email,
-                                # 'username': name, # Removed as this column doesn't exist in Supabase
-                                'user_message': msg,
-                                'bot_reply': reply,
-                                'created_at': datetime.utcnow().isoformat()
-                            }).execute()
-                            print(f"✅ SUCCESSFULLY synced to Supabase for: {email}")
-                        except Exception as e:
-                            print(f"❌ Supabase Sync Error: {e}")
-                    
-                    # Start thread and pass variables to avoid context issues
-                    thread = threading.Thread(
-                        target=sync_message, 
-                        args=(u_email, u_name, last_message, response_text)
-                    )
-                    thread.daemon = True
-                    thread.start()
-                    
-                except Exception as thread_setup_err:
-                    print(f"⚠️ Could not setup Supabase sync thread: {thread_setup_err}")
-
-
-
-            print(f"Successfully generated response for: '{last_message[:30]}...'")
             return jsonify({'role': 'assistant', 'content': response_text})
         
         except Exception as cerebras_error:
-            # Log the Cerebras API error
-            print(f"Cerebras API Error: {type(cerebras_error).__name__}: {str(cerebras_error)}")
-            
             # FALLBACK: Use rule-based responses if Cerebras fails
-            print(f"Using fallback mock response...")
-            
+            log.error("Cerebras API error, using fallback response",
+                      error_type=type(cerebras_error).__name__, error=str(cerebras_error))
             response_text = generate_fallback_response(last_message)
+            save_chat_turn(turn, response_text)
             return jsonify({'role': 'assistant', 'content': response_text})
 
     except Exception as e:
-        print(f"Error: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Chat request failed", error=str(e))
         return jsonify({
             'role': 'assistant',
             'content': f"I encountered an error: {str(e)}. Using fallback mode."
@@ -559,32 +1034,7 @@ def chat():
 
 def generate_fallback_response(message):
     """Fallback mock responses when Cerebras API is not available"""
-    message_lower = message.lower()
-    
-    if 'hello' in message_lower or 'hi' in message_lower:
-        return "Hello! It's wonderful to meet you. I'm Zara, created by Sri. How are you feeling today? (Note: Currently using fallback mode - please check your Cerebras API key)"
-    elif 'who are you' in message_lower or 'your name' in message_lower:
-        return "I'm Zara, a friendly and intelligent AI assistant created by Sri. I'm here to help you with anything from coding to emotional support. (Currently in fallback mode)"
-    elif 'sri' in message_lower:
-        return "Sri is my creator! He designed me to be helpful, emotionally aware, and professional."
-    elif 'help' in message_lower:
-        return "I'd be happy to help! Whether it's technical coding, career advice, or just a chat, I'm here for you. What do you need assistance with?"
-    elif any(word in message_lower for word in ['python', 'code', 'programming', 'function']):
-        return """Here's a simple Python example for you:
-
-```python
-def greet(name):
-    return f"Hello, {name}! Welcome to coding!"
-
-# Usage
-print(greet("User"))
-```
-
-Let me know if you need something more specific! (Note: Full AI responses require valid Cerebras API key)"""
-    elif any(word in message_lower for word in ['sad', 'frustrated', 'stressed', 'upset']):
-        return "I'm so sorry to hear you're feeling that way. It's completely normal to have tough days. I'm here to listen if you want to talk about it, or we can focus on something else to help you reset. You're doing great. ❤️"
-    else:
-        return f"That's interesting! I'm listening. Tell me more about '{message[:30]}...' I'm currently in fallback mode, so for full AI capabilities, please ensure your Cerebras API key is properly configured."
+    return fallback_responder.respond(message)
 
 @app.route('/', methods=['GET'])
 def index():
@@ -597,6 +1047,11 @@ def health():
     return jsonify({
         'status': 'healthy',
         'api_configured': bool(CEREBRAS_API_KEY),
+        'models': model_health.snapshot(),
+        'response_cache': response_cache.stats(),
+        'semantic_cache': semantic.peek().stats() if semantic.peek() else None,
+        'supabase_sync': supabase_sync.peek().stats() if supabase_sync.peek() else None,
+        'jobs': background_jobs.stats(),
         'message': 'Zara AI Backend is running!'
     })
 
@@ -604,21 +1059,49 @@ def health():
 def api_health():
     return health()
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition of this worker's metrics"""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+registry.callback('zara_supabase_sync_queue_depth', 'Rows waiting for the Supabase sync workers',
+                  lambda: supabase_sync.peek().queue.qsize() if supabase_sync.peek() else None)
+registry.callback('zara_supabase_sync_synced_rows_total', 'Rows mirrored to Supabase',
+                  lambda: supabase_sync.peek().synced if supabase_sync.peek() else None, kind='counter')
+registry.callback('zara_supabase_sync_failed_rows_total', 'Rows left in the outbox after retries',
+                  lambda: supabase_sync.peek().failed if supabase_sync.peek() else None, kind='counter')
+registry.callback('zara_job_queue_depth', 'Background jobs waiting to run',
+                  lambda: background_jobs.stats()['queue_depth'])
+registry.callback('zara_jobs_failed_total', 'Background jobs that ran out of attempts',
+                  lambda: background_jobs.failed, kind='counter')
+registry.callback('zara_response_cache_hit_ratio', 'Exact-match response cache hits / lookups',
+                  lambda: response_cache.stats()['hit_rate'])
+registry.callback('zara_coalesced_requests_total', "Chat requests answered by another request's in-flight completion",
+                  lambda: single_flight.shared + async_single_flight.shared + stream_flights.shared, kind='counter')
+registry.callback('zara_semantic_cache_entries', 'Prompts held by the semantic cache',
+                  lambda: semantic.peek().size if semantic.peek() else None)
+
 @app.before_request
 def before_request_func():
-    # Print every request for debugging Render connectivity
-    print(f"Incoming Request: {request.method} {request.path}")
+    g.request_started = time.perf_counter()
+    # Log every request for debugging Render connectivity (sampled; LOG_SAMPLE_RATE=0 turns it off)
+    log.sampled("Incoming request", method=request.method, path=request.path)
     # Ensure DB is ready before handling any request
     init_db_if_needed()
 
+@app.after_request
+def after_request_func(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # The route pattern, not the raw path, so chat ids don't explode the label set
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_LATENCY.observe(time.perf_counter() - started, method=request.method, endpoint=endpoint)
+        HTTP_REQUESTS.inc(method=request.method, endpoint=endpoint, status=response.status_code)
+    return response
+
 if __name__ == '__main__':
-    with app.app_context():
-        db.create_all()
-        print("Database initialized!")
-        
-    print("\nStarting Zara AI Backend Server...")
-    print(f"Server is running!")
-    print(f"API Key configured: {bool(CEREBRAS_API_KEY)}\n")
+    init_db_if_needed()
+    log.info("Starting Zara AI Backend Server", api_key_configured=bool(CEREBRAS_API_KEY))
     app.run(debug=True, port=5000)
 
 
@@ -0,0 +1,372 @@
+"""
+Async (ASGI) serving mode for the Zara backend.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000 --workers 2
+
+POST /api/chat is served natively: the model call goes through AsyncCerebras
+on the event loop, so a request waiting on a completion holds no thread. The
+short database steps before and after the model call run in a thread with an
+app context. Every other route (auth, chats CRUD, health) is the unchanged
+Flask app behind asgiref's WSGI adapter, each request on its own worker
+thread, so those are no faster than under Flask. bench_load_output.txt has
+the numbers: about 1.3x Flask's chat throughput at 64 concurrent chats, no
+gain on mixed traffic, where bcrypt logins and the sync routes dominate.
+"""
+import time
+import asyncio
+import contextvars
+from asgiref.sync import ThreadSensitiveContext
+from asgiref.wsgi import WsgiToAsgi
+from flask_jwt_extended import decode_token
+from jwt import ExpiredSignatureError, PyJWTError
+
+from app import (
+    app as flask_app,
+    CEREBRAS_API_KEY,
+    CORS_ORIGINS,
+    MODEL_NAMES,
+    init_db_if_needed,
+    prepare_chat_turn,
+    finish_chat_turn,
+    save_chat_turn,
+    check_rate_limit,
+    charge_chat_tokens,
+    failed_chat_reply,
+    publish_fallback,
+    store_cached_response,
+    sse_event,
+)
+from hedging import model_dispatcher
+from model_health import model_health, ModelsUnavailableError
+from clients import LazyClient, preload
+from coalesce import async_single_flight, stream_flights, async_worker_flight_lock
+from response_cache import response_cache
+from rate_limit import client_ip
+from json_provider import dumps_bytes
+from logs import get_logger
+from metrics import HTTP_REQUESTS, HTTP_LATENCY, MODEL_CALL_LATENCY, MODEL_TTFT
+
+log = get_logger('asgi')
+
+
+def create_async_cerebras_client():
+    if not CEREBRAS_API_KEY:
+        return None
+    from cerebras.cloud.sdk import AsyncCerebras
+    client = AsyncCerebras(api_key=CEREBRAS_API_KEY)
+    log.info("Async Cerebras client initialized")
+    return client
+
+
+async_cerebras = LazyClient('Async Cerebras client', create_async_cerebras_client)
+preload(async_cerebras)
+
+wsgi_application = WsgiToAsgi(flask_app)
+
+
+async def _serve_wsgi(scope, receive, send):
+    # Without a ThreadSensitiveContext every Flask request shares one thread,
+    # so a slow one (a bcrypt login) stalls the rest
+    async with ThreadSensitiveContext():
+        await wsgi_application(scope, receive, send)
+
+
+def serve_wsgi(scope, receive, send):
+    """
+    The Flask app in a fresh context. uvicorn serves keep-alive requests in
+    their connection's context, where asgiref leaves executor state behind
+    that fails the next request on that connection ("would deadlock" /
+    "CurrentThreadExecutor already quit").
+    """
+    return contextvars.Context().run(asyncio.ensure_future, _serve_wsgi(scope, receive, send))
+
+
+def _in_app_context(fn, *args):
+    with flask_app.app_context():
+        return fn(*args)
+
+
+async def run_sync(fn, *args):
+    """Run a blocking (database) step off the event loop inside an app context"""
+    return await asyncio.to_thread(_in_app_context, fn, *args)
+
+
+class HTTPError(Exception):
+    def __init__(self, status, payload):
+        super().__init__(payload.get('error'))
+        self.status = status
+        self.payload = payload
+
+
+def _header(scope, name):
+    for key, value in scope['headers']:
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+
+def _response_headers(scope, content_type):
+    headers = [(b'content-type', content_type.encode())]
+    origin = _header(scope, b'origin')
+    if origin in CORS_ORIGINS:
+        headers += [
+            (b'access-control-allow-origin', origin.encode()),
+            (b'access-control-allow-credentials', b'true'),
+            (b'vary', b'Origin'),
+        ]
+    return headers
+
+
+async def send_json(scope, send, payload, status=200, headers=()):
+    body = dumps_bytes(payload)
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': _response_headers(scope, 'application/json') + list(headers)})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def read_json(receive):
+    limit = flask_app.config['MAX_CONTENT_LENGTH']
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise ConnectionAbortedError()
+        body += message.get('body', b'')
+        if len(body) > limit:
+            raise HTTPError(413, {'error': 'Request Entity Too Large'})
+        if not message.get('more_body'):
+            break
+    try:
+        return flask_app.json.loads(body or b'{}')
+    except ValueError:
+        raise HTTPError(400, {'error': 'Bad Request', 'msg': 'Invalid JSON body'})
+
+
+def current_identity(scope):
+    """Optional JWT, mirroring @jwt_required(optional=True) on the Flask view"""
+    authorization = _header(scope, b'authorization')
+    if not authorization or not authorization.startswith('Bearer '):
+        return None
+    try:
+        with flask_app.app_context():
+            return decode_token(authorization[len('Bearer '):])['sub']
+    except ExpiredSignatureError:
+        raise HTTPError(401, {'error': 'Session expired', 'msg': 'Token has expired'})
+    except PyJWTError:
+        raise HTTPError(422, {'error': 'Invalid token', 'msg': 'Signature verification failed'})
+
+
+async def watch_disconnect(receive, disconnected):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            disconnected.set()
+            return
+
+
+async def stream_chat(scope, receive, send, turn):
+    """Async twin of app.stream_chat_completion: SSE tokens from a shared flight, one write at the end"""
+    await send({'type': 'http.response.start', 'status': 200, 'headers': _response_headers(scope, 'text/event-stream') + [
+        (b'cache-control', b'no-cache'), (b'x-accel-buffering', b'no')]})
+
+    async def emit(frame):
+        await send({'type': 'http.response.body', 'body': frame.encode('utf-8'), 'more_body': True})
+
+    disconnected = asyncio.Event()
+    watcher = asyncio.ensure_future(watch_disconnect(receive, disconnected))
+    chunks = []
+    flight = None
+    leader = False
+    try:
+        if turn['cached_text']:
+            chunks.append(turn['cached_text'])
+            await emit(sse_event({'content': turn['cached_text']}))
+        else:
+            flight, leader = stream_flights.join(
+                turn['flight_key'], lambda flight: asyncio.ensure_future(produce_stream(turn, flight)))
+            async for frame, delta in flight.follow_async():
+                if disconnected.is_set():
+                    break
+                if delta:
+                    chunks.append(delta)
+                await emit(frame)
+
+        await emit("data: [DONE]\n\n")
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        watcher.cancel()
+        if flight:
+            stream_flights.leave(flight)
+        if chunks:
+            if leader:
+                await run_sync(charge_chat_tokens, turn, flight.state['usage'], ''.join(chunks))
+            await run_sync(finish_chat_turn, turn, ''.join(chunks))
+        else:
+            await run_sync(save_chat_turn, turn, flight.state.get('fallback') if flight else None)
+
+
+async def produce_stream(turn, flight):
+    """Async twin of app.produce_stream, run as a task on the event loop"""
+    chunks = []
+    stream_started = time.monotonic()
+    try:
+        last_error = None
+        model_names = model_health.order(MODEL_NAMES)
+        if not model_names:
+            last_error = ModelsUnavailableError("Quota backoff: every model is rate limited or unhealthy")
+
+        for model_name in model_names:
+            started = time.monotonic()
+            try:
+                log.sampled("Trying model", model=model_name, stream=True)
+                stream = await async_cerebras.get().chat.completions.create(
+                    model=model_name,
+                    messages=turn['cerebras_messages'],
+                    temperature=0.7,
+                    max_tokens=4096,
+                    top_p=1,
+                    stream=True,
+                )
+                async for chunk in stream:
+                    if stream_flights.abandoned(turn['flight_key'], flight):
+                        return
+                    flight.state['usage'] = getattr(chunk, 'usage', None) or flight.state['usage']
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        if not chunks:
+                            MODEL_TTFT.observe(time.monotonic() - started, model=model_name)
+                        chunks.append(delta)
+                        flight.publish((sse_event({'content': delta}), delta))
+
+                if chunks:
+                    model_health.record_success(model_name, time.monotonic() - started)
+                    MODEL_CALL_LATENCY.observe(time.monotonic() - started, model=model_name, outcome='success')
+                    flight.state['completed'] = True
+                    break
+                raise ValueError(f"Empty completion from {model_name}")
+            except Exception as e:
+                log.warning("Model failed", model=model_name, error=str(e))
+                MODEL_CALL_LATENCY.observe(time.monotonic() - started, model=model_name, outcome='error')
+                model_health.record_failure(model_name, e)
+                last_error = e
+                if chunks:
+                    flight.publish((sse_event({'error': 'Stream interrupted', 'msg': str(e)}), None))
+                    break
+
+        if not chunks:
+            publish_fallback(flight, failed_chat_reply(last_error, turn['last_message']))
+        elif flight.state['completed'] and turn['cache_key']:
+            await run_sync(store_cached_response, turn['cache_key'], turn['cache_scope'], turn['last_message'],
+                           ''.join(chunks), time.monotonic() - stream_started)
+    except Exception as e:
+        log.exception("Stream producer failed", error=str(e))
+        if not chunks:
+            publish_fallback(flight, failed_chat_reply(e, turn['last_message']))
+    finally:
+        stream_flights.finish(turn['flight_key'], flight)
+
+
+async def complete_chat_turn(turn):
+    """Async twin of app.complete_chat_turn"""
+    async def call():
+        async with async_worker_flight_lock(turn['cache_key']) as locked:
+            cached_text = await asyncio.to_thread(response_cache.peek, turn['cache_key']) if locked else None
+            if cached_text is not None:
+                return cached_text, None, False
+            generation_started = time.monotonic()
+            model_name, completion = await model_dispatcher.complete_async(
+                async_cerebras.get(),
+                model_health.order(MODEL_NAMES),
+                turn['cerebras_messages'],
+                temperature=0.7,
+                max_tokens=4096,
+                top_p=1,
+            )
+            response_text = completion.choices[0].message.content
+            log.sampled("Model succeeded", model=model_name)
+            if turn['cache_key']:
+                await run_sync(store_cached_response, turn['cache_key'], turn['cache_scope'], turn['last_message'],
+                               response_text, time.monotonic() - generation_started)
+            return response_text, completion.usage, True
+
+    (response_text, usage, paid), shared = await async_single_flight.do(turn['flight_key'], call)
+    return response_text, usage, paid and not shared
+
+
+async def handle_chat(scope, receive, send):
+    try:
+        current_user_id = current_identity(scope)
+        # An SQLite UPSERT that can wait on another worker's write lock: off the event loop
+        client = scope.get('client')
+        limit_key, rejection = await asyncio.to_thread(
+            check_rate_limit, current_user_id,
+            client_ip(client[0] if client else None, _header(scope, b'x-forwarded-for')))
+        if rejection:
+            return await send_json(scope, send, rejection.payload(), 429,
+                                   [(b'retry-after', str(rejection.retry_after).encode())])
+        data = await read_json(receive)
+        await run_sync(init_db_if_needed)
+        turn, early = await run_sync(prepare_chat_turn, data, current_user_id)
+        if early:
+            payload, status = early
+            return await send_json(scope, send, payload, status)
+        turn['limit_key'] = limit_key
+
+        if data.get('stream'):
+            return await stream_chat(scope, receive, send, turn)
+
+        if turn['cached_text']:
+            await run_sync(finish_chat_turn, turn, turn['cached_text'])
+            return await send_json(scope, send, {'role': 'assistant', 'content': turn['cached_text']})
+
+        try:
+            response_text, usage, paid = await complete_chat_turn(turn)
+        except Exception as e:
+            response_text = failed_chat_reply(e, turn['last_message'])
+            await run_sync(save_chat_turn, turn, response_text)
+            return await send_json(scope, send, {'role': 'assistant', 'content': response_text})
+
+        if paid:
+            await run_sync(charge_chat_tokens, turn, usage, response_text)
+        await run_sync(finish_chat_turn, turn, response_text)
+        await send_json(scope, send, {'role': 'assistant', 'content': response_text})
+
+    except HTTPError as e:
+        await send_json(scope, send, e.payload, e.status)
+    except ConnectionAbortedError:
+        return
+    except Exception as e:
+        log.exception("Chat request failed", error=str(e))
+        await send_json(scope, send, {
+            'role': 'assistant',
+            'content': f"I encountered an error: {str(e)}. Using fallback mode."
+        }, 500)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] == 'http' and scope['path'] == '/api/chat' and scope['method'] == 'POST':
+        # Outside Flask, so the request metrics its after_request hook records are taken here
+        started = time.perf_counter()
+
+        async def timed_send(message):
+            if message['type'] == 'http.response.start':
+                HTTP_LATENCY.observe(time.perf_counter() - started, method='POST', endpoint='/api/chat')
+                HTTP_REQUESTS.inc(method='POST', endpoint='/api/chat', status=message['status'])
+            await send(message)
+
+        return await handle_chat(scope, receive, timed_send)
+    return await serve_wsgi(scope, receive, send)
@@ -0,0 +1,97 @@
+import os
+import sys
+import tempfile
+
+# Database round-trips per /api/chat turn: the old write path (chat loaded
+# twice, two commits, a third lookup for the Supabase row) against the
+# ChatTurnRecord path, counted with SQLAlchemy cursor/commit events on a
+# scratch SQLite database. Run:  python bench_chat_turn.py [turns]
+
+TURNS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='zara-bench-'), 'bench.db')
+
+from sqlalchemy import event
+import app as zara
+from app import app, db, init_db_if_needed, prepare_chat_turn, finish_chat_turn
+from models import User, Chat, Message
+from history import chat_history
+
+REPLY = 'answer ' * 50
+
+
+class RoundTrips:
+    """Statements sent to the database plus COMMITs, per engine"""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._bump)
+        event.listen(engine, 'commit', self._bump)
+
+    def _bump(self, *args, **kwargs):
+        self.count += 1
+
+
+def legacy_turn(user_id, chat_id, text):
+    """The write path /api/chat used before ChatTurnRecord"""
+    chat_obj = Chat.query.get(chat_id)
+    if chat_obj and chat_obj.user_id == int(user_id):
+        user_msg = Message(chat_id=chat_id, role='user', content=text)
+        db.session.add(user_msg)
+        if chat_obj.title == 'New Chat':
+            chat_obj.title = text[:30]
+        db.session.commit()
+        chat_history.get(chat_id)
+    # ... model call ...
+    chat_obj = Chat.query.get(chat_id)
+    if chat_obj and chat_obj.user_id == int(user_id):
+        ai_msg = Message(chat_id=chat_id, role='assistant', content=REPLY)
+        db.session.add(ai_msg)
+        db.session.commit()
+        chat_history.append(chat_id, ai_msg.id, ai_msg.role, ai_msg.content)
+    user = User.query.get(user_id)
+    return user.email if user else "Guest"
+
+
+def current_turn(user_id, chat_id, text):
+    turn, early = prepare_chat_turn({'message': text, 'chatId': chat_id}, user_id)
+    assert early is None, early
+    # ... model call ...
+    finish_chat_turn(turn, REPLY)
+
+
+def run(name, play, trips):
+    with app.app_context():
+        user = User(username=name, email=f'{name}@example.com', password='x')
+        db.session.add(user)
+        db.session.flush()
+        chat = Chat(user_id=user.id, title='New Chat')
+        db.session.add(chat)
+        db.session.commit()
+        user_id, chat_id = str(user.id), chat.id
+        db.session.remove()
+
+    before = trips.count
+    for turn in range(TURNS):
+        # One app context per request, as in production
+        with app.app_context():
+            # Distinct prompts, so the response cache never short-circuits a turn
+            play(user_id, chat_id, f'{name} question {turn}')
+    return (trips.count - before) / TURNS
+
+
+if __name__ == '__main__':
+    # prepare_chat_turn only checks that a client is configured; the model is never called here
+    zara.cerebras.set(object())
+    init_db_if_needed()
+    with app.app_context():
+        trips = RoundTrips(db.engine)
+
+    print("=" * 60)
+    print(f"CHAT TURN WRITE PATH: {TURNS} turns per path")
+    print("=" * 60)
+    results = {}
+    for name, play in (('legacy', legacy_turn), ('current', current_turn)):
+        results[name] = run(name, play, trips)
+        print(f"{name:>8}: {results[name]:.1f} round-trips/turn")
+    print(f"\nRound-trips saved per turn: {results['legacy'] - results['current']:.1f}")
@@ -0,0 +1,94 @@
+import sys
+import json
+import time
+import random
+import string
+
+# Fallback responder micro-benchmark: the old if/elif substring chain against
+# both paths in fallback.py, on the shipped intent table and on tables grown
+# to GROWN_SIZES intents: the scan (one substring check per pattern, confirmed
+# by a whole-word regex on a hit) and the keyword index, whose cost grows only
+# with the length of the message. fallback.py scans tables up to
+# SCAN_MAX_INTENTS. Best of RUNS runs.
+# Run:  python bench_fallback.py [messages]
+
+MESSAGES = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+GROWN_SIZES = (12, 25, 50, 200)
+RUNS = 5
+
+import fallback
+from fallback import fallback_responder as responder, compile_intents, FALLBACK_INTENTS_PATH, SCAN_MAX_INTENTS
+
+
+def substring_chain(table):
+    """The pre-table generate_fallback_response() algorithm, over any table"""
+    intents = [(intent['patterns'], intent['response']) for intent in table['intents']]
+
+    def respond(message):
+        message_lower = message.lower()
+        for patterns, response in intents:
+            if any(pattern in message_lower for pattern in patterns):
+                return response
+        return table['default'].replace('{message}', message[:30])
+    return respond
+
+
+def grown_table(table, size):
+    rng = random.Random(11)
+    extra = [{
+        'name': f'intent{n}',
+        'patterns': [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 9))) for _ in range(5)],
+        'response': f'Reply {n}',
+    } for n in range(size - len(table['intents']))]
+    return dict(table, intents=table['intents'] + extra)
+
+
+SAMPLES = [
+    "Hello there!",
+    "Who are you exactly?",
+    "Can you help me plan my week?",
+    "I need some Python code for parsing dates",
+    "I'm feeling really stressed about exams today",
+    "Tell me about the weather forecast for the weekend and what to wear",
+    "Explain the difference between TCP and UDP in networking terms please",
+    "What is this thing called love, and why does everyone write songs about it?",
+]
+
+
+def timed(respond, workload):
+    best = None
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        for message in workload:
+            respond(message)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1e6 / len(workload)
+
+
+if __name__ == '__main__':
+    random.seed(7)
+    workload = [random.choice(SAMPLES) for _ in range(MESSAGES)]
+    with open(FALLBACK_INTENTS_PATH, encoding='utf-8') as f:
+        shipped = json.load(f)
+    chain = substring_chain(shipped)
+
+    print("=" * 60)
+    print(f"FALLBACK RESPONDER: {MESSAGES} messages per run")
+    print("=" * 60)
+    print("old chain vs intent table:")
+    for sample in SAMPLES:
+        print(f"  {chain(sample)[:22]!r:26} {responder.respond(sample)[:22]!r:26} {sample[:30]}")
+
+    tables = [('shipped', shipped)] + [('grown', grown_table(shipped, size)) for size in GROWN_SIZES]
+    for name, table in tables:
+        old = timed(substring_chain(table), workload)
+        print(f"\n{name} ({len(table['intents'])} intents):")
+        print(f"  substring chain: {old:.2f} us/message")
+        # Both paths on every table, whichever fallback.py would pick
+        for path, limit in (('scan', len(table['intents'])), ('keyword index', 0)):
+            fallback.SCAN_MAX_INTENTS = limit
+            responder._compiled = compile_intents(table)
+            new = timed(responder.respond, workload)
+            print(f"  {path:>15}: {new:.2f} us/message ({old / new:.1f}x)")
+        fallback.SCAN_MAX_INTENTS = SCAN_MAX_INTENTS
@@ -0,0 +1,52 @@
+import os
+import sys
+import statistics
+import subprocess
+
+# Cold-start benchmark: `python -X importtime -c "import app"` with clients
+# built eagerly (LAZY_INIT=false, the old behaviour) and on first use
+# (LAZY_INIT=true). A placeholder CEREBRAS_API_KEY makes the eager run build
+# the client; nothing is sent over the network.
+# Run:  python bench_import_time.py [runs]
+
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+TOP_IMPORTS = 8
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def import_app(lazy):
+    """(microseconds to import app, {top-level import: cumulative microseconds})"""
+    env = dict(os.environ, LAZY_INIT='true' if lazy else 'false',
+               CEREBRAS_API_KEY=os.environ.get('CEREBRAS_API_KEY', 'bench-placeholder-key'))
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                          cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    imports = {}
+    total = None
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if name.strip() == 'app':
+            total = int(cumulative)
+        # One level of indentation: imported directly by app
+        elif name.startswith('   ') and not name.startswith('     '):
+            imports[name.strip()] = int(cumulative)
+    if total is None:
+        raise RuntimeError(f"Could not import app:\n{proc.stderr[-2000:]}")
+    return total, imports
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print(f"IMPORT TIME OF app.py: median of {RUNS} runs")
+    print("=" * 60)
+    medians = {}
+    for label, lazy in (('eager', False), ('lazy', True)):
+        runs = [import_app(lazy) for _ in range(RUNS)]
+        medians[label] = statistics.median(total for total, _ in runs)
+        print(f"\n{label:>6}: {medians[label] / 1000:.0f} ms")
+        heaviest = sorted(runs[-1][1].items(), key=lambda item: item[1], reverse=True)[:TOP_IMPORTS]
+        for name, cumulative in heaviest:
+            print(f"        {cumulative / 1000:6.0f} ms  {name}")
+    print(f"\nCold-start import time saved: {(medians['eager'] - medians['lazy']) / 1000:.0f} ms "
+          f"({1 - medians['lazy'] / medians['eager']:.0%})")
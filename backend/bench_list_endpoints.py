@@ -0,0 +1,125 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+
+# Cost of GET /api/chats/<id>/messages on one long chat: ORM objects +
+# to_dict() + Flask's stock JSON provider (the old path) against projected
+# rows + FastJSONProvider (orjson), with each half measured on its own, on a
+# scratch SQLite database. Run:  python bench_list_endpoints.py [messages] [runs]
+
+MESSAGES = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+RUNS = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='zara-bench-'), 'bench.db')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+from flask.json.provider import DefaultJSONProvider
+from flask_jwt_extended import create_access_token
+from sqlalchemy import insert
+from app import app, db, init_db_if_needed
+from models import User, Chat, Message
+import json_provider
+
+stock_json = DefaultJSONProvider(app)
+fast_json = json_provider.FastJSONProvider(app)
+
+
+def seed():
+    init_db_if_needed()
+    user = User(username='bench', email='bench@example.com', password='x')
+    db.session.add(user)
+    db.session.flush()
+    chat = Chat(user_id=user.id, title='Long chat')
+    db.session.add(chat)
+    db.session.flush()
+    started = datetime(2026, 1, 1)
+    db.session.execute(insert(Message), [{
+        'chat_id': chat.id,
+        'role': 'user' if n % 2 == 0 else 'assistant',
+        'content': f"Message {n}: " + 'lorem ipsum dolor sit amet ' * (4 if n % 2 == 0 else 20),
+        'timestamp': started + timedelta(seconds=n, microseconds=n % 7),
+    } for n in range(MESSAGES)])
+    db.session.commit()
+    return user.id, chat.id
+
+
+def orm_rows(chat_id):
+    return Message.query.filter_by(chat_id=chat_id).order_by(Message.timestamp).all()
+
+
+def projected_rows(chat_id):
+    return (
+        db.session.query(*(getattr(Message, name) for name in Message.LIST_COLUMNS))
+        .filter(Message.chat_id == chat_id)
+        .order_by(Message.timestamp, Message.id)
+        .all()
+    )
+
+
+def old_body(messages):
+    return stock_json.response([message.to_dict() for message in messages]).get_data()
+
+
+def new_body(rows):
+    return fast_json.response([Message.row_dict(row) for row in rows]).get_data()
+
+
+def stdlib_body(rows):
+    # FastJSONProvider without orjson: projected rows, standard library json
+    return (fast_json.dumps([Message.row_dict(row) for row in rows], separators=(',', ':')) + '\n').encode()
+
+
+def timed(fn, *args):
+    samples = []
+    result = None
+    for _ in range(RUNS):
+        db.session.expunge_all()
+        started = time.perf_counter()
+        result = fn(*args)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), result
+
+
+def main():
+    with app.app_context():
+        user_id, chat_id = seed()
+
+        orm_ms, messages = timed(orm_rows, chat_id)
+        projected_ms, rows = timed(projected_rows, chat_id)
+        old_ms, old = timed(old_body, messages)
+        new_ms, new = timed(new_body, rows)
+        stdlib_ms, stdlib = timed(stdlib_body, rows)
+        assert json.loads(old) == json.loads(new) == json.loads(stdlib), "response bodies differ"
+
+        token = create_access_token(identity=str(user_id))
+
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    url = f'/api/chats/{chat_id}/messages'
+    endpoint = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        response = client.get(url, headers=headers)
+        endpoint.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200 and len(response.json) == MESSAGES
+
+    print(f"{MESSAGES} messages in one chat, median of {RUNS} runs, orjson "
+          f"{'installed' if json_provider.orjson else 'not installed'}")
+    print(f"{'step':<40}{'old (ms)':>10}{'new (ms)':>10}{'speedup':>9}")
+    for label, old_value, new_value in (
+        ('load: ORM objects -> projected rows', orm_ms, projected_ms),
+        ('serialize: to_dict+stdlib -> orjson', old_ms, new_ms),
+        ('total', orm_ms + old_ms, projected_ms + new_ms),
+    ):
+        print(f"{label:<40}{old_value:>10.1f}{new_value:>10.1f}{old_value / new_value:>8.1f}x")
+    print(f"serialize, projected rows + stdlib json: {stdlib_ms:.1f} ms")
+    print(f"GET {url} end to end (new path): {statistics.median(endpoint):.1f} ms, "
+          f"{len(new) / 1024:.0f} KiB body")
+
+
+if __name__ == '__main__':
+    main()
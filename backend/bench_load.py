@@ -0,0 +1,295 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from mock_llm import start_mock_server, settings_arguments, settings_from
+
+# Load test for the backend. Starts mock_llm.py (a fake Cerebras endpoint plus
+# a Supabase stub) in this process, runs the app as a real server against it on
+# a scratch SQLite database, and drives a weighted login / chat list / chat mix
+# at each concurrency level for a fixed time. Reports throughput and
+# p50/p95/p99 latency per endpoint. --save writes the numbers as JSON and
+# --baseline prints the change against such a file, so a performance change
+# can be measured before and after.
+# Run:  python bench_load.py --concurrency 1,8,32 --duration 20 [--server uvicorn --workers 2] [--stream]
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+PASSWORD = 'bench-password'
+ENDPOINTS = ('login', 'chats', 'chat', 'chat_first_byte')
+BOOT_TIMEOUT_SECONDS = 60
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def server_command(server, port, workers):
+    if server == 'gunicorn':
+        return ['gunicorn', '-w', str(workers), '-k', 'gthread', '--threads', '8',
+                '-b', f'127.0.0.1:{port}', 'app:app']
+    if server == 'uvicorn':
+        return [sys.executable, '-m', 'uvicorn', 'asgi:application', '--host', '127.0.0.1',
+                '--port', str(port), '--workers', str(workers), '--log-level', 'warning']
+    # Flask's threaded development server, what `python app.py` runs
+    return [sys.executable, '-c',
+            f'import app; app.init_db_if_needed(); app.app.run(host="127.0.0.1", port={port}, threaded=True)']
+
+
+def start_backend(args, mock_url, scratch):
+    env = dict(os.environ,
+               DATABASE_URL='sqlite:///' + os.path.join(scratch, 'bench.db'),
+               CEREBRAS_API_KEY='bench-key',
+               CEREBRAS_BASE_URL=mock_url,
+               SEMANTIC_CACHE_PATH=os.path.join(scratch, 'semantic_cache.npz'),
+               RESPONSE_CACHE_PATH=os.path.join(scratch, 'response_cache.db'),
+               SUPABASE_OUTBOX_DIR=scratch,
+               RATE_LIMIT_PATH=os.path.join(scratch, 'rate_limit.db'),
+               # A few virtual users send far more than a person would; RATE_LIMIT_ENABLED=true measures the limiter
+               RATE_LIMIT_ENABLED=os.environ.get('RATE_LIMIT_ENABLED', 'false'),
+               LOG_LEVEL=os.environ.get('LOG_LEVEL', 'WARNING'))
+    # Empty values keep a local .env from pointing the run at the real project
+    if importlib.util.find_spec('supabase'):
+        env.update(SUPABASE_URL=mock_url, SUPABASE_KEY='bench-key')
+    else:
+        env.update(SUPABASE_URL='', SUPABASE_KEY='')
+    port = free_port()
+    proc = subprocess.Popen(server_command(args.server, port, args.workers), cwd=BACKEND_DIR, env=env,
+                            stdout=subprocess.DEVNULL if not args.verbose else None,
+                            stderr=subprocess.STDOUT if not args.verbose else None)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + BOOT_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{args.server} exited with {proc.returncode}; rerun with --verbose")
+        try:
+            if httpx.get(base_url + '/health', timeout=1).status_code == 200:
+                return proc, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"{args.server} did not answer /health within {BOOT_TIMEOUT_SECONDS}s")
+
+
+class Recorder:
+    """Latencies (seconds) of successful requests and error counts, per endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {name: [] for name in ENDPOINTS}
+        self.errors = dict.fromkeys(ENDPOINTS, 0)
+
+    def add(self, endpoint, seconds, ok):
+        with self._lock:
+            if ok:
+                self.latencies[endpoint].append(seconds)
+            else:
+                self.errors[endpoint] += 1
+
+
+def percentile(ordered, share):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+def summarize(recorder, elapsed):
+    summary = {}
+    for endpoint in ENDPOINTS:
+        ordered = sorted(recorder.latencies[endpoint])
+        if not ordered and not recorder.errors[endpoint]:
+            continue
+        summary[endpoint] = {
+            'count': len(ordered),
+            'errors': recorder.errors[endpoint],
+            'rps': len(ordered) / elapsed,
+            'p50_ms': percentile(ordered, 0.50) * 1000 if ordered else None,
+            'p95_ms': percentile(ordered, 0.95) * 1000 if ordered else None,
+            'p99_ms': percentile(ordered, 0.99) * 1000 if ordered else None,
+        }
+    return summary
+
+
+class VirtualUser:
+    """One logged-in account with its own chat and keep-alive connection"""
+
+    def __init__(self, base_url, account, stream):
+        self.client = httpx.Client(base_url=base_url, timeout=120)
+        self.email = f'{account}@bench.local'
+        self.stream = stream
+        self.turn = 0
+        self.token = self.login()[1]
+        response = self.client.post('/api/chats', json={'title': 'Load test'}, headers=self.headers)
+        response.raise_for_status()
+        self.chat_id = response.json()['id']
+
+    @property
+    def headers(self):
+        return {'Authorization': f'Bearer {self.token}'}
+
+    def login(self):
+        response = self.client.post('/api/login', json={'email': self.email, 'password': PASSWORD})
+        return response.status_code == 200, response.json().get('token') if response.status_code == 200 else None
+
+    def list_chats(self):
+        return self.client.get('/api/chats', headers=self.headers).status_code == 200
+
+    def chat(self, recorder, started):
+        self.turn += 1
+        # Unique prompts, so the response and semantic caches don't answer
+        body = {'message': f'Load test turn {self.turn} from {self.email}: {random.random()}',
+                'chatId': self.chat_id, 'stream': self.stream}
+        if not self.stream:
+            return self.client.post('/api/chat', json=body, headers=self.headers).status_code == 200
+        with self.client.stream('POST', '/api/chat', json=body, headers=self.headers) as response:
+            first = True
+            for _ in response.iter_bytes():
+                if first:
+                    recorder.add('chat_first_byte', time.perf_counter() - started, response.status_code == 200)
+                    first = False
+            return response.status_code == 200
+
+    def close(self):
+        self.client.close()
+
+
+def register(base_url, account):
+    response = httpx.post(base_url + '/api/register', timeout=60,
+                          json={'username': account, 'email': f'{account}@bench.local', 'password': PASSWORD})
+    if response.status_code not in (201, 409):
+        raise RuntimeError(f"Could not register {account}: {response.status_code} {response.text[:200]}")
+
+
+def drive(user, recorder, deadline, weights, seed):
+    rng = random.Random(seed)
+    operations = [name for name, weight in weights.items() for _ in range(weight)]
+    while time.monotonic() < deadline:
+        operation = rng.choice(operations)
+        started = time.perf_counter()
+        try:
+            if operation == 'login':
+                ok = user.login()[0]
+            elif operation == 'chats':
+                ok = user.list_chats()
+            else:
+                ok = user.chat(recorder, started)
+        except httpx.HTTPError:
+            ok = False
+        recorder.add(operation, time.perf_counter() - started, ok)
+
+
+def run_level(base_url, users, concurrency, args, weights):
+    recorder = Recorder()
+    started = time.monotonic()
+    deadline = started + args.duration
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for index in range(concurrency):
+            pool.submit(drive, users[index], recorder, deadline, weights, index)
+    return summarize(recorder, time.monotonic() - started)
+
+
+def print_level(concurrency, summary, baseline):
+    # chat_first_byte is a second timing of the chat requests, not more requests
+    requests = [row for name, row in summary.items() if name != 'chat_first_byte']
+    print(f"\nconcurrency {concurrency}: {sum(row['count'] for row in requests)} requests, "
+          f"{sum(row['rps'] for row in requests):.1f} req/s, {sum(row['errors'] for row in requests)} errors")
+    print(f"  {'endpoint':<16}{'count':>7}{'errors':>7}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          + (f"{'p95 vs base':>13}" if baseline else ''))
+    for endpoint, row in summary.items():
+        cells = ''.join(f"{row[key]:>9.1f}" if row[key] is not None else f"{'-':>9}"
+                        for key in ('p50_ms', 'p95_ms', 'p99_ms'))
+        line = f"  {endpoint:<16}{row['count']:>7}{row['errors']:>7}{row['rps']:>8.1f}{cells}"
+        base = (baseline or {}).get(str(concurrency), {}).get(endpoint)
+        if base and base.get('p95_ms') and row['p95_ms']:
+            line += f"{row['p95_ms'] / base['p95_ms'] - 1:>+13.0%}"
+        print(line)
+
+
+def parse_weights(text):
+    weights = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ('login', 'chats', 'chat'):
+            raise SystemExit(f"Unknown operation in --mix: {name}")
+        weights[name] = int(weight)
+    return weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the backend against a mock Cerebras server')
+    parser.add_argument('--concurrency', default='1,8,32', help='comma-separated levels (default %(default)s)')
+    parser.add_argument('--duration', type=float, default=15.0, help='seconds per level')
+    parser.add_argument('--mix', default='login=1,chats=4,chat=5', help='operation weights')
+    parser.add_argument('--stream', action='store_true', help='request SSE streaming from /api/chat')
+    parser.add_argument('--server', choices=('flask', 'gunicorn', 'uvicorn'), default='flask')
+    parser.add_argument('--workers', type=int, default=1, help='gunicorn / uvicorn worker processes')
+    parser.add_argument('--save', help='write the results as JSON to this path')
+    parser.add_argument('--baseline', help='JSON from an earlier --save run to compare against')
+    parser.add_argument('--verbose', action='store_true', help="show the server's output")
+    settings_arguments(parser)
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(',')]
+    weights = parse_weights(args.mix)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['levels']
+
+    mock, mock_url = start_mock_server(settings=settings_from(args))
+    scratch = tempfile.mkdtemp(prefix='zara-load-')
+    proc, base_url = start_backend(args, mock_url, scratch)
+    users = []
+    try:
+        accounts = [f'load{n}' for n in range(max(levels))]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda account: register(base_url, account), accounts))
+            users = list(pool.map(lambda account: VirtualUser(base_url, account, args.stream), accounts))
+
+        print("=" * 78)
+        print(f"LOAD TEST: {args.server} x{args.workers}, {args.duration:.0f}s per level, mix {args.mix}, "
+              f"{'streaming' if args.stream else 'non-streaming'}")
+        print(f"mock model: {args.latency * 1000:.0f}ms to first token, {args.tokens_per_second:.0f} tok/s, "
+              f"{args.reply_tokens} tokens, error rate {args.error_rate:.0%}")
+        print("=" * 78)
+        results = {}
+        for concurrency in levels:
+            httpx.post(mock_url + '/stats')
+            results[str(concurrency)] = run_level(base_url, users, concurrency, args, weights)
+            print_level(concurrency, results[str(concurrency)], baseline)
+            print(f"  mock: {httpx.get(mock_url + '/stats').json()}")
+
+        if args.save:
+            with open(args.save, 'w', encoding='utf-8') as f:
+                json.dump({'config': {key: value for key, value in vars(args).items()
+                                      if key not in ('save', 'baseline', 'verbose')},
+                           'levels': results}, f, indent=2)
+            print(f"\nSaved results to {args.save}")
+    finally:
+        for user in users:
+            user.close()
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        mock.shutdown()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
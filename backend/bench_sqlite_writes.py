@@ -0,0 +1,87 @@
+import os
+import sys
+import time
+import tempfile
+import subprocess
+from datetime import datetime
+
+# Multi-process write benchmark for the SQLite profiles in db_config.py.
+# Each process plays chat turns the way /api/chat does: insert the user
+# message + update the chat title (commit), then insert the assistant reply
+# (commit). Run:  python bench_sqlite_writes.py [processes] [turns_per_process]
+
+WORKER_MODE = len(sys.argv) > 1 and sys.argv[1] == '--worker'
+PROCESSES = int(sys.argv[1]) if len(sys.argv) > 1 and not WORKER_MODE else 8
+TURNS = int(sys.argv[2]) if len(sys.argv) > 2 and not WORKER_MODE else 200
+
+
+def worker(db_path, turns):
+    from sqlalchemy import create_engine, insert, update
+    from sqlalchemy.exc import OperationalError
+    from db_config import sqlite_engine_options
+    from models import Chat, Message
+
+    engine = create_engine(f'sqlite:///{db_path}', **sqlite_engine_options())
+    chat_table, message_table = Chat.__table__, Message.__table__
+    done = errors = 0
+    started = time.perf_counter()
+    for turn in range(turns):
+        try:
+            with engine.begin() as conn:
+                conn.execute(insert(message_table).values(chat_id=1, role='user', content=f'question {turn}', timestamp=datetime.utcnow()))
+                conn.execute(update(chat_table).where(chat_table.c.id == 1).values(title=f'question {turn}'))
+            with engine.begin() as conn:
+                conn.execute(insert(message_table).values(chat_id=1, role='assistant', content='answer ' * 50, timestamp=datetime.utcnow()))
+            done += 1
+        except OperationalError:
+            errors += 1
+    print(f"{done} {errors} {time.perf_counter() - started}")
+
+
+def run(profile):
+    from sqlalchemy import create_engine, insert
+    from models import db, User, Chat
+
+    tmp_dir = tempfile.mkdtemp(prefix='zara-bench-')
+    db_path = os.path.join(tmp_dir, 'bench.db')
+    engine = create_engine(f'sqlite:///{db_path}')
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User.__table__).values(id=1, username='bench', email='bench@example.com', password='x'))
+        conn.execute(insert(Chat.__table__).values(id=1, user_id=1, title='New Chat', created_at=datetime.utcnow()))
+    engine.dispose()
+
+    env = dict(os.environ, SQLITE_PROFILE=profile)
+    procs = [
+        subprocess.Popen([sys.executable, __file__, '--worker', db_path, str(TURNS)], env=env,
+                         stdout=subprocess.PIPE, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        for _ in range(PROCESSES)
+    ]
+    turns = errors = 0
+    elapsed = 0.0
+    for proc in procs:
+        out, _ = proc.communicate()
+        done, failed, seconds = out.split()
+        turns += int(done)
+        errors += int(failed)
+        # Slowest worker's write loop; excludes interpreter startup and imports
+        elapsed = max(elapsed, float(seconds))
+    return turns, errors, elapsed
+
+
+if __name__ == '__main__':
+    if WORKER_MODE:
+        worker(sys.argv[2], int(sys.argv[3]))
+        sys.exit(0)
+
+    print("=" * 60)
+    print(f"SQLITE WRITE BENCHMARK: {PROCESSES} processes x {TURNS} chat turns")
+    print("=" * 60)
+    results = {}
+    for profile in ('default', 'tuned'):
+        turns, errors, elapsed = run(profile)
+        results[profile] = turns / elapsed
+        print(f"{profile:>8}: {turns} turns in {elapsed:.2f}s = {turns / elapsed:.1f} turns/s, "
+              f"{errors} 'database is locked' failures")
+    if results['default']:
+        print(f"\nSpeedup: {results['tuned'] / results['default']:.1f}x")
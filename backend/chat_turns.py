@@ -0,0 +1,104 @@
+from datetime import datetime
+from sqlalchemy import insert, update, select, func
+from models import db, User, Chat, Message
+from history import chat_history
+from etags import bump_chat, bump_chat_owner
+
+
+class ChatTurnRecord:
+    """
+    Persistence unit for one /api/chat turn.
+
+    The chat (ownership and title) and the user's email are read once, in a
+    single query, when the turn starts and held as plain values for the rest of
+    the request, so they survive the thread hop in asgi.py. The user message
+    and the assistant reply are then written in one transaction once the reply
+    is known, together with the chat's title when it is still 'New Chat'.
+    The chat list a client fetches after the reply already shows it.
+    """
+
+    def __init__(self, chat_id, user_email, title, user_message, summary=None, unsummarized=0):
+        self.chat_id = chat_id
+        self.user_email = user_email
+        self.title = title
+        self.summary = summary
+        # Stored messages newer than the ones the summary covers
+        self.unsummarized = unsummarized
+        self.user_message = user_message
+        # When the user spoke, not when the model finished; keeps the transcript order
+        self.user_timestamp = datetime.utcnow()
+        self.saved = False
+        self.titled = False
+
+    @classmethod
+    def load(cls, current_user_id, chat_id, user_message, count_unsummarized=False):
+        """
+        The record for this turn, or None for guests. chat_id is dropped when
+        the chat does not belong to the user, so nothing is written for it.
+        count_unsummarized also counts the messages the stored summary doesn't
+        cover, in the same query.
+        """
+        if not current_user_id:
+            return None
+        user_id = int(current_user_id)
+        if chat_id:
+            columns = [Chat.title, Chat.summary, User.email]
+            if count_unsummarized:
+                columns.append(
+                    select(func.count(Message.id))
+                    .where(Message.chat_id == Chat.id, Message.id > func.coalesce(Chat.summary_message_id, 0))
+                    .correlate(Chat)
+                    .scalar_subquery()
+                    .label('unsummarized')
+                )
+            row = (
+                db.session.query(*columns)
+                .join(User, Chat.user_id == User.id)
+                .filter(Chat.id == chat_id, Chat.user_id == user_id)
+                .first()
+            )
+            if row:
+                return cls(chat_id, row.email, row.title, user_message, row.summary,
+                           row.unsummarized if count_unsummarized else 0)
+        email = db.session.query(User.email).filter(User.id == user_id).scalar()
+        return cls(None, email, None, user_message)
+
+    def save(self, response_text=None):
+        """
+        Write the turn in one transaction: the user message, the reply (the
+        fallback reply when every model failed; a streamed turn whose client
+        left before any reply keeps just the question) and the title of a
+        'New Chat'. Runs at most once per turn; True when this call wrote it.
+        `titled` is set when this turn named the chat.
+        """
+        if self.saved or not self.chat_id:
+            return False
+        self.saved = True
+
+        rows = [{'chat_id': self.chat_id, 'role': 'user', 'content': self.user_message, 'timestamp': self.user_timestamp}]
+        if response_text is not None:
+            rows.append({'chat_id': self.chat_id, 'role': 'assistant', 'content': response_text, 'timestamp': datetime.utcnow()})
+        try:
+            # One multi-row INSERT; ids are matched back by role, which is unique per turn
+            ids = dict(db.session.execute(
+                insert(Message).values(rows).returning(Message.role, Message.id)
+            ).all())
+            # Invalidates the message list ETag in the same transaction
+            db.session.execute(bump_chat(self.chat_id))
+            if self.title == 'New Chat':
+                # Guarded on the old title so a rename made meanwhile is kept
+                self.titled = bool(db.session.execute(
+                    update(Chat).where(Chat.id == self.chat_id, Chat.title == 'New Chat')
+                    .values(title=self.user_message[:30])
+                ).rowcount)
+                if self.titled:
+                    db.session.execute(bump_chat_owner(self.chat_id))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            self.titled = False
+            raise
+
+        for row in rows:
+            chat_history.append(self.chat_id, ids[row['role']], row['role'], row['content'])
+        return True
@@ -0,0 +1,115 @@
+import re
+import sys
+from datetime import datetime
+from app import app, init_db_if_needed, chat_list_query, message_list_query
+from models import db, Chat, Message
+from migrations import current_version
+from pagination import keyset_query, encode_cursor
+
+# Set UTF-8 encoding for Windows console
+if sys.platform == 'win32':
+    import codecs
+    sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer, 'strict')
+
+CURSOR = encode_cursor(datetime(2026, 1, 1), 1000)
+
+
+def message_page(**cursor):
+    return keyset_query(message_list_query(1), Message.timestamp, Message.id, **cursor)
+
+
+def chat_page(**cursor):
+    return keyset_query(chat_list_query(1), Chat.created_at, Chat.id, **cursor)
+
+
+# Hot queries, built by the same helpers the endpoints use, with the index
+# each one must use and the column the index search must be bounded on (a
+# cursor page that only matches the index prefix scans every older row)
+HOT_QUERIES = [
+    (
+        "Chat transcript (get_chat_messages)",
+        lambda: message_list_query(1).order_by(Message.timestamp, Message.id),
+        'ix_message_chat_id_timestamp', None,
+    ),
+    ("Newest transcript page", lambda: message_page(), 'ix_message_chat_id_timestamp', None),
+    ("Transcript page before a cursor", lambda: message_page(before=CURSOR), 'ix_message_chat_id_timestamp', 'timestamp'),
+    ("Transcript page after a cursor", lambda: message_page(after=CURSOR), 'ix_message_chat_id_timestamp', 'timestamp'),
+    (
+        "History window (chat_history)",
+        lambda: db.session.query(Message.id, Message.role, Message.content).filter(Message.chat_id == 1)
+        .order_by(Message.timestamp.desc(), Message.id.desc()).limit(50),
+        'ix_message_chat_id_timestamp', None,
+    ),
+    (
+        "Chat list (get_user_chats)",
+        lambda: chat_list_query(1).order_by(Chat.created_at.desc()),
+        'ix_chat_user_id_created_at', None,
+    ),
+    ("Chat list page before a cursor", lambda: chat_page(before=CURSOR), 'ix_chat_user_id_created_at', 'created_at'),
+]
+
+
+def explain(query):
+    """Plan lines for `query` on the configured backend (SQLite or PostgreSQL)"""
+    compiled = query.statement.compile(dialect=db.engine.dialect)
+    with db.engine.connect() as conn:
+        if db.engine.dialect.name == 'sqlite':
+            params = tuple(compiled.params[name] for name in compiled.positiontup)
+            rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).fetchall()
+            return [row[-1] for row in rows]
+        # Test databases are tiny, where Postgres would rightly prefer a seq scan
+        conn.exec_driver_sql("SET enable_seqscan = off")
+        rows = conn.exec_driver_sql(f"EXPLAIN {compiled}", compiled.params).fetchall()
+        return [row[0] for row in rows]
+
+
+def bounded_on(plan, index_name, column):
+    """True when the index search itself is bounded on `column`, not just filtered afterwards"""
+    for step in plan:
+        # SQLite: SEARCH message USING INDEX ix_... (chat_id=? AND timestamp<?)
+        if index_name in step and re.search(rf"\b{column}[<>]", step):
+            return True
+        # PostgreSQL: Index Cond: ((chat_id = 1) AND (ROW("timestamp", id) < ROW(...)))
+        if 'Index Cond' in step and column in step:
+            return True
+    return False
+
+
+def needs_sort(plan):
+    """True when the database sorts rows itself instead of reading them in index order"""
+    return any('TEMP B-TREE' in step or step.lstrip(' ->').startswith('Sort') for step in plan)
+
+
+def plan_ok(plan, index_name, bound=None):
+    """Served by `index_name` in index order, with the search bounded on `bound` when given"""
+    uses_index = any(index_name in step for step in plan)
+    return uses_index and not needs_sort(plan) and (bound is None or bounded_on(plan, index_name, bound))
+
+
+def main():
+    print("=" * 60)
+    print("ZARA - HOT QUERY PLAN CHECK")
+    print("=" * 60)
+
+    init_db_if_needed()
+    failures = 0
+    with app.app_context():
+        print(f"Schema version: {current_version(db.engine)}\n")
+        for name, build, index_name, bound in HOT_QUERIES:
+            plan = explain(build())
+            ok = plan_ok(plan, index_name, bound)
+            failures += not ok
+            print(f"[{'OK' if ok else 'FAIL'}] {name}")
+            for step in plan:
+                print(f"       {step}")
+
+    print("\n" + "=" * 60)
+    if failures:
+        print(f"{failures} hot query(ies) not served by their index")
+        return 1
+    print("All hot queries use their indexes")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,65 @@
+import os
+import threading
+from logs import get_logger
+
+log = get_logger('clients')
+
+# 'true' (default): heavy clients and optional modules are built on first use,
+# so importing the app (worker boot, cold start) doesn't pay for them.
+# 'false': everything is built while the app is imported, as before.
+LAZY_INIT = os.getenv('LAZY_INIT', 'true').lower() == 'true'
+
+
+class LazyClient:
+    """
+    A client (or optional module) built by `factory` on first use.
+
+    The factory runs at most once per process even when several request
+    threads ask at the same time. It may return None when the client isn't
+    configured; if it raises (missing package, bad credentials) the error is
+    logged and the client stays None, as the eager setup used to behave.
+    """
+
+    def __init__(self, name, factory):
+        self.name = name
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._value = None
+
+    def get(self):
+        if self._loaded:
+            return self._value
+        with self._lock:
+            if not self._loaded:
+                try:
+                    self._value = self._factory()
+                except Exception as e:
+                    log.error("Failed to initialize client", client=self.name, error=str(e))
+                    self._value = None
+                self._loaded = True
+        return self._value
+
+    @classmethod
+    def holding(cls, name, value):
+        """A LazyClient that already holds `value` (callers passing a ready object)"""
+        client = cls(name, None)
+        client.set(value)
+        return client
+
+    def peek(self):
+        """The client if it has been built already, without building it"""
+        return self._value if self._loaded else None
+
+    def set(self, value):
+        """Replace the client (tests, benchmarks, scripted fakes)"""
+        with self._lock:
+            self._value = value
+            self._loaded = True
+
+
+def preload(*clients):
+    """Build every client now unless LAZY_INIT is on"""
+    if not LAZY_INIT:
+        for client in clients:
+            client.get()
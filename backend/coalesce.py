@@ -0,0 +1,323 @@
+import os
+import time
+import asyncio
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from logs import get_logger
+from response_cache import response_cache, SQLiteBackend, RESPONSE_CACHE_BACKEND
+
+try:
+    import fcntl
+except ImportError:  # Windows: requests are coalesced within one worker only
+    fcntl = None
+
+log = get_logger('coalesce')
+
+# Identical concurrent prompts share one upstream completion
+COALESCE_ENABLED = os.getenv('COALESCE_ENABLED', 'true').lower() == 'true'
+# Also across the workers on one host, for non-streamed single-turn prompts: the first
+# worker holds a lock file while it asks the model, the others wait and then
+# read its reply from the response cache. Only with RESPONSE_CACHE_BACKEND=sqlite:
+# a waiter can't see a per-worker cache, so the lock would just make workers
+# ask the model one after another.
+COALESCE_ACROSS_WORKERS = os.getenv('COALESCE_ACROSS_WORKERS', 'false').lower() == 'true'
+COALESCE_LOCK_DIR = os.getenv(
+    'COALESCE_LOCK_DIR',
+    os.path.join(os.path.abspath(os.path.dirname(__file__)), 'instance', 'flights')
+)
+# Longest a worker waits on another worker's flight before asking the model itself
+COALESCE_WAIT_SECONDS = float(os.getenv('COALESCE_WAIT_SECONDS', '30'))
+LOCK_POLL_SECONDS = 0.05
+LOCK_PRUNE_SECONDS = 600
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Blocking calls with the same key that overlap in time run once: the first
+    caller runs fn, the others wait for it and get its result or exception.
+    do() returns (result, shared), shared being True for the waiters.
+    """
+
+    def __init__(self, enabled=COALESCE_ENABLED):
+        self.enabled = enabled
+        self.shared = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        if key is None or not self.enabled:
+            return fn(), False
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines on one event loop (asgi.py)"""
+
+    def __init__(self, enabled=COALESCE_ENABLED):
+        self.enabled = enabled
+        self.shared = 0
+        self._calls = {}
+
+    async def do(self, key, fn):
+        if key is None or not self.enabled:
+            return await fn(), False
+        task = self._calls.get(key)
+        shared = task is not None
+        if shared:
+            self.shared += 1
+        else:
+            # A task of its own, so a leader whose client disconnects doesn't cancel the call for the others
+            task = self._calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(task), shared
+
+
+class StreamFlight:
+    """
+    One upstream token stream, buffered so every request that joined it gets
+    the whole stream from the first frame on, whenever it joined. Readers can
+    be threads (follow) or coroutines (follow_async). `state` holds what the
+    producer reports at the end (completed, usage).
+    """
+
+    def __init__(self):
+        self.items = []
+        self.done = False
+        self.readers = 0
+        self.state = {'completed': False, 'usage': None}
+        self._cond = threading.Condition()
+        self._async_waiters = []  # (loop, asyncio.Event)
+
+    def publish(self, item):
+        with self._cond:
+            self.items.append(item)
+            self._wake()
+
+    def close(self):
+        with self._cond:
+            self.done = True
+            self._wake()
+
+    def _wake(self):
+        self._cond.notify_all()
+        for loop, event in self._async_waiters:
+            loop.call_soon_threadsafe(event.set)
+        self._async_waiters = []
+
+    def follow(self):
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self.items) and not self.done:
+                    self._cond.wait()
+                items, done = self.items[index:], self.done
+            index += len(items)
+            yield from items
+            if done and index >= len(self.items):
+                return
+
+    async def follow_async(self):
+        index = 0
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                items, done = self.items[index:], self.done
+                if not items and not done:
+                    event = asyncio.Event()
+                    self._async_waiters.append((loop, event))
+            if not items and not done:
+                await event.wait()
+                continue
+            index += len(items)
+            for item in items:
+                yield item
+            if done and index >= len(self.items):
+                return
+
+
+class StreamFlights:
+    """
+    Registry of in-flight token streams. join() attaches a request to the
+    stream for its key, calling start(flight) to begin producing when there
+    is none yet. A producer should stop when abandoned() says every reader
+    left, and must call finish() when it is done.
+    """
+
+    def __init__(self, enabled=COALESCE_ENABLED):
+        self.enabled = enabled
+        self.shared = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def join(self, key, start):
+        """(flight, leader); the caller must leave() when it stops reading"""
+        with self._lock:
+            flight = self._flights.get(key) if key is not None and self.enabled else None
+            leader = flight is None
+            if leader:
+                flight = StreamFlight()
+                if key is not None and self.enabled:
+                    self._flights[key] = flight
+            else:
+                self.shared += 1
+            flight.readers += 1
+        if leader:
+            start(flight)
+        return flight, leader
+
+    def leave(self, flight):
+        with self._lock:
+            flight.readers -= 1
+
+    def abandoned(self, key, flight):
+        """True (and the flight unregistered, so nobody joins it late) once no request reads it"""
+        with self._lock:
+            if flight.readers:
+                return False
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            return True
+
+    def finish(self, key, flight):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.close()
+
+
+class FlightLock:
+    """
+    Host-wide lock file for one prompt key (fcntl.flock), so workers on the
+    same host don't ask the model the same single-turn question at once.
+    """
+
+    _last_prune = 0.0
+
+    def __init__(self, key):
+        self.key = key
+        self._handle = None
+
+    def try_acquire(self):
+        """True once held; False while another worker holds it. An unusable lock
+        directory counts as held, so requests go ahead uncoalesced."""
+        try:
+            if self._handle is None:
+                os.makedirs(COALESCE_LOCK_DIR, exist_ok=True)
+                self._handle = open(os.path.join(COALESCE_LOCK_DIR, f'{self.key}.lock'), 'a')
+            fcntl.flock(self._handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+        except OSError as e:
+            log.warning("Flight lock unavailable", error=str(e))
+            self.release(False)
+            return True
+
+    def release(self, acquired):
+        if self._handle is None:
+            return
+        if acquired:
+            fcntl.flock(self._handle, fcntl.LOCK_UN)
+        self._handle.close()
+        self._handle = None
+        FlightLock._prune()
+
+    @classmethod
+    def _prune(cls):
+        # One file per prompt key; drop the idle ones now and then. A file removed
+        # while held only lets two workers ask the model once, it can't deadlock.
+        now = time.time()
+        if now - cls._last_prune < LOCK_PRUNE_SECONDS:
+            return
+        cls._last_prune = now
+        try:
+            for entry in os.scandir(COALESCE_LOCK_DIR):
+                if now - entry.stat().st_mtime > LOCK_PRUNE_SECONDS:
+                    os.unlink(entry.path)
+        except OSError:
+            pass
+
+
+def _shared_cache():
+    return isinstance(response_cache.backend, SQLiteBackend)
+
+
+def _flight_lock(key):
+    if COALESCE_ACROSS_WORKERS and fcntl and key and _shared_cache():
+        return FlightLock(key)
+    return None
+
+
+@contextmanager
+def worker_flight_lock(key):
+    """
+    Hold the host-wide lock for `key`, yielding True, or yield False without it
+    when cross-worker coalescing is off (or the response cache isn't shared)
+    or another worker kept it longer than COALESCE_WAIT_SECONDS. Holding it, re-check the response cache: the
+    previous holder may just have stored the reply.
+    """
+    lock = _flight_lock(key)
+    acquired = False
+    try:
+        if lock:
+            deadline = time.monotonic() + COALESCE_WAIT_SECONDS
+            while not (acquired := lock.try_acquire()) and time.monotonic() < deadline:
+                time.sleep(LOCK_POLL_SECONDS)
+        yield acquired
+    finally:
+        if lock:
+            lock.release(acquired)
+
+
+@asynccontextmanager
+async def async_worker_flight_lock(key):
+    """worker_flight_lock for the event loop: polls without blocking it"""
+    lock = _flight_lock(key)
+    acquired = False
+    try:
+        if lock:
+            deadline = time.monotonic() + COALESCE_WAIT_SECONDS
+            while not (acquired := lock.try_acquire()) and time.monotonic() < deadline:
+                await asyncio.sleep(LOCK_POLL_SECONDS)
+        yield acquired
+    finally:
+        if lock:
+            lock.release(acquired)
+
+
+# From the setting: the cache store itself is opened on first use
+if COALESCE_ACROSS_WORKERS and RESPONSE_CACHE_BACKEND != 'sqlite':
+    log.warning("COALESCE_ACROSS_WORKERS needs the sqlite response cache; coalescing within each worker only",
+                response_cache=RESPONSE_CACHE_BACKEND)
+
+single_flight = SingleFlight()
+async_single_flight = AsyncSingleFlight()
+stream_flights = StreamFlights()
@@ -0,0 +1,108 @@
+import os
+import sqlite3
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+
+# 'tuned' applies the WAL/pragma profile below to every SQLite connection; 'default' leaves SQLite stock
+SQLITE_PROFILE = os.getenv('SQLITE_PROFILE', 'tuned')
+SQLITE_POOL_SIZE = int(os.getenv('SQLITE_POOL_SIZE', '5'))
+SQLITE_MAX_OVERFLOW = int(os.getenv('SQLITE_MAX_OVERFLOW', '10'))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+
+# PostgreSQL pool, sized per process: workers x (pool + overflow) must stay under max_connections
+PG_POOL_SIZE = int(os.getenv('PG_POOL_SIZE', '10'))
+PG_MAX_OVERFLOW = int(os.getenv('PG_MAX_OVERFLOW', '20'))
+PG_POOL_RECYCLE_SECONDS = int(os.getenv('PG_POOL_RECYCLE_SECONDS', '1800'))
+# psycopg prepares a statement server-side after it has run this many times on a connection
+# (set to -1 to disable, e.g. behind PgBouncer in transaction pooling mode)
+PG_PREPARE_THRESHOLD = int(os.getenv('PG_PREPARE_THRESHOLD', '5'))
+
+# Applied on every new connection, since most pragmas are per-connection
+SQLITE_PRAGMAS = {
+    # Readers never block the writer and vice versa; one writer at a time
+    'journal_mode': 'WAL',
+    # In WAL mode this only syncs at checkpoints: durable against app crashes,
+    # may lose the last transactions on power loss
+    'synchronous': 'NORMAL',
+    # Wait for the write lock instead of failing with "database is locked"
+    'busy_timeout': SQLITE_BUSY_TIMEOUT_MS,
+    'mmap_size': 256 * 1024 * 1024,
+    # Negative means KiB: 64MB page cache per connection
+    'cache_size': -64000,
+    'temp_store': 'MEMORY',
+}
+
+
+def database_url(default_sqlite_path):
+    """
+    DATABASE_URL when set (any SQLAlchemy URL), else the local SQLite file.
+    Hosting providers hand out postgres:// URLs; those are pointed at the
+    psycopg 3 driver, which supports server-side prepared statements.
+    """
+    url = os.getenv('DATABASE_URL')
+    if not url:
+        return f'sqlite:///{default_sqlite_path}'
+    for prefix in ('postgres://', 'postgresql://'):
+        if url.startswith(prefix):
+            return 'postgresql+psycopg://' + url[len(prefix):]
+    return url
+
+
+def redact_url(url):
+    """URL safe for logs: password replaced"""
+    return make_url(url).render_as_string(hide_password=True)
+
+
+def engine_options(url):
+    """SQLALCHEMY_ENGINE_OPTIONS tuned for the backend behind `url`"""
+    backend = make_url(url).get_backend_name()
+    if backend == 'sqlite':
+        return sqlite_engine_options()
+    if backend == 'postgresql':
+        return postgres_engine_options()
+    return {'pool_pre_ping': True}
+
+
+def postgres_engine_options():
+    return {
+        'pool_size': PG_POOL_SIZE,
+        'max_overflow': PG_MAX_OVERFLOW,
+        # Drop connections the server (or a proxy) closed while idle, before handing them out
+        'pool_pre_ping': True,
+        'pool_recycle': PG_POOL_RECYCLE_SECONDS,
+        'connect_args': {
+            'prepare_threshold': PG_PREPARE_THRESHOLD if PG_PREPARE_THRESHOLD >= 0 else None,
+            'application_name': 'zara-backend',
+        },
+    }
+
+
+def sqlite_engine_options(profile=SQLITE_PROFILE):
+    """SQLALCHEMY_ENGINE_OPTIONS for a file-backed SQLite database"""
+    if profile != 'tuned':
+        return {}
+    return {
+        'pool_size': SQLITE_POOL_SIZE,
+        'max_overflow': SQLITE_MAX_OVERFLOW,
+        'pool_timeout': 30,
+        'connect_args': {
+            'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000.0,
+            # Pooled connections are handed to whichever thread checks them out
+            'check_same_thread': False,
+        },
+    }
+
+
+def apply_sqlite_pragmas(dbapi_connection):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+@event.listens_for(Engine, 'connect')
+def _on_connect(dbapi_connection, connection_record):
+    if SQLITE_PROFILE == 'tuned' and isinstance(dbapi_connection, sqlite3.Connection):
+        apply_sqlite_pragmas(dbapi_connection)
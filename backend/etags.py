@@ -0,0 +1,47 @@
+import hashlib
+from sqlalchemy import select, update
+from models import User, Chat
+
+# Version counters behind the ETags of the list endpoints:
+#   chat.version        bumped with every message written to the chat
+#                       (GET /api/chats/<id>/messages)
+#   user.chats_version  bumped when one of the user's chats is created,
+#                       renamed or deleted (GET /api/chats)
+# Every write that changes what a list returns must run the matching bump in
+# its own transaction. A conditional GET then costs one primary-key lookup.
+
+
+def bump_chat(chat_id):
+    return update(Chat).where(Chat.id == chat_id).values(version=Chat.version + 1)
+
+
+def bump_user_chats(user_id):
+    return update(User).where(User.id == user_id).values(chats_version=User.chats_version + 1)
+
+
+def bump_chat_owner(chat_id):
+    """bump_user_chats for whoever owns chat_id (background jobs know only the chat)"""
+    owner = select(Chat.user_id).where(Chat.id == chat_id).scalar_subquery()
+    return update(User).where(User.id == owner).values(chats_version=User.chats_version + 1)
+
+
+def etag_for(*parts):
+    """
+    Opaque strong ETag over the parts. Callers include the query string, since
+    each page has its own body, and chat.created_at for chats, because SQLite
+    can hand a deleted chat's id to the next new one.
+    """
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()[:20]
+
+
+def not_modified(request, etag):
+    """True when the request's If-None-Match already names `etag`"""
+    # Weak comparison, as If-None-Match requires; proxies that compress turn strong tags weak
+    return request.if_none_match.contains_weak(etag)
+
+
+def conditional(response, etag):
+    """Attach the ETag; browsers must revalidate before reusing the body"""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,150 @@
+import os
+import re
+import json
+import string
+import time
+import threading
+from logs import get_logger
+
+log = get_logger('fallback')
+
+# Intent table for fallback mode (no model available). Each intent lists
+# words and phrases matched as whole words, case-insensitively; when several intents
+# match, the one listed first wins. '{message}' in the default reply is
+# replaced by the start of the user's message.
+FALLBACK_INTENTS_PATH = os.getenv(
+    'FALLBACK_INTENTS_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fallback_intents.json')
+)
+# How often (seconds) the file's mtime is checked for edits
+FALLBACK_RELOAD_INTERVAL = float(os.getenv('FALLBACK_RELOAD_INTERVAL', '2'))
+# Tables up to this size are scanned pattern by pattern; bigger ones go through
+# the keyword index, whose cost doesn't grow with the table. They break even
+# at about 25 intents (bench_fallback.py).
+SCAN_MAX_INTENTS = 25
+
+
+# ASCII punctuation splits words like whitespace ("hi!" -> "hi"); '_' is a word character
+_PUNCTUATION = str.maketrans({char: ' ' for char in string.punctuation if char != '_'})
+# The same separators for the scan's regexes: whitespace and that punctuation
+_SEPARATORS = '\\s' + re.escape(''.join(char for char in string.punctuation if char != '_'))
+_SEPARATOR = f'[{_SEPARATORS}]'
+_WORD_CHAR = f'[^{_SEPARATORS}]'
+
+
+def words_of(text):
+    return text.lower().translate(_PUNCTUATION).split()
+
+
+def _scan_entry(tokens, index):
+    """
+    (needle, search, index) for one pattern. It can only match when its
+    longest word is a substring of the lowercased message, which `in` checks
+    far faster than a regex; the regex then confirms the words are whole and
+    in order, on the same separators as words_of().
+    """
+    regex = re.compile(f'(?<!{_WORD_CHAR})' + f'{_SEPARATOR}+'.join(map(re.escape, tokens)) + f'(?!{_WORD_CHAR})')
+    return max(tokens, key=len), regex.search, index
+
+
+def compile_intents(table):
+    """
+    Small tables (up to SCAN_MAX_INTENTS intents) are scanned pattern by
+    pattern in table order. Bigger ones get a keyword index: single words go
+    in a dict (one hash lookup per word of the message, however many patterns
+    there are); phrases are matched against the message's space-joined words,
+    so they also only ever match whole words.
+    Returns (scan or None, words, phrases, [response per intent], default response).
+    """
+    words, phrases, responses, scan = {}, [], [], []
+    for index, intent in enumerate(table['intents']):
+        for pattern in intent['patterns']:
+            tokens = words_of(pattern)
+            if len(tokens) == 1:
+                words.setdefault(tokens[0], index)
+            elif tokens:
+                phrases.append((' ' + ' '.join(tokens) + ' ', index))
+            if tokens:
+                scan.append(_scan_entry(tokens, index))
+        responses.append(intent['response'])
+    if len(responses) > SCAN_MAX_INTENTS:
+        scan = None
+    return scan, words, phrases, responses, table['default']
+
+
+class FallbackResponder:
+    """Intent table compiled once, recompiled when the file changes"""
+
+    def __init__(self, path=FALLBACK_INTENTS_PATH, reload_interval=FALLBACK_RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = 0.0
+        self._compiled = ([], {}, [], [], "")
+        self._reload()
+
+    def _reload(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError as e:
+            log.warning("Could not load fallback intents", path=self.path, error=str(e))
+            return
+        if mtime == self._mtime:
+            return
+        # Recorded even if the file is broken, so it is retried once edited again, not every check
+        self._mtime = mtime
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                compiled = compile_intents(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            # Keep answering from the last good table
+            log.warning("Could not load fallback intents", path=self.path, error=str(e))
+            return
+        self._compiled = compiled
+        log.info("Loaded fallback intents", intents=len(compiled[3]), path=self.path)
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        with self._lock:
+            if now - self._checked_at < self.reload_interval:
+                return
+            self._checked_at = now
+            self._reload()
+
+    @staticmethod
+    def intent_index(compiled, message):
+        """Index of the first-listed intent matching the message, or None"""
+        scan, words, phrases = compiled[0], compiled[1], compiled[2]
+        if scan is not None:
+            # In table order, so the first match is the first-listed intent
+            lowered = message.lower()
+            for needle, search, index in scan:
+                if needle in lowered and search(lowered):
+                    return index
+            return None
+        tokens = words_of(message)
+        best = None
+        for token in tokens:
+            index = words.get(token)
+            if index is not None and (best is None or index < best):
+                best = index
+        if phrases:
+            joined = ' ' + ' '.join(tokens) + ' '
+            for phrase, index in phrases:
+                if (best is None or index < best) and phrase in joined:
+                    best = index
+        return best
+
+    def respond(self, message):
+        self._maybe_reload()
+        # One snapshot, so a reload mid-call cannot pair an index with another table
+        compiled = self._compiled
+        index = self.intent_index(compiled, message)
+        if index is None:
+            return compiled[4].replace('{message}', message[:30])
+        return compiled[3][index]
+
+
+fallback_responder = FallbackResponder()
@@ -0,0 +1,204 @@
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from model_health import model_health, ModelsUnavailableError
+from metrics import MODEL_CALL_LATENCY, MODEL_HEDGES
+from logs import get_logger
+
+log = get_logger('hedging')
+
+# Delay before hedging to the next model while the tracker has too few samples
+HEDGE_DELAY_SECONDS = float(os.getenv('HEDGE_DELAY_SECONDS', '2.0'))
+# Bounds for the p95-derived hedge delay
+HEDGE_MIN_DELAY_SECONDS = float(os.getenv('HEDGE_MIN_DELAY_SECONDS', '0.25'))
+HEDGE_MAX_DELAY_SECONDS = float(os.getenv('HEDGE_MAX_DELAY_SECONDS', '10.0'))
+# Threads shared by all in-flight hedged calls in this worker
+HEDGE_MAX_WORKERS = int(os.getenv('HEDGE_MAX_WORKERS', '32'))
+
+LATENCY_WINDOW = 200
+MIN_SAMPLES = 20
+
+
+class LatencyTracker:
+    """Sliding window of successful completion latencies per model"""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, model_name, seconds):
+        with self._lock:
+            samples = self._samples.get(model_name)
+            if samples is None:
+                samples = self._samples[model_name] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def percentile(self, model_name, pct):
+        with self._lock:
+            samples = sorted(self._samples.get(model_name, ()))
+        if len(samples) < MIN_SAMPLES:
+            return None
+        index = min(len(samples) - 1, int(round(pct / 100.0 * (len(samples) - 1))))
+        return samples[index]
+
+
+class HedgedDispatcher:
+    """
+    Runs one completion across an ordered list of models.
+
+    The first model starts immediately. If it has not answered within the hedge
+    delay (its observed p95 latency), the next model is started alongside it;
+    a failure starts the next model right away. The first successful reply wins
+    and the others are cancelled (not-yet-started calls) or left to finish and
+    discarded (in-flight HTTP calls cannot be interrupted).
+    """
+
+    def __init__(self, default_delay=HEDGE_DELAY_SECONDS, max_workers=HEDGE_MAX_WORKERS, tracker=None, health=None):
+        self.default_delay = default_delay
+        self.tracker = tracker or LatencyTracker()
+        self.health = health
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hedge')
+
+    def hedge_delay(self, model_name):
+        p95 = self.tracker.percentile(model_name, 95)
+        if p95 is None:
+            return self.default_delay
+        return min(HEDGE_MAX_DELAY_SECONDS, max(HEDGE_MIN_DELAY_SECONDS, p95))
+
+    def _call(self, client, model_name, messages, params):
+        started = time.monotonic()
+        try:
+            completion = client.chat.completions.create(model=model_name, messages=messages, stream=False, **params)
+            if not (completion.choices and completion.choices[0].message and completion.choices[0].message.content):
+                raise ValueError(f"Empty completion from {model_name}")
+        except Exception as e:
+            MODEL_CALL_LATENCY.observe(time.monotonic() - started, model=model_name, outcome='error')
+            if self.health:
+                self.health.record_failure(model_name, e)
+            raise
+        latency = time.monotonic() - started
+        MODEL_CALL_LATENCY.observe(latency, model=model_name, outcome='success')
+        self.tracker.record(model_name, latency)
+        if self.health:
+            self.health.record_success(model_name, latency)
+        return completion
+
+    def complete(self, client, model_names, messages, **params):
+        """
+        Return (model_name, completion) from the first model to succeed.
+        Raises the last error seen if every model fails.
+        """
+        queue = list(model_names)
+        if not queue:
+            raise ModelsUnavailableError("Quota backoff: every model is rate limited or unhealthy")
+        pending = {}
+        last_error = None
+
+        def launch():
+            model_name = queue.pop(0)
+            log.sampled("Trying model", model=model_name)
+            future = self._executor.submit(self._call, client, model_name, messages, params)
+            pending[future] = model_name
+            return model_name
+
+        newest = launch()
+        while pending:
+            timeout = self.hedge_delay(newest) if queue else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done:
+                # Slow primary: hedge with the next model without giving up on it
+                log.info("No reply yet, hedging", model=newest, waited_s=round(timeout, 2))
+                MODEL_HEDGES.inc(model=newest)
+                newest = launch()
+                continue
+
+            for future in done:
+                model_name = pending.pop(future)
+                error = future.exception()
+                if error is None:
+                    for other in pending:
+                        other.cancel()
+                    return model_name, future.result()
+                log.warning("Model failed", model=model_name, error=str(error))
+                last_error = error
+
+            # A failure hands over to the next model straight away
+            if queue:
+                newest = launch()
+
+        raise last_error
+
+    async def _call_async(self, client, model_name, messages, params):
+        started = time.monotonic()
+        try:
+            completion = await client.chat.completions.create(model=model_name, messages=messages, stream=False, **params)
+            if not (completion.choices and completion.choices[0].message and completion.choices[0].message.content):
+                raise ValueError(f"Empty completion from {model_name}")
+        except asyncio.CancelledError:
+            MODEL_CALL_LATENCY.observe(time.monotonic() - started, model=model_name, outcome='cancelled')
+            raise
+        except Exception as e:
+            MODEL_CALL_LATENCY.observe(time.monotonic() - started, model=model_name, outcome='error')
+            if self.health:
+                self.health.record_failure(model_name, e)
+            raise
+        latency = time.monotonic() - started
+        MODEL_CALL_LATENCY.observe(latency, model=model_name, outcome='success')
+        self.tracker.record(model_name, latency)
+        if self.health:
+            self.health.record_success(model_name, latency)
+        return completion
+
+    async def complete_async(self, client, model_names, messages, **params):
+        """
+        Same hedging policy as complete() for an async client. Losing calls are
+        real asyncio cancellations here, so their HTTP requests are aborted.
+        """
+        queue = list(model_names)
+        if not queue:
+            raise ModelsUnavailableError("Quota backoff: every model is rate limited or unhealthy")
+        pending = {}
+        last_error = None
+
+        def launch():
+            model_name = queue.pop(0)
+            log.sampled("Trying model", model=model_name)
+            task = asyncio.ensure_future(self._call_async(client, model_name, messages, params))
+            pending[task] = model_name
+            return model_name
+
+        newest = launch()
+        try:
+            while pending:
+                timeout = self.hedge_delay(newest) if queue else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    log.info("No reply yet, hedging", model=newest, waited_s=round(timeout, 2))
+                    MODEL_HEDGES.inc(model=newest)
+                    newest = launch()
+                    continue
+
+                for task in done:
+                    model_name = pending.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        return model_name, task.result()
+                    log.warning("Model failed", model=model_name, error=str(error))
+                    last_error = error
+
+                if queue:
+                    newest = launch()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        raise last_error
+
+
+model_dispatcher = HedgedDispatcher(health=model_health)
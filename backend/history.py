@@ -0,0 +1,77 @@
+import os
+import threading
+from collections import OrderedDict
+from sqlalchemy import func
+from models import db, Message
+
+# How many of the most recent messages are loaded to rebuild a chat's context
+HISTORY_LIMIT = int(os.getenv('CHAT_HISTORY_LIMIT', '50'))
+# How many chats each worker keeps in memory before evicting the least recently used
+HISTORY_CACHE_SIZE = int(os.getenv('CHAT_HISTORY_CACHE_SIZE', '512'))
+
+
+class ChatHistoryCache:
+    """
+    Per-process LRU cache of recent chat history, keyed by chat id.
+
+    Each entry remembers the id of the newest message it holds. On lookup we
+    compare that against MAX(message.id) for the chat (a single indexed probe),
+    so writes made by another gunicorn worker are picked up instead of serving
+    a stale transcript.
+    """
+
+    def __init__(self, limit=HISTORY_LIMIT, max_chats=HISTORY_CACHE_SIZE):
+        self.limit = limit
+        self.max_chats = max_chats
+        self._entries = OrderedDict()  # chat_id -> (last_message_id, [{'role', 'content'}])
+        self._lock = threading.Lock()
+
+    def _load(self, chat_id):
+        rows = (
+            db.session.query(Message.id, Message.role, Message.content)
+            .filter(Message.chat_id == chat_id)
+            .order_by(Message.timestamp.desc(), Message.id.desc())
+            .limit(self.limit)
+            .all()
+        )
+        rows.reverse()
+        last_id = rows[-1].id if rows else None
+        return last_id, [{'role': row.role, 'content': row.content} for row in rows]
+
+    def get(self, chat_id):
+        """Return the most recent messages of a chat, oldest first"""
+        latest_id = db.session.query(func.max(Message.id)).filter(Message.chat_id == chat_id).scalar()
+
+        with self._lock:
+            entry = self._entries.get(chat_id)
+            if entry and entry[0] == latest_id:
+                self._entries.move_to_end(chat_id)
+                return list(entry[1])
+
+        last_id, messages = self._load(chat_id)
+        self._store(chat_id, last_id, messages)
+        return list(messages)
+
+    def append(self, chat_id, message_id, role, content):
+        """Record a freshly committed message so the next turn is a cache hit"""
+        with self._lock:
+            entry = self._entries.get(chat_id)
+            if not entry:
+                return
+            messages = entry[1] + [{'role': role, 'content': content}]
+            self._entries[chat_id] = (message_id, messages[-self.limit:])
+            self._entries.move_to_end(chat_id)
+
+    def invalidate(self, chat_id):
+        with self._lock:
+            self._entries.pop(chat_id, None)
+
+    def _store(self, chat_id, last_id, messages):
+        with self._lock:
+            self._entries[chat_id] = (last_id, messages)
+            self._entries.move_to_end(chat_id)
+            while len(self._entries) > self.max_chats:
+                self._entries.popitem(last=False)
+
+
+chat_history = ChatHistoryCache()
@@ -0,0 +1,318 @@
+import os
+import json
+import time
+import queue
+import atexit
+import sqlite3
+import threading
+from contextlib import nullcontext
+from logs import get_logger
+
+log = get_logger('jobs')
+
+# 'thread': jobs run on a small thread pool inside each web worker.
+# 'sqlite': web workers only record jobs in a local SQLite queue and a
+# separate process (python worker.py) runs them.
+JOBS_BACKEND = os.getenv('JOBS_BACKEND', 'thread')
+JOBS_PATH = os.getenv(
+    'JOBS_PATH',
+    os.path.join(os.path.abspath(os.path.dirname(__file__)), 'instance', 'jobs.db')
+)
+# Jobs running at once per process
+JOBS_WORKERS = int(os.getenv('JOBS_WORKERS', '2'))
+JOBS_QUEUE_SIZE = int(os.getenv('JOBS_QUEUE_SIZE', '1000'))
+JOBS_MAX_ATTEMPTS = int(os.getenv('JOBS_MAX_ATTEMPTS', '3'))
+JOBS_BACKOFF_SECONDS = float(os.getenv('JOBS_BACKOFF', '1.0'))
+# How often an idle sqlite worker looks for new jobs
+JOBS_POLL_SECONDS = float(os.getenv('JOBS_POLL_SECONDS', '0.25'))
+# A claimed sqlite job whose worker died is handed out again after this long
+JOBS_LEASE_SECONDS = float(os.getenv('JOBS_LEASE_SECONDS', '300'))
+
+
+class Job:
+    def __init__(self, name, args, attempts=0, job_id=None):
+        self.id = job_id
+        self.name = name
+        self.args = args
+        self.attempts = attempts
+
+    def signature(self):
+        return json.dumps([self.name, self.args], sort_keys=True)
+
+
+class ThreadQueue:
+    """Jobs in this process's memory; a retry waits on a timer, not in a worker"""
+
+    def __init__(self, max_size=JOBS_QUEUE_SIZE):
+        self.queue = queue.Queue(maxsize=max_size)
+        self._waiting = set()  # signatures of the unique jobs not yet claimed
+        self._lock = threading.Lock()
+
+    def put(self, job, delay=0, unique=False):
+        if delay:
+            timer = threading.Timer(delay, self.put, (job,))
+            timer.daemon = True
+            timer.start()
+            return True
+        if unique:
+            with self._lock:
+                if job.signature() in self._waiting:
+                    return True
+                self._waiting.add(job.signature())
+        try:
+            self.queue.put_nowait(job)
+            return True
+        except queue.Full:
+            if unique:
+                with self._lock:
+                    self._waiting.discard(job.signature())
+            return False
+
+    def claim(self, timeout):
+        try:
+            job = self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        with self._lock:
+            self._waiting.discard(job.signature())
+        job.attempts += 1
+        return job
+
+    def ack(self, job):
+        pass
+
+    def retry(self, job, delay, error):
+        self.put(job, delay)
+
+    def fail(self, job, error):
+        pass
+
+    def depth(self):
+        return self.queue.qsize()
+
+
+class SQLiteQueue:
+    """
+    Jobs in a local SQLite file (WAL) shared by every process on the host.
+    A job is claimed by one UPDATE ... RETURNING that leases it for
+    JOBS_LEASE_SECONDS, so a crashed worker's jobs run again. Jobs out of
+    attempts stay in the table with status 'failed' for inspection.
+    """
+
+    CLAIM = (
+        "UPDATE jobs SET attempts = attempts + 1, leased_until = :now + :lease"
+        " WHERE id = (SELECT id FROM jobs WHERE status = 'queued' AND run_after <= :now"
+        "  AND (leased_until IS NULL OR leased_until < :now) ORDER BY run_after, id LIMIT 1)"
+        " RETURNING id, name, args, attempts"
+    )
+
+    def __init__(self, path=JOBS_PATH, lease=JOBS_LEASE_SECONDS, poll=JOBS_POLL_SECONDS):
+        self.path = path
+        self.lease = lease
+        self.poll = poll
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY, name TEXT NOT NULL, args TEXT NOT NULL,"
+            " status TEXT NOT NULL DEFAULT 'queued', attempts INTEGER NOT NULL DEFAULT 0,"
+            " run_after REAL NOT NULL, leased_until REAL, error TEXT)"
+        )
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def put(self, job, delay=0, unique=False):
+        args = json.dumps(job.args, sort_keys=True)
+        if not unique:
+            self._connect().execute(
+                "INSERT INTO jobs (name, args, run_after) VALUES (?, ?, ?)", (job.name, args, time.time() + delay)
+            )
+            return True
+        # Skipped while the same job waits unclaimed; one already running may have read stale data
+        now = time.time()
+        self._connect().execute(
+            "INSERT INTO jobs (name, args, run_after) SELECT ?, ?, ? WHERE NOT EXISTS ("
+            " SELECT 1 FROM jobs WHERE name = ? AND args = ? AND status = 'queued'"
+            " AND (leased_until IS NULL OR leased_until < ?))",
+            (job.name, args, now + delay, job.name, args, now)
+        )
+        return True
+
+    def claim(self, timeout):
+        row = self._connect().execute(self.CLAIM, {'now': time.time(), 'lease': self.lease}).fetchone()
+        if row is None:
+            time.sleep(min(timeout, self.poll))
+            return None
+        job_id, name, args, attempts = row
+        return Job(name, json.loads(args), attempts, job_id)
+
+    def ack(self, job):
+        self._connect().execute("DELETE FROM jobs WHERE id = ?", (job.id,))
+
+    def retry(self, job, delay, error):
+        self._connect().execute(
+            "UPDATE jobs SET run_after = ?, leased_until = NULL, error = ? WHERE id = ?",
+            (time.time() + delay, error, job.id)
+        )
+
+    def fail(self, job, error):
+        self._connect().execute(
+            "UPDATE jobs SET status = 'failed', leased_until = NULL, error = ? WHERE id = ?", (error, job.id)
+        )
+
+    def depth(self):
+        return self._connect().execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+
+class JobRunner:
+    """
+    Post-response work (chat titles, summaries, Supabase mirroring) off the
+    request path.
+
+    Tasks are registered by name with @runner.task(name) and queued with
+    enqueue(name, **args); arguments must be JSON-serializable so the sqlite
+    backend can hand them to another process. At most `workers` jobs run at
+    once per process, each inside `context()` (the Flask app context). A
+    failing job is retried with exponential backoff up to `max_attempts`
+    times. When the in-process queue is full the job runs on the caller's
+    thread rather than being dropped. enqueue(name, unique=True, **args)
+    drops the job when an identical one is still waiting to be claimed.
+    """
+
+    def __init__(self, backend, context=None, workers=JOBS_WORKERS,
+                 max_attempts=JOBS_MAX_ATTEMPTS, backoff=JOBS_BACKOFF_SECONDS):
+        self.backend = backend
+        self.context = context or nullcontext
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        # With the sqlite backend a web process only enqueues; worker.py calls work()
+        self.in_process = isinstance(backend, ThreadQueue)
+        self.tasks = {}
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+        self._pid = None
+        self._stopping = threading.Event()
+        self._threads = []
+        self._start_lock = threading.Lock()
+
+    def task(self, name):
+        def register(fn):
+            self.tasks[name] = fn
+            return fn
+        return register
+
+    def enqueue(self, name, unique=False, **args):
+        job = Job(name, args)
+        try:
+            if self.in_process:
+                self._ensure_started()
+            if self.backend.put(job, unique=unique):
+                return
+            log.warning("Job queue full; running job inline", job=name)
+        except Exception as e:
+            log.warning("Could not queue job; running it inline", job=name, error=str(e))
+        job.attempts = 1
+        self._execute(job, inline=True)
+
+    def _ensure_started(self):
+        # Threads don't survive a fork, so (re)start lazily in each gunicorn worker
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._stopping.clear()
+            self._threads = [
+                threading.Thread(target=self._run, name=f"jobs-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+            self._pid = os.getpid()
+            atexit.register(self.stop)
+
+    def _run(self):
+        # In-process workers drain their queue on shutdown; sqlite jobs wait for the next worker
+        while not self._stopping.is_set() or (self.in_process and self.backend.depth()):
+            try:
+                job = self.backend.claim(timeout=1.0)
+            except Exception as e:
+                log.error("Could not claim job", error=str(e))
+                time.sleep(1.0)
+                continue
+            if job is not None:
+                self._execute(job)
+
+    def _execute(self, job, inline=False):
+        fn = self.tasks.get(job.name)
+        try:
+            if fn is None:
+                raise LookupError(f"Unknown job {job.name!r}")
+            with self.context():
+                fn(**job.args)
+        except Exception as e:
+            if inline or fn is None or job.attempts >= self.max_attempts:
+                self.failed += 1
+                log.error("Job failed", job=job.name, attempts=job.attempts, error=str(e))
+                if not inline:
+                    self.backend.fail(job, str(e))
+                return
+            self.retried += 1
+            delay = self.backoff * (2 ** (job.attempts - 1))
+            log.warning("Job failed, retrying", job=job.name, attempt=f"{job.attempts}/{self.max_attempts}",
+                        retry_in=delay, error=str(e))
+            self.backend.retry(job, delay, str(e))
+            return
+        self.completed += 1
+        if not inline:
+            self.backend.ack(job)
+
+    def work(self):
+        """Run jobs from the shared queue until interrupted (the worker.py process)"""
+        self._ensure_started()
+        log.info("Job worker started", workers=self.workers, backend=type(self.backend).__name__)
+        try:
+            while any(thread.is_alive() for thread in self._threads):
+                time.sleep(1.0)
+        except KeyboardInterrupt:
+            self.stop()
+
+    def stop(self, timeout=5.0):
+        """Drain what we can before exit; in-memory jobs left after `timeout` are lost"""
+        if self._pid != os.getpid():
+            return
+        self._stopping.set()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+    def stats(self):
+        try:
+            depth = self.backend.depth()
+        except Exception:
+            depth = None
+        return {
+            'backend': 'thread' if self.in_process else 'sqlite',
+            'queue_depth': depth,
+            'completed': self.completed,
+            'retried': self.retried,
+            'failed': self.failed,
+        }
+
+
+def create_job_runner(context=None):
+    if JOBS_BACKEND == 'sqlite':
+        try:
+            return JobRunner(SQLiteQueue(), context)
+        except Exception as e:
+            log.warning("Failed to open SQLite job queue, running jobs in-process", error=str(e))
+    return JobRunner(ThreadQueue(), context)
@@ -0,0 +1,93 @@
+import os
+import sys
+import json
+import random
+import logging
+from datetime import datetime, timezone
+
+# Leveled logging for the backend, replacing bare print() calls.
+#   LOG_LEVEL        DEBUG / INFO / WARNING / ERROR (default INFO)
+#   LOG_FORMAT       'text' (default) or 'json', one object per line for log drains
+#   LOG_SAMPLE_RATE  share of per-request hot-path lines written (default 1.0);
+#                    0 switches them off entirely, warnings and errors are never sampled
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '1.0'))
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        payload.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += ' ' + ' '.join(f'{key}={value}' for key, value in fields.items())
+        return line
+
+
+def _configure():
+    root = logging.getLogger('zara')
+    if root.handlers:
+        return root
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else TextFormatter())
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    root.propagate = False
+    return root
+
+
+class Log:
+    """
+    Logger taking a constant message plus key=value fields, so a disabled
+    level costs one isEnabledFor() check and no string formatting.
+    """
+
+    def __init__(self, name):
+        self._logger = _configure().getChild(name)
+
+    def _log(self, level, message, fields, exc_info=False):
+        if self._logger.isEnabledFor(level):
+            self._logger.log(level, message, exc_info=exc_info, extra={'fields': fields})
+
+    def debug(self, message, **fields):
+        self._log(logging.DEBUG, message, fields)
+
+    def info(self, message, **fields):
+        self._log(logging.INFO, message, fields)
+
+    def warning(self, message, **fields):
+        self._log(logging.WARNING, message, fields)
+
+    def error(self, message, **fields):
+        self._log(logging.ERROR, message, fields)
+
+    def exception(self, message, **fields):
+        """ERROR with the current traceback"""
+        self._log(logging.ERROR, message, fields, exc_info=True)
+
+    def sampled(self, message, **fields):
+        """INFO line on a per-request hot path, kept for LOG_SAMPLE_RATE of calls"""
+        if LOG_SAMPLE_RATE <= 0 or (LOG_SAMPLE_RATE < 1 and random.random() >= LOG_SAMPLE_RATE):
+            return
+        self._log(logging.INFO, message, fields)
+
+
+def get_logger(name):
+    return Log(name)
@@ -0,0 +1,226 @@
+import os
+import time
+import bisect
+import threading
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# In-process metrics rendered in the Prometheus text format at /metrics.
+# Each gunicorn worker keeps its own numbers; scrape every worker (or run one
+# worker per container) to see them all.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+
+# Seconds; spans a local SQLite probe up to a slow model completion
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}  # label values tuple -> value
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(self._render_samples(items))
+        return lines
+
+    def _render_samples(self, items):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}' for key, value in items]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (not cumulative) plus one overflow slot, sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        """Context manager observing the duration of its block"""
+        return _Timer(self, labels)
+
+    def _render_samples(self, items):
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(float(bound))))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class CallbackGauge(_Metric):
+    """Value read at scrape time (queue depths, sizes) instead of being pushed"""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, callback, kind='gauge'):
+        super().__init__(name, documentation)
+        self.callback = callback
+        self.kind = kind
+
+    def render(self):
+        try:
+            value = self.callback()
+        except Exception:
+            value = None
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        if value is not None:
+            lines.append(f'{self.name} {_format_value(value)}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            # Re-registering (e.g. module reloaded) keeps the first instance
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name, documentation, callback, kind='gauge'):
+        with self._lock:
+            # Callbacks are replaced, so the newest owner of the value reports it
+            metric = self._metrics[name] = CallbackGauge(name, documentation, callback, kind)
+        return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+HTTP_REQUESTS = registry.counter(
+    'zara_http_requests_total', 'HTTP requests by route and status', ('method', 'endpoint', 'status'))
+HTTP_LATENCY = registry.histogram(
+    'zara_http_request_duration_seconds', 'Time until the response headers were ready', ('method', 'endpoint'))
+DB_QUERY_LATENCY = registry.histogram(
+    'zara_db_query_duration_seconds', 'Database statement execution time', ('operation',))
+DB_QUERY_ERRORS = registry.counter(
+    'zara_db_query_errors_total', 'Database statements that raised', ('operation',))
+MODEL_CALL_LATENCY = registry.histogram(
+    'zara_model_call_duration_seconds', 'Cerebras completion time per model', ('model', 'outcome'))
+MODEL_TTFT = registry.histogram(
+    'zara_model_time_to_first_token_seconds', 'Streaming: request sent until the first token', ('model',))
+MODEL_HEDGES = registry.counter(
+    'zara_model_hedges_total', 'Hedged requests started because a model was slow', ('model',))
+CACHE_LOOKUPS = registry.counter(
+    'zara_cache_lookups_total', 'Response cache lookups', ('cache', 'result'))
+RATE_LIMITED = registry.counter(
+    'zara_rate_limited_total', 'Chat requests rejected with 429', ('reason',))
+
+
+def _operation(statement):
+    head = statement.lstrip().split(None, 1)
+    return head[0].upper() if head else 'UNKNOWN'
+
+
+def instrument_engines():
+    """Time every statement on every SQLAlchemy engine in this process"""
+    if not METRICS_ENABLED or event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        return
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(Engine, 'handle_error', _handle_error)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('metrics_query_started')
+    if started:
+        DB_QUERY_LATENCY.observe(time.perf_counter() - started.pop(), operation=_operation(statement))
+
+
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    started = conn.info.get('metrics_query_started') if conn is not None else None
+    if started:
+        started.pop()
+    DB_QUERY_ERRORS.inc(operation=_operation(exception_context.statement or ''))
@@ -0,0 +1,152 @@
+from datetime import datetime
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import DBAPIError
+from models import db, User, Chat, Message
+from logs import get_logger
+
+log = get_logger('migrations')
+
+# Ordered schema migrations. Each one runs once per database, in its own
+# transaction, and its number is recorded in the schema_version table.
+# Append new migrations to the end; never edit or reorder shipped ones.
+MIGRATIONS = []
+
+
+def migration(version, description):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return register
+
+
+def _index(model, name):
+    return next(index for index in model.__table__.indexes if index.name == name)
+
+
+@migration(1, 'Base tables (user, chat, message)')
+def create_base_tables(conn):
+    # checkfirst: databases created by the old create_all() path already have them
+    db.metadata.create_all(conn, checkfirst=True)
+
+
+@migration(2, 'Indexes for the chat list and message history queries')
+def create_hot_path_indexes(conn):
+    _index(Message, 'ix_message_chat_id_timestamp').create(conn, checkfirst=True)
+    _index(Chat, 'ix_chat_user_id_created_at').create(conn, checkfirst=True)
+
+
+@migration(3, 'Full-text search index over message content')
+def create_message_search_index(conn):
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text(
+            "ALTER TABLE message ADD COLUMN IF NOT EXISTS content_tsv tsvector"
+            " GENERATED ALWAYS AS (to_tsvector('english', content)) STORED"
+        ))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_message_content_tsv ON message USING GIN (content_tsv)"))
+        return
+    if conn.dialect.name != 'sqlite':
+        log.warning("Skipping full-text index: dialect not supported", dialect=conn.dialect.name)
+        return
+
+    # External-content FTS5 table over a view, so the index holds tokens only.
+    # 'owner' carries the chat's user as a token ("u42"): MATCHing it narrows
+    # the search to one user's messages before anything is ranked.
+    conn.execute(text(
+        "CREATE VIEW IF NOT EXISTS message_search_source AS"
+        " SELECT m.id AS id, m.content AS content, 'u' || c.user_id AS owner"
+        " FROM message m JOIN chat c ON c.id = m.chat_id"
+    ))
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS message_fts USING fts5("
+        "content, owner, content='message_search_source', content_rowid='id', tokenize='porter unicode61')"
+    ))
+    owner = "(SELECT 'u' || user_id FROM chat WHERE id = {}.chat_id)"
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS message_fts_insert AFTER INSERT ON message BEGIN"
+        f" INSERT INTO message_fts(rowid, content, owner) VALUES (new.id, new.content, {owner.format('new')}); END"
+    ))
+    # The index must be told the old values; delete_chat removes messages before their chat
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS message_fts_delete AFTER DELETE ON message BEGIN"
+        " INSERT INTO message_fts(message_fts, rowid, content, owner)"
+        f" VALUES ('delete', old.id, old.content, {owner.format('old')}); END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS message_fts_update AFTER UPDATE OF content ON message BEGIN"
+        " INSERT INTO message_fts(message_fts, rowid, content, owner)"
+        f" VALUES ('delete', old.id, old.content, {owner.format('old')});"
+        f" INSERT INTO message_fts(rowid, content, owner) VALUES (new.id, new.content, {owner.format('new')}); END"
+    ))
+    # Index the messages written before this migration
+    conn.execute(text("INSERT INTO message_fts(message_fts) VALUES ('rebuild')"))
+
+
+@migration(4, 'Stored chat summaries for the background summarization job')
+def add_chat_summary_columns(conn):
+    # Databases created after this release got the columns from create_all() in migration 1
+    existing = {column['name'] for column in inspect(conn).get_columns('chat')}
+    for column in (Chat.__table__.c.summary, Chat.__table__.c.summary_message_id):
+        if column.name not in existing:
+            conn.execute(text(f"ALTER TABLE chat ADD COLUMN {column.name} {column.type.compile(conn.dialect)}"))
+
+
+@migration(5, 'Version counters for the chat list and message list ETags')
+def add_version_counters(conn):
+    for model, column in ((Chat, 'version'), (User, 'chats_version')):
+        table = model.__table__.name
+        if column in {c['name'] for c in inspect(conn).get_columns(table)}:
+            continue
+        # "user" is a reserved word in PostgreSQL
+        conn.execute(text(
+            f"ALTER TABLE {conn.dialect.identifier_preparer.quote(table)}"
+            f" ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0"
+        ))
+
+
+def _ensure_version_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        " version INTEGER PRIMARY KEY, description VARCHAR(200) NOT NULL, applied_at TIMESTAMP NOT NULL)"
+    ))
+
+
+def current_version(engine):
+    if not inspect(engine).has_table('schema_version'):
+        return 0
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version")).scalar()
+
+
+def run_migrations(engine):
+    """
+    Bring the database at `engine` up to the latest schema in place.
+    Safe to call from several workers at once: each migration re-checks the
+    recorded version inside its transaction and is idempotent by design.
+    """
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+
+    def is_applied(conn, version):
+        return conn.execute(
+            text("SELECT 1 FROM schema_version WHERE version = :version"), {'version': version}
+        ).first() is not None
+
+    applied = []
+    for version, description, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+        try:
+            with engine.begin() as conn:
+                if is_applied(conn, version):
+                    continue
+                log.info("Applying migration", version=version, description=description)
+                fn(conn)
+                conn.execute(
+                    text("INSERT INTO schema_version (version, description, applied_at) VALUES (:v, :d, :t)"),
+                    {'v': version, 'd': description, 't': datetime.utcnow()}
+                )
+                applied.append(version)
+        except DBAPIError:
+            # Another worker may have applied it concurrently; only re-raise if it didn't
+            with engine.connect() as conn:
+                if not is_applied(conn, version):
+                    raise
+    return applied
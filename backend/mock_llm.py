@@ -0,0 +1,202 @@
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from urllib.parse import urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for the remote services the backend talks to, for load tests:
+#   POST /v1/chat/completions   Cerebras/OpenAI chat completions, plain or
+#                               streamed (SSE), with configurable latency,
+#                               token rate and error rate
+#   GET|POST /rest/v1/<table>   a Supabase (PostgREST) stub: selects return no
+#                               rows, inserts are counted and dropped
+#   GET /stats                  request counters, reset with POST /stats
+# Point the backend at it with CEREBRAS_BASE_URL=http://127.0.0.1:<port> and
+# SUPABASE_URL=http://127.0.0.1:<port>.
+# Run:  python mock_llm.py --port 8090 --latency 0.3 --tokens-per-second 400 --error-rate 0.01
+
+
+class MockSettings:
+    def __init__(self, latency=0.2, jitter=0.05, tokens_per_second=500.0, reply_tokens=60,
+                 error_rate=0.0, error_status=503, supabase_latency=0.02):
+        self.latency = latency                  # seconds until the first token / the response
+        self.jitter = jitter                    # +- uniform noise on latency
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+        self.error_rate = error_rate            # share of completions answered with error_status
+        self.error_status = error_status
+        self.supabase_latency = supabase_latency
+
+
+class MockStats:
+    KEYS = ('completions', 'streamed', 'errors', 'supabase_selects', 'supabase_rows')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = dict.fromkeys(self.KEYS, 0)
+
+    def reset(self):
+        with self._lock:
+            self.counts = dict.fromkeys(self.KEYS, 0)
+
+    def bump(self, key, amount=1):
+        with self._lock:
+            self.counts[key] += amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counts)
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real endpoints
+    settings = MockSettings()
+    stats = MockStats()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'null') if length else None
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == '/stats':
+            self._send_json(200, self.stats.snapshot())
+        elif path.startswith('/rest/v1/'):
+            self.stats.bump('supabase_selects')
+            self._sleep(self.settings.supabase_latency)
+            self._send_json(200, [])
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        body = self._body()
+        if path == '/v1/chat/completions':
+            self._completion(body or {})
+        elif path.startswith('/rest/v1/'):
+            rows = body if isinstance(body, list) else [body]
+            self.stats.bump('supabase_rows', len(rows))
+            self._sleep(self.settings.supabase_latency)
+            self._send_json(201, rows if 'return=representation' in self.headers.get('Prefer', '') else [])
+        elif path == '/stats':
+            self.stats.reset()
+            self._send_json(200, self.stats.snapshot())
+        elif path == '/v1/tcp_warming':
+            self._send_json(200, {})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def _completion(self, request):
+        settings = self.settings
+        self.stats.bump('completions')
+        self._sleep(settings.latency + random.uniform(-settings.jitter, settings.jitter))
+        if random.random() < settings.error_rate:
+            self.stats.bump('errors')
+            self._send_json(settings.error_status, {'error': {'message': 'mock overloaded', 'type': 'server_error'}})
+            return
+
+        model = request.get('model', 'mock')
+        tokens = [f'tok{n} ' for n in range(settings.reply_tokens)]
+        created = int(time.time())
+        usage = {'prompt_tokens': sum(len(str(m.get('content', ''))) // 4 for m in request.get('messages', [])),
+                 'completion_tokens': len(tokens)}
+        usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+        per_token = 1.0 / settings.tokens_per_second if settings.tokens_per_second > 0 else 0.0
+
+        if not request.get('stream'):
+            self._sleep(per_token * len(tokens))
+            self._send_json(200, {
+                'id': f'chatcmpl-mock-{created}', 'object': 'chat.completion', 'created': created, 'model': model,
+                'system_fingerprint': 'mock',
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': ''.join(tokens)}}],
+                'usage': usage,
+            })
+            return
+
+        self.stats.bump('streamed')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for index, token in enumerate(tokens):
+            last = index == len(tokens) - 1
+            self._write_event({
+                'id': f'chatcmpl-mock-{created}', 'object': 'chat.completion.chunk', 'created': created,
+                'model': model, 'system_fingerprint': 'mock',
+                'choices': [{'index': 0, 'delta': {'content': token}, 'finish_reason': 'stop' if last else None}],
+                **({'usage': usage} if last else {}),
+            })
+            self._sleep(per_token)
+        self._write_chunk(b'data: [DONE]\n\n')
+        self._write_chunk(b'')
+
+    def _write_event(self, payload):
+        self._write_chunk(b'data: ' + json.dumps(payload).encode() + b'\n\n')
+
+    def _write_chunk(self, data):
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+
+def start_mock_server(host='127.0.0.1', port=0, settings=None):
+    """Serve the mock on a daemon thread; returns (server, base_url)"""
+    if settings is not None:
+        MockHandler.settings = settings
+    server = ThreadingHTTPServer((host, port), MockHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name='mock-llm').start()
+    return server, f'http://{host}:{server.server_address[1]}'
+
+
+def settings_arguments(parser):
+    """Mock knobs, shared with bench_load.py"""
+    defaults = MockSettings()
+    parser.add_argument('--latency', type=float, default=defaults.latency,
+                        help='seconds until the first token (default %(default)s)')
+    parser.add_argument('--jitter', type=float, default=defaults.jitter)
+    parser.add_argument('--tokens-per-second', type=float, default=defaults.tokens_per_second)
+    parser.add_argument('--reply-tokens', type=int, default=defaults.reply_tokens)
+    parser.add_argument('--error-rate', type=float, default=defaults.error_rate,
+                        help='share of completions answered with --error-status')
+    parser.add_argument('--error-status', type=int, default=defaults.error_status)
+    parser.add_argument('--supabase-latency', type=float, default=defaults.supabase_latency)
+
+
+def settings_from(args):
+    return MockSettings(latency=args.latency, jitter=args.jitter, tokens_per_second=args.tokens_per_second,
+                        reply_tokens=args.reply_tokens, error_rate=args.error_rate,
+                        error_status=args.error_status, supabase_latency=args.supabase_latency)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Mock Cerebras + Supabase server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    settings_arguments(parser)
+    args = parser.parse_args()
+    server, url = start_mock_server(args.host, args.port, settings_from(args))
+    print(f"Mock Cerebras + Supabase listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+        sys.exit(0)
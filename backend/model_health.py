@@ -0,0 +1,175 @@
+import os
+import time
+import threading
+from collections import deque
+
+# Outcomes considered when computing a model's error rate
+HEALTH_WINDOW_SECONDS = float(os.getenv('HEALTH_WINDOW_SECONDS', '120'))
+HEALTH_MIN_SAMPLES = int(os.getenv('HEALTH_MIN_SAMPLES', '5'))
+# Error rate at which the breaker opens, and how long it stays open before a probe
+BREAKER_ERROR_RATE = float(os.getenv('BREAKER_ERROR_RATE', '0.5'))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv('BREAKER_COOLDOWN_SECONDS', '30'))
+# Backoff after a 429, doubled on each consecutive one
+RATE_LIMIT_BACKOFF_SECONDS = float(os.getenv('RATE_LIMIT_BACKOFF_SECONDS', '30'))
+RATE_LIMIT_MAX_BACKOFF_SECONDS = float(os.getenv('RATE_LIMIT_MAX_BACKOFF_SECONDS', '600'))
+
+LATENCY_EWMA_ALPHA = 0.2
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+def is_rate_limit_error(error):
+    text = str(error)
+    return "429" in text or "Rate limit" in text or "Quota" in text
+
+
+def retry_after_seconds(error):
+    """Retry-After from the provider's HTTP response, when the SDK exposes it"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class ModelsUnavailableError(Exception):
+    """Every model in the chain is rate limited (Quota backoff) or has an open breaker"""
+
+
+class _ModelState:
+    def __init__(self):
+        self.outcomes = deque()  # (timestamp, ok)
+        self.latency_ewma = None
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.backoff_until = 0.0
+        self.consecutive_rate_limits = 0
+        self.probe_in_flight = False
+        self.probe_started_at = 0.0
+
+
+class ModelHealthTracker:
+    """
+    Circuit breaker per model in the fallback chain.
+
+    Tracks recent error rates, a latency EWMA and 429 backoff windows. Models
+    that are backing off or whose breaker is open are skipped by `order()`;
+    once the cooldown passes a single probe request is let through (half-open)
+    and its outcome decides whether the breaker closes again.
+    """
+
+    def __init__(self):
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _get(self, model_name):
+        state = self._models.get(model_name)
+        if state is None:
+            state = self._models[model_name] = _ModelState()
+        return state
+
+    def _trim(self, state, now):
+        while state.outcomes and now - state.outcomes[0][0] > HEALTH_WINDOW_SECONDS:
+            state.outcomes.popleft()
+
+    @staticmethod
+    def _error_rate(state):
+        if not state.outcomes:
+            return 0.0
+        return sum(1 for _, ok in state.outcomes if not ok) / len(state.outcomes)
+
+    def record_success(self, model_name, latency):
+        now = time.monotonic()
+        with self._lock:
+            state = self._get(model_name)
+            state.outcomes.append((now, True))
+            self._trim(state, now)
+            if state.latency_ewma is None:
+                state.latency_ewma = latency
+            else:
+                state.latency_ewma += LATENCY_EWMA_ALPHA * (latency - state.latency_ewma)
+            state.consecutive_rate_limits = 0
+            state.backoff_until = 0.0
+            state.state = CLOSED
+            state.probe_in_flight = False
+
+    def record_failure(self, model_name, error):
+        now = time.monotonic()
+        with self._lock:
+            state = self._get(model_name)
+            state.outcomes.append((now, False))
+            self._trim(state, now)
+            state.probe_in_flight = False
+
+            if is_rate_limit_error(error):
+                state.consecutive_rate_limits += 1
+                backoff = retry_after_seconds(error)
+                if backoff is None:
+                    backoff = min(
+                        RATE_LIMIT_MAX_BACKOFF_SECONDS,
+                        RATE_LIMIT_BACKOFF_SECONDS * (2 ** (state.consecutive_rate_limits - 1)),
+                    )
+                state.backoff_until = now + backoff
+
+            if state.state == HALF_OPEN or (
+                len(state.outcomes) >= HEALTH_MIN_SAMPLES and self._error_rate(state) >= BREAKER_ERROR_RATE
+            ):
+                state.state = OPEN
+                state.opened_at = now
+
+    def _available(self, state, now):
+        if now < state.backoff_until:
+            return False
+        if state.state == OPEN:
+            if now - state.opened_at < BREAKER_COOLDOWN_SECONDS:
+                return False
+            state.state = HALF_OPEN
+        if state.state == HALF_OPEN:
+            # A probe handed out but never sent (another model won) expires after a cooldown
+            if state.probe_in_flight and now - state.probe_started_at < BREAKER_COOLDOWN_SECONDS:
+                return False
+            state.probe_in_flight = True
+            state.probe_started_at = now
+        return True
+
+    def order(self, model_names):
+        """
+        Models worth trying right now, in preference order. Healthy models keep
+        their configured order; ones with a rising error rate move behind them.
+        An empty list means every model is backing off or has an open breaker.
+        """
+        now = time.monotonic()
+        with self._lock:
+            available = []
+            for index, model_name in enumerate(model_names):
+                state = self._get(model_name)
+                self._trim(state, now)
+                if self._available(state, now):
+                    degraded = self._error_rate(state) >= BREAKER_ERROR_RATE / 2
+                    available.append((degraded, index, model_name))
+
+            return [model_name for _, _, model_name in sorted(available)]
+
+    def snapshot(self):
+        """Per-model state for the /health endpoint"""
+        now = time.monotonic()
+        with self._lock:
+            report = {}
+            for model_name, state in self._models.items():
+                self._trim(state, now)
+                report[model_name] = {
+                    'state': state.state,
+                    'error_rate': round(self._error_rate(state), 3),
+                    'samples': len(state.outcomes),
+                    'latency_ewma_ms': round(state.latency_ewma * 1000) if state.latency_ewma is not None else None,
+                    'rate_limited_for_s': round(max(0.0, state.backoff_until - now), 1),
+                }
+            return report
+
+
+model_health = ModelHealthTracker()
@@ -9,6 +9,8 @@ class User(db.Model):
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password = db.Column(db.String(200), nullable=False)
+    # Bumped whenever the user's chat list changes; the /api/chats ETag
+    chats_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     chats = db.relationship('Chat', backref='user', lazy=True)
 
     def to_dict(self):
@@ -23,8 +25,19 @@ class Chat(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     title = db.Column(db.String(200), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Model-written summary of the turns that no longer fit the prompt (LLM_SUMMARY_ENABLED),
+    # covering messages up to summary_message_id
+    summary = db.Column(db.Text, nullable=True)
+    summary_message_id = db.Column(db.Integer, nullable=True)
+    # Bumped with every message written to the chat; the message list ETag
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     messages = db.relationship('Message', backref='chat', lazy=True, cascade="all, delete-orphan")
 
+    # Newest-first chat list per user, with id as the keyset tie-breaker
+    __table_args__ = (
+        db.Index('ix_chat_user_id_created_at', 'user_id', 'created_at', 'id'),
+    )
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -32,6 +45,16 @@ class Chat(db.Model):
             "created_at": self.created_at.isoformat()
         }
 
+    # What the chat list selects: no ORM objects, no summary text
+    LIST_COLUMNS = ('id', 'title', 'created_at')
+
+    @staticmethod
+    def row_dict(row):
+        """to_dict() for a LIST_COLUMNS row; the JSON provider writes the timestamp"""
+        # Unpacking a Row is several times cheaper than reading it by attribute name
+        chat_id, title, created_at = row
+        return {"id": chat_id, "title": title, "created_at": created_at}
+
 class Message(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     chat_id = db.Column(db.Integer, db.ForeignKey('chat.id'), nullable=False)
@@ -39,9 +62,23 @@ class Message(db.Model):
     content = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Serves history loading and the (keyset-paginated) transcript endpoint
+    __table_args__ = (
+        db.Index('ix_message_chat_id_timestamp', 'chat_id', 'timestamp', 'id'),
+    )
+
     def to_dict(self):
         return {
             "role": self.role,
             "content": self.content,
             "timestamp": self.timestamp.isoformat()
         }
+
+    # id is selected for the pagination cursor, not returned
+    LIST_COLUMNS = ('id', 'role', 'content', 'timestamp')
+
+    @staticmethod
+    def row_dict(row):
+        """to_dict() for a LIST_COLUMNS row; the JSON provider writes the timestamp"""
+        _, role, content, timestamp = row
+        return {"role": role, "content": content, "timestamp": timestamp}
@@ -0,0 +1,85 @@
+import base64
+from datetime import datetime
+from sqlalchemy import tuple_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(timestamp, row_id):
+    raw = f"{timestamp.isoformat()}|{row_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, row_id = base64.urlsafe_b64decode(padded).decode('utf-8').split('|')
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor(f"Invalid cursor: {cursor}")
+
+
+def page_size(value):
+    if value is None:
+        return DEFAULT_PAGE_SIZE
+    try:
+        return max(1, min(MAX_PAGE_SIZE, int(value)))
+    except ValueError:
+        raise InvalidCursor(f"Invalid limit: {value}")
+
+
+def keyset_query(query, ts_column, id_column, before=None, after=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    The statement keyset_page runs: `query` bounded by the cursors, ordered
+    and limited. Walking back it fetches one extra row to learn whether older
+    rows remain. Separate so check_query_plan.py can EXPLAIN the real thing.
+    """
+    if before:
+        ts, row_id = decode_cursor(before)
+        query = query.filter(tuple_(ts_column, id_column) < tuple_(ts, row_id))
+    if after:
+        ts, row_id = decode_cursor(after)
+        query = query.filter(tuple_(ts_column, id_column) > tuple_(ts, row_id))
+
+    if after and not before:
+        # Walk forward from the cursor; the oldest unseen rows come first
+        return query.order_by(ts_column.asc(), id_column.asc()).limit(limit)
+    return query.order_by(ts_column.desc(), id_column.desc()).limit(limit + 1)
+
+
+def keyset_page(query, ts_column, id_column, before=None, after=None, limit=DEFAULT_PAGE_SIZE, newest_first=False):
+    """
+    One page of `query` ordered by (ts_column, id_column) using keyset
+    pagination: the cursor is the (timestamp, id) of a boundary row, so every
+    page is a single index range scan no matter how deep it is. The bound is a
+    row-value comparison; spelled as `ts < x OR (ts = x AND id < y)` SQLite
+    only uses the equality prefix of the index and deep pages scan row by row.
+
+    `before` walks towards older rows, `after` towards newer rows; with neither
+    the newest page is returned. Rows come back in display order (oldest first,
+    or newest first when `newest_first`). Returns (rows, older_cursor,
+    newer_cursor); older_cursor is None when there is nothing older.
+    """
+    rows = keyset_query(query, ts_column, id_column, before, after, limit).all()
+    if after and not before:
+        has_more_older = True
+    else:
+        has_more_older = len(rows) > limit
+        rows = rows[:limit]
+        rows.reverse()
+
+    def cursor_for(row):
+        return encode_cursor(getattr(row, ts_column.key), getattr(row, id_column.key))
+
+    older_cursor = cursor_for(rows[0]) if rows and has_more_older else None
+    # Polling with the newer cursor returns only rows created after this page
+    newer_cursor = cursor_for(rows[-1]) if rows else after
+
+    if newest_first:
+        rows.reverse()
+    return rows, older_cursor, newer_cursor
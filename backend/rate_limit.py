@@ -0,0 +1,254 @@
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from logs import get_logger
+from clients import LazyClient, preload
+
+log = get_logger('rate_limit')
+
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+# 'sqlite' (shared by every worker on the host) or 'memory' (per worker)
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'sqlite')
+RATE_LIMIT_PATH = os.getenv(
+    'RATE_LIMIT_PATH',
+    os.path.join(os.path.abspath(os.path.dirname(__file__)), 'rate_limit.db')
+)
+# Token bucket per signed-in user: sustained requests per minute, plus a burst
+RATE_LIMIT_PER_MINUTE = float(os.getenv('RATE_LIMIT_PER_MINUTE', '20'))
+RATE_LIMIT_BURST = int(os.getenv('RATE_LIMIT_BURST', '10'))
+# Guests are limited per client IP
+GUEST_RATE_LIMIT_PER_MINUTE = float(os.getenv('GUEST_RATE_LIMIT_PER_MINUTE', '6'))
+GUEST_RATE_LIMIT_BURST = int(os.getenv('GUEST_RATE_LIMIT_BURST', '3'))
+# Model tokens (prompt + completion) per UTC day; 0 means unlimited
+DAILY_TOKEN_QUOTA = int(os.getenv('DAILY_TOKEN_QUOTA', '200000'))
+GUEST_DAILY_TOKEN_QUOTA = int(os.getenv('GUEST_DAILY_TOKEN_QUOTA', '20000'))
+# Reverse proxies in front of the app that append to X-Forwarded-For. Behind
+# one (Render, a single nginx) every connection comes from the proxy, so the
+# client is the entry that proxy appended: the last one. Each further proxy
+# adds one. 0 when clients connect directly; then the header is ignored, since
+# anything in it came from the client.
+RATE_LIMIT_PROXY_HOPS = int(os.getenv('RATE_LIMIT_PROXY_HOPS', '1'))
+MEMORY_MAX_KEYS = 100000
+
+DAY_SECONDS = 86400
+
+
+class Limits:
+    def __init__(self, per_minute, burst, daily_tokens):
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self.daily_tokens = daily_tokens
+
+
+USER_LIMITS = Limits(RATE_LIMIT_PER_MINUTE, RATE_LIMIT_BURST, DAILY_TOKEN_QUOTA)
+GUEST_LIMITS = Limits(GUEST_RATE_LIMIT_PER_MINUTE, GUEST_RATE_LIMIT_BURST, GUEST_DAILY_TOKEN_QUOTA)
+
+
+def utc_day(now):
+    return int(now // DAY_SECONDS)
+
+
+def client_ip(remote_addr, forwarded_for=None):
+    """
+    The guest's address: the X-Forwarded-For entry RATE_LIMIT_PROXY_HOPS from
+    the right. Entries left of it were written by the client and are never
+    used, so rotating them doesn't buy a fresh bucket or quota.
+    """
+    if RATE_LIMIT_PROXY_HOPS > 0 and forwarded_for:
+        entries = [entry.strip() for entry in forwarded_for.split(',')]
+        if len(entries) >= RATE_LIMIT_PROXY_HOPS and entries[-RATE_LIMIT_PROXY_HOPS]:
+            return entries[-RATE_LIMIT_PROXY_HOPS]
+    return remote_addr or 'unknown'
+
+
+class MemoryBackend:
+    """Buckets and usage in this process only (single worker, tests)"""
+
+    def __init__(self, max_keys=MEMORY_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated)
+        self._usage = OrderedDict()    # (key, day) -> tokens
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, now):
+        """Take one token from key's bucket; returns 0 or the seconds until one is available"""
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens < 1:
+                return (1 - tokens) / rate if rate > 0 else DAY_SECONDS
+            self._buckets[key] = (tokens - 1, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return 0
+
+    def usage(self, key, day):
+        with self._lock:
+            return self._usage.get((key, day), 0)
+
+    def add_usage(self, key, day, tokens):
+        with self._lock:
+            self._usage[(key, day)] = self._usage.get((key, day), 0) + tokens
+            self._usage.move_to_end((key, day))
+            while len(self._usage) > self.max_keys:
+                self._usage.popitem(last=False)
+
+
+class SQLiteBackend:
+    """
+    Buckets and daily usage in a local SQLite file (WAL), so every worker on
+    the host enforces the same limits. A bucket is refilled and debited by one
+    conditional UPSERT, so an admitted request costs a single statement and
+    two workers can't both spend the last token.
+    """
+
+    TAKE = (
+        "INSERT INTO rate_buckets (key, tokens, updated) VALUES (:key, :burst - 1, :now)"
+        " ON CONFLICT (key) DO UPDATE SET"
+        "  tokens = min(:burst, tokens + (:now - updated) * :rate) - 1, updated = :now"
+        " WHERE min(:burst, tokens + (:now - updated) * :rate) >= 1"
+        " RETURNING tokens"
+    )
+
+    def __init__(self, path=RATE_LIMIT_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._pruned_day = None
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets ("
+            " key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS token_usage ("
+            " key TEXT NOT NULL, day INTEGER NOT NULL, tokens INTEGER NOT NULL, PRIMARY KEY (key, day))"
+        )
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key, rate, burst, now):
+        conn = self._connect()
+        if conn.execute(self.TAKE, {'key': key, 'burst': burst, 'now': now, 'rate': rate}).fetchone():
+            return 0
+        tokens, updated = conn.execute(
+            "SELECT tokens, updated FROM rate_buckets WHERE key = ?", (key,)
+        ).fetchone()
+        tokens = min(burst, tokens + (now - updated) * rate)
+        return (1 - tokens) / rate if rate > 0 else DAY_SECONDS
+
+    def usage(self, key, day):
+        row = self._connect().execute(
+            "SELECT tokens FROM token_usage WHERE key = ? AND day = ?", (key, day)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def add_usage(self, key, day, tokens):
+        conn = self._connect()
+        conn.execute(
+            "INSERT INTO token_usage (key, day, tokens) VALUES (?, ?, ?)"
+            " ON CONFLICT (key, day) DO UPDATE SET tokens = tokens + excluded.tokens",
+            (key, day, tokens)
+        )
+        if self._pruned_day != day:
+            # Once a day per worker: drop yesterday's counters and idle buckets
+            self._pruned_day = day
+            conn.execute("DELETE FROM token_usage WHERE day < ?", (day,))
+            conn.execute("DELETE FROM rate_buckets WHERE updated < ?", (day * DAY_SECONDS,))
+
+
+class Rejection:
+    def __init__(self, reason, message, retry_after):
+        self.reason = reason
+        self.message = message
+        self.retry_after = max(1, int(retry_after + 0.999))
+
+    def payload(self):
+        return {'error': self.message, 'reason': self.reason, 'retry_after': self.retry_after}
+
+
+class RateLimiter:
+    """
+    Admission control for /api/chat: a token bucket per caller plus a daily
+    model-token quota charged from completion usage. Callers are 'user:<id>'
+    for a valid JWT and 'ip:<address>' for guests. Store errors fail open.
+    """
+
+    def __init__(self, backend, enabled=RATE_LIMIT_ENABLED):
+        # The store, or a LazyClient that opens it on first use
+        self._backend = backend if isinstance(backend, LazyClient) else LazyClient.holding('Rate limit store', backend)
+        self.enabled = enabled
+
+    @property
+    def backend(self):
+        return self._backend.get()
+
+    @backend.setter
+    def backend(self, backend):
+        self._backend.set(backend)
+
+    @staticmethod
+    def key_for(identity, ip):
+        return f'user:{identity}' if identity else f'ip:{ip}'
+
+    @staticmethod
+    def limits_for(key):
+        return USER_LIMITS if key.startswith('user:') else GUEST_LIMITS
+
+    def check(self, key, now=None):
+        """None when the request may go ahead, else a Rejection"""
+        if not self.enabled:
+            return None
+        now = time.time() if now is None else now
+        limits = self.limits_for(key)
+        try:
+            # Over quota first, so a rejected request doesn't also spend a bucket token
+            if limits.daily_tokens and self.backend.usage(key, utc_day(now)) >= limits.daily_tokens:
+                return Rejection('quota', "You've used today's message allowance. It resets at midnight UTC.",
+                                 (utc_day(now) + 1) * DAY_SECONDS - now)
+            wait = self.backend.take(key, limits.rate, limits.burst, now)
+        except Exception as e:
+            log.warning("Rate limit store error", error=str(e))
+            return None
+        if wait:
+            return Rejection('rate', f"You're sending messages too quickly. Try again in {int(wait + 0.999)}s.",
+                             wait)
+        return None
+
+    def charge(self, key, tokens, now=None):
+        """Count model tokens against key's daily quota"""
+        if not self.enabled or not key or not tokens:
+            return
+        now = time.time() if now is None else now
+        try:
+            self.backend.add_usage(key, utc_day(now), int(tokens))
+        except Exception as e:
+            log.warning("Token usage write error", error=str(e))
+
+
+def open_rate_limit_backend():
+    if RATE_LIMIT_BACKEND == 'sqlite':
+        try:
+            return SQLiteBackend()
+        except Exception as e:
+            log.warning("Failed to open SQLite rate limit store, using memory", error=str(e))
+    return MemoryBackend()
+
+
+def create_rate_limiter():
+    # The store is opened by the first checked request, not when the app is imported
+    backend = LazyClient('Rate limit store', open_rate_limit_backend)
+    preload(backend)
+    return RateLimiter(backend)
+
+
+rate_limiter = create_rate_limiter()
@@ -0,0 +1,226 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from logs import get_logger
+from clients import LazyClient, preload
+
+log = get_logger('response_cache')
+
+# 'memory' (per worker) or 'sqlite' (shared by every worker on the host)
+RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND', 'memory')
+RESPONSE_CACHE_PATH = os.getenv(
+    'RESPONSE_CACHE_PATH',
+    os.path.join(os.path.abspath(os.path.dirname(__file__)), 'response_cache.db')
+)
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv('RESPONSE_CACHE_TTL_SECONDS', '3600'))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '5000'))
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s.!?,;:]+$")
+
+
+def normalize_prompt(text):
+    """'  Who are you?? ' and 'who are you' share a cache entry"""
+    text = _WHITESPACE.sub(' ', text.strip().lower())
+    return _TRAILING_PUNCTUATION.sub('', text)
+
+
+def cache_key(model_names, messages):
+    payload = json.dumps({
+        'models': list(model_names),
+        'messages': [[msg['role'], normalize_prompt(msg['content'])] for msg in messages],
+    }, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class MemoryBackend:
+    """In-process LRU with per-entry expiry"""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, response_text, latency)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1], entry[2]
+
+    def set(self, key, response_text, latency, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, response_text, latency)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class SQLiteBackend:
+    """
+    Cache table in a local SQLite file so every gunicorn worker on the host
+    shares one cache. WAL mode keeps readers from blocking the single writer.
+    """
+
+    def __init__(self, path=RESPONSE_CACHE_PATH, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            " key TEXT PRIMARY KEY, response TEXT NOT NULL, latency REAL NOT NULL,"
+            " expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_response_cache_last_access ON response_cache (last_access)")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            "SELECT response, latency, expires_at FROM response_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[2] < now:
+            conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE response_cache SET last_access = ? WHERE key = ?", (now, key))
+        return row[0], row[1]
+
+    def set(self, key, response_text, latency, ttl):
+        conn = self._connect()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO response_cache (key, response, latency, expires_at, last_access)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (key, response_text, latency, now + ttl, now)
+        )
+        # Evict expired rows first, then the least recently used beyond the cap
+        conn.execute("DELETE FROM response_cache WHERE expires_at < ?", (now,))
+        conn.execute(
+            "DELETE FROM response_cache WHERE key IN ("
+            " SELECT key FROM response_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+
+class ResponseCache:
+    """
+    Exact-match cache for single-turn prompts, keyed on the model chain and the
+    normalized message list. Chats that carry history are never looked up, so
+    one user's context can't leak into another user's answer. Assistant turns
+    ahead of the first user message (the web client's canned greeting) are
+    not history: they are part of the key, and every client sending the same
+    greeting shares the entry.
+    """
+
+    def __init__(self, backend, ttl=RESPONSE_CACHE_TTL_SECONDS):
+        # The store, or a LazyClient that opens it on first use
+        self._backend = backend if isinstance(backend, LazyClient) else LazyClient.holding('Response cache', backend)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.latency_saved = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        return self._backend.get()
+
+    @backend.setter
+    def backend(self, backend):
+        self._backend.set(backend)
+
+    @staticmethod
+    def key_for(model_names, messages):
+        """Cache key for a request, or None when the request must bypass the cache"""
+        *opening, prompt = messages
+        if prompt.get('role') != 'user' or any(msg.get('role') != 'assistant' for msg in opening):
+            return None
+        return cache_key(model_names, messages)
+
+    @staticmethod
+    def scope_for(messages):
+        """
+        The turns before a cacheable prompt, for caches keyed on the prompt
+        alone (the semantic cache): '' when the prompt opens the chat.
+        """
+        return cache_key((), messages[:-1]) if len(messages) > 1 else ''
+
+    def get(self, key):
+        try:
+            entry = self.backend.get(key)
+        except Exception as e:
+            log.warning("Response cache read error", error=str(e))
+            entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.latency_saved += entry[1]
+        return entry[0]
+
+    def peek(self, key):
+        """get() without counting a hit or a miss: a re-check of a key already looked up"""
+        try:
+            entry = self.backend.get(key)
+        except Exception as e:
+            log.warning("Response cache read error", error=str(e))
+            return None
+        return entry[0] if entry is not None else None
+
+    def set(self, key, response_text, latency):
+        try:
+            self.backend.set(key, response_text, latency, self.ttl)
+        except Exception as e:
+            log.warning("Response cache write error", error=str(e))
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': type(self.backend).__name__,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'latency_saved_s': round(self.latency_saved, 2),
+            }
+
+
+def open_response_cache_backend():
+    if RESPONSE_CACHE_BACKEND == 'sqlite':
+        try:
+            return SQLiteBackend()
+        except Exception as e:
+            log.warning("Failed to open SQLite response cache, using memory", error=str(e))
+    return MemoryBackend()
+
+
+def create_response_cache():
+    # The store is opened by the first lookup, not when the app is imported
+    backend = LazyClient('Response cache', open_response_cache_backend)
+    preload(backend)
+    return ResponseCache(backend)
+
+
+response_cache = create_response_cache()
@@ -0,0 +1,85 @@
+import re
+from sqlalchemy import inspect, text
+from models import db
+
+# Full-text index over Message.content. SQLite keeps an external-content
+# FTS5 table (message_fts, with an 'owner' user token) in step with triggers; Postgres keeps a generated
+# tsvector column (message.content_tsv) with a GIN index. Both are created by
+# migration 3 in migrations.py.
+FTS_TABLE = 'message_fts'
+SNIPPET_TOKENS = 12
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+SQLITE_SEARCH = text(f"""
+    SELECT m.id, m.chat_id, c.title AS chat_title, m.role, m.timestamp,
+           snippet({FTS_TABLE}, 0, '[', ']', '…', {SNIPPET_TOKENS}) AS snippet
+    FROM {FTS_TABLE}
+    JOIN message m ON m.id = {FTS_TABLE}.rowid
+    JOIN chat c ON c.id = m.chat_id
+    WHERE {FTS_TABLE} MATCH :query AND c.user_id = :user_id
+    ORDER BY bm25({FTS_TABLE}, 1.0, 0.0), m.id DESC
+    LIMIT :limit OFFSET :offset
+""").columns(timestamp=db.DateTime)
+
+POSTGRES_SEARCH = text(f"""
+    SELECT m.id, m.chat_id, c.title AS chat_title, m.role, m.timestamp,
+           ts_headline('english', m.content, q,
+                       'StartSel=[, StopSel=], MaxWords={SNIPPET_TOKENS}, MinWords=4') AS snippet
+    FROM message m
+    JOIN chat c ON c.id = m.chat_id,
+         websearch_to_tsquery('english', :query) AS q
+    WHERE m.content_tsv @@ q AND c.user_id = :user_id
+    ORDER BY ts_rank_cd(m.content_tsv, q) DESC, m.id DESC
+    LIMIT :limit OFFSET :offset
+""").columns(timestamp=db.DateTime)
+
+
+class SearchUnavailable(RuntimeError):
+    pass
+
+
+def fts5_query(user_id, query):
+    """
+    User input as an FTS5 query scoped to one owner: every word must match,
+    as a phrase token, so quotes, '*', NEAR or AND typed by the user are
+    searched for, not parsed. The last word also matches as a prefix, for
+    search-as-you-type.
+    """
+    words = _WORD.findall(query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return f'owner:"u{int(user_id)}" AND content:({" ".join(terms)})'
+
+
+def search_messages(user_id, query, limit, offset=0):
+    """
+    One page of the user's messages matching `query`, best match first.
+    Fetches limit + 1 rows; returns (results, has_more).
+    """
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        if not inspect(db.engine).has_table(FTS_TABLE):
+            raise SearchUnavailable("Search index is not available on this database")
+        statement, match = SQLITE_SEARCH, fts5_query(user_id, query)
+    elif dialect == 'postgresql':
+        statement, match = POSTGRES_SEARCH, query if _WORD.search(query) else None
+    else:
+        raise SearchUnavailable(f"Search is not supported on {dialect}")
+    if not match:
+        return [], False
+
+    rows = db.session.execute(statement, {
+        'query': match, 'user_id': int(user_id), 'limit': limit + 1, 'offset': offset,
+    }).all()
+    results = [{
+        'id': row.id,
+        'chat_id': row.chat_id,
+        'chat_title': row.chat_title,
+        'role': row.role,
+        'snippet': row.snippet,
+        'timestamp': row.timestamp.isoformat(),
+    } for row in rows[:limit]]
+    return results, len(rows) > limit
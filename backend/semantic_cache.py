@@ -0,0 +1,217 @@
+import os
+import re
+import zlib
+import hashlib
+import atexit
+import threading
+import numpy as np
+from response_cache import normalize_prompt
+from logs import get_logger
+
+log = get_logger('semantic_cache')
+
+SEMANTIC_CACHE_ENABLED = os.getenv('SEMANTIC_CACHE_ENABLED', 'true').lower() == 'true'
+SEMANTIC_CACHE_PATH = os.getenv(
+    'SEMANTIC_CACHE_PATH',
+    os.path.join(os.path.abspath(os.path.dirname(__file__)), 'semantic_cache.npz')
+)
+# Cosine similarity a prompt needs to reuse a cached answer. Similarity alone
+# can't tell "ascending" from "descending" (0.85-0.96 with this vectorizer),
+# so a hit also needs the same content words, numbers and operators; see
+# content_signature()
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.8'))
+# Bounded index: capacity x dimensions float32 (4096 x 1024 = 16MB)
+SEMANTIC_CACHE_CAPACITY = int(os.getenv('SEMANTIC_CACHE_CAPACITY', '4096'))
+SEMANTIC_CACHE_DIMENSIONS = 1024
+# Flush the index to disk after this many inserts (and on exit)
+SEMANTIC_CACHE_PERSIST_EVERY = int(os.getenv('SEMANTIC_CACHE_PERSIST_EVERY', '50'))
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+# Words, plus symbols that change a question ("2 + 2" vs "2 * 2"); quotes and
+# sentence punctuation don't count
+_TOKEN = re.compile(r"\w+|[^\w\s'\".,;:!?()]", re.UNICODE)
+# Words a paraphrase may add, drop or swap ("how do I" / "how can I")
+_FILLER = frozenset(
+    "a an the is are was were be am do does did can could would will shall should may might must "
+    "me it its please s".split()
+)
+
+
+def _features(text):
+    """Words, word bigrams and character trigrams, so small rewordings still overlap"""
+    words = _WORD.findall(normalize_prompt(text))
+    features = list(words)
+    features.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+    for word in words:
+        padded = f"#{word}#"
+        features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return features
+
+
+def content_signature(text):
+    """
+    The prompt's content words, numbers and symbols in order: "km to miles"
+    and "miles to km" embed alike but are different questions
+    """
+    return ' '.join(token for token in _TOKEN.findall(normalize_prompt(text)) if token not in _FILLER)
+
+
+def scope_id(scope):
+    """63-bit id for a scope string; '' (no turns before the prompt) is 0"""
+    return int(hashlib.sha256(scope.encode('utf-8')).hexdigest()[:15], 16) if scope else 0
+
+
+def embed(text, dimensions=SEMANTIC_CACHE_DIMENSIONS):
+    """
+    Hashing-trick embedding: CPU-only, no model download, stable across
+    processes (crc32 rather than the salted built-in hash).
+    """
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for feature in _features(text):
+        digest = zlib.crc32(feature.encode('utf-8'))
+        vector[digest % dimensions] += 1.0 if digest & 0x80000000 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector
+
+
+class SemanticCache:
+    """
+    Nearest-neighbour cache for single-turn prompts. A prompt only matches
+    entries with the same content signature (rewordings of the same question,
+    not a question that differs by one word) stored under the same scope (the
+    assistant turns the client sent ahead of it, so a crafted preamble can't
+    poison answers for other users).
+
+    Embeddings live in one preallocated float32 matrix and lookups are a single
+    matrix-vector product (exact cosine search; at a few thousand rows this is
+    faster than building an ANN index). When full, the least recently used row
+    is overwritten. The index is persisted to an .npz file so it survives
+    restarts; with several workers the last one to flush wins.
+    """
+
+    def __init__(self, path=SEMANTIC_CACHE_PATH, capacity=SEMANTIC_CACHE_CAPACITY,
+                 threshold=SEMANTIC_CACHE_THRESHOLD, dimensions=SEMANTIC_CACHE_DIMENSIONS):
+        self.path = path
+        self.capacity = capacity
+        self.threshold = threshold
+        self.dimensions = dimensions
+        self.vectors = np.zeros((capacity, dimensions), dtype=np.float32)
+        self.responses = [None] * capacity
+        self.signatures = [None] * capacity
+        self.latencies = np.zeros(capacity, dtype=np.float32)
+        self.last_used = np.zeros(capacity, dtype=np.int64)
+        self.scopes = np.zeros(capacity, dtype=np.int64)
+        self.size = 0
+        self.clock = 0
+        self.hits = 0
+        self.misses = 0
+        self.latency_saved = 0.0
+        self._dirty = 0
+        self._lock = threading.Lock()
+        self.load()
+
+    def get(self, prompt, scope=''):
+        vector = embed(prompt, self.dimensions)
+        signature = content_signature(prompt)
+        scope = scope_id(scope)
+        with self._lock:
+            if self.size:
+                scores = self.vectors[:self.size] @ vector
+                scores[self.scopes[:self.size] != scope] = -1.0
+                candidates = np.flatnonzero(scores >= self.threshold)
+                matches = [int(i) for i in candidates if self.signatures[i] == signature]
+                if matches:
+                    best = max(matches, key=scores.__getitem__)
+                    self.clock += 1
+                    self.last_used[best] = self.clock
+                    self.hits += 1
+                    self.latency_saved += float(self.latencies[best])
+                    return self.responses[best]
+            self.misses += 1
+            return None
+
+    def set(self, prompt, response_text, latency, scope=''):
+        vector = embed(prompt, self.dimensions)
+        with self._lock:
+            if self.size < self.capacity:
+                slot = self.size
+                self.size += 1
+            else:
+                slot = int(np.argmin(self.last_used))
+            self.clock += 1
+            self.vectors[slot] = vector
+            self.responses[slot] = response_text
+            self.signatures[slot] = content_signature(prompt)
+            self.latencies[slot] = latency
+            self.last_used[slot] = self.clock
+            self.scopes[slot] = scope_id(scope)
+            self._dirty += 1
+            should_persist = self._dirty >= SEMANTIC_CACHE_PERSIST_EVERY
+        if should_persist:
+            self.persist()
+
+    def persist(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            size = self.size
+            arrays = {
+                'vectors': self.vectors[:size].copy(),
+                'responses': np.array(self.responses[:size], dtype=np.str_),
+                'signatures': np.array(self.signatures[:size], dtype=np.str_),
+                'latencies': self.latencies[:size].copy(),
+                'last_used': self.last_used[:size].copy(),
+                'scopes': self.scopes[:size].copy(),
+            }
+            self._dirty = 0
+        try:
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            log.warning("Semantic cache persist error", error=str(e))
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                vectors = data['vectors']
+                if vectors.shape[1] != self.dimensions:
+                    return
+                # Keep the most recently used rows if the capacity shrank
+                order = np.argsort(data['last_used'])[-self.capacity:]
+                size = len(order)
+                self.vectors[:size] = vectors[order]
+                self.responses[:size] = [str(text) for text in data['responses'][order]]
+                self.latencies[:size] = data['latencies'][order]
+                self.last_used[:size] = np.arange(1, size + 1)
+                # Files written before signatures existed load rows that never match
+                if 'signatures' in data:
+                    self.signatures[:size] = [str(text) for text in data['signatures'][order]]
+                if 'scopes' in data:
+                    self.scopes[:size] = data['scopes'][order]
+                self.size = size
+                self.clock = size
+            log.info("Semantic cache loaded", entries=self.size)
+        except Exception as e:
+            log.warning("Semantic cache load error", error=str(e))
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'latency_saved_s': round(self.latency_saved, 2),
+            }
+
+
+semantic_cache = SemanticCache() if SEMANTIC_CACHE_ENABLED else None
+if semantic_cache:
+    atexit.register(semantic_cache.persist)
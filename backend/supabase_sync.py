@@ -0,0 +1,268 @@
+import os
+import glob
+import json
+import time
+import uuid
+import queue
+import atexit
+import threading
+from collections import defaultdict
+from logs import get_logger
+
+log = get_logger('supabase_sync')
+
+SYNC_QUEUE_SIZE = int(os.getenv('SUPABASE_SYNC_QUEUE_SIZE', '10000'))
+SYNC_WORKERS = int(os.getenv('SUPABASE_SYNC_WORKERS', '2'))
+SYNC_BATCH_SIZE = int(os.getenv('SUPABASE_SYNC_BATCH_SIZE', '50'))
+# How long a worker waits to fill a batch once it holds the first row
+SYNC_FLUSH_INTERVAL_SECONDS = float(os.getenv('SUPABASE_SYNC_FLUSH_INTERVAL', '1.0'))
+SYNC_MAX_ATTEMPTS = int(os.getenv('SUPABASE_SYNC_MAX_ATTEMPTS', '5'))
+SYNC_BACKOFF_SECONDS = float(os.getenv('SUPABASE_SYNC_BACKOFF', '0.5'))
+# How long enqueue() blocks on a full queue before giving up on the row
+SYNC_ENQUEUE_TIMEOUT_SECONDS = float(os.getenv('SUPABASE_SYNC_ENQUEUE_TIMEOUT', '0.05'))
+SYNC_OUTBOX_DIR = os.getenv(
+    'SUPABASE_OUTBOX_DIR',
+    os.path.join(os.path.abspath(os.path.dirname(__file__)), 'instance')
+)
+# Rewrite the outbox once this many rows have been acknowledged
+OUTBOX_COMPACT_EVERY = 1000
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class Outbox:
+    """
+    Append-only JSONL journal of rows that have not reached Supabase yet.
+
+    Every row is written here before it is queued and an ack line is appended
+    once its batch is inserted, so a restart (or crash) replays exactly the
+    unacknowledged rows. Each process writes its own file; on startup a process
+    adopts the files left behind by processes that are no longer running.
+    """
+
+    def __init__(self, directory=SYNC_OUTBOX_DIR):
+        self.directory = directory
+        self.path = os.path.join(directory, f"supabase_outbox.{os.getpid()}.jsonl")
+        self._pending = {}
+        self._acked_since_compact = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self._file.flush()
+
+    def append(self, row_id, table, row):
+        with self._lock:
+            self._pending[row_id] = (table, row)
+            self._write({'id': row_id, 'table': table, 'row': row})
+
+    def ack(self, row_ids):
+        with self._lock:
+            for row_id in row_ids:
+                self._pending.pop(row_id, None)
+            self._write({'ack': list(row_ids)})
+            self._acked_since_compact += len(row_ids)
+            if not self._pending or self._acked_since_compact >= OUTBOX_COMPACT_EVERY:
+                self._compact()
+
+    def _compact(self):
+        self._file.close()
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for row_id, (table, row) in self._pending.items():
+                f.write(json.dumps({'id': row_id, 'table': table, 'row': row}, separators=(',', ':')) + '\n')
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._acked_since_compact = 0
+
+    def adopt_orphans(self):
+        """Unacknowledged rows from outbox files whose writer process is gone"""
+        recovered = []
+        for path in glob.glob(os.path.join(self.directory, 'supabase_outbox.*.jsonl')):
+            if path == self.path:
+                continue
+            try:
+                pid = int(os.path.basename(path).split('.')[1])
+            except ValueError:
+                continue
+            if _pid_alive(pid):
+                continue
+
+            rows = {}
+            try:
+                with open(path, encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            continue  # torn final line from a crash
+                        if 'ack' in record:
+                            for row_id in record['ack']:
+                                rows.pop(row_id, None)
+                        else:
+                            rows[record['id']] = (record['table'], record['row'])
+            except OSError as e:
+                log.warning("Could not read Supabase outbox", path=path, error=str(e))
+                continue
+
+            # Journal the rows in our own outbox before deleting the orphan
+            for row_id, (table, row) in rows.items():
+                self.append(row_id, table, row)
+                recovered.append((row_id, table, row))
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return recovered
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class SupabaseSyncWorker:
+    """
+    Single background pipeline for Supabase mirroring.
+
+    Rows go into a bounded queue drained by a small pool of threads. Each
+    thread groups up to SYNC_BATCH_SIZE rows per table into one bulk
+    insert([...]) call, retrying with exponential backoff. A full queue applies
+    backpressure (enqueue blocks briefly) and rows that still don't fit stay in
+    the outbox for the next start instead of being dropped.
+
+    `client` is a Supabase client or a zero-argument callable returning one,
+    resolved on the first insert so the client can be built lazily.
+    """
+
+    def __init__(self, client, workers=SYNC_WORKERS, batch_size=SYNC_BATCH_SIZE,
+                 max_queue=SYNC_QUEUE_SIZE, outbox_dir=SYNC_OUTBOX_DIR):
+        self.client = client
+        self.workers = workers
+        self.batch_size = batch_size
+        self.outbox_dir = outbox_dir
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.outbox = None
+        self.synced = 0
+        self.failed = 0
+        self.deferred = 0
+        self._pid = None
+        self._stopping = threading.Event()
+        self._threads = []
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        # Threads don't survive a fork, so (re)start lazily in each gunicorn worker
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self.outbox = Outbox(self.outbox_dir)
+            self._threads = [
+                threading.Thread(target=self._run, name=f"supabase-sync-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+            self._pid = os.getpid()
+            atexit.register(self.stop)
+
+            recovered = self.outbox.adopt_orphans()
+            if recovered:
+                log.info("Replaying unsynced rows from the Supabase outbox", rows=len(recovered))
+            for item in recovered:
+                if not self._put(item):
+                    break
+
+    def _put(self, item):
+        try:
+            self.queue.put(item, timeout=SYNC_ENQUEUE_TIMEOUT_SECONDS)
+            return True
+        except queue.Full:
+            self.deferred += 1
+            return False
+
+    def enqueue(self, table, row):
+        """Queue one row for insertion into `table`; never blocks for long"""
+        self._ensure_started()
+        row_id = uuid.uuid4().hex
+        self.outbox.append(row_id, table, row)
+        if not self._put((row_id, table, row)):
+            log.warning("Supabase sync queue full; row kept in outbox for the next start")
+
+    def _next_batch(self):
+        try:
+            first = self.queue.get(timeout=1.0)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + SYNC_FLUSH_INTERVAL_SECONDS
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _insert(self, table, rows):
+        for attempt in range(1, SYNC_MAX_ATTEMPTS + 1):
+            try:
+                client = self.client() if callable(self.client) else self.client
+                if client is None:
+                    raise RuntimeError("Supabase client unavailable")
+                client.table(table).insert(rows).execute()
+                return True
+            except Exception as e:
+                log.error("Supabase sync error", table=table, attempt=f"{attempt}/{SYNC_MAX_ATTEMPTS}", error=str(e))
+                if attempt < SYNC_MAX_ATTEMPTS and not self._stopping.is_set():
+                    time.sleep(SYNC_BACKOFF_SECONDS * (2 ** (attempt - 1)))
+        return False
+
+    def _run(self):
+        while not (self._stopping.is_set() and self.queue.empty()):
+            batch = self._next_batch()
+            if not batch:
+                continue
+            by_table = defaultdict(list)
+            for row_id, table, row in batch:
+                by_table[table].append((row_id, row))
+            for table, items in by_table.items():
+                if self._insert(table, [row for _, row in items]):
+                    self.outbox.ack([row_id for row_id, _ in items])
+                    self.synced += len(items)
+                    log.sampled("Synced rows to Supabase", table=table, rows=len(items))
+                else:
+                    # Left unacknowledged in the outbox; replayed on the next start
+                    self.failed += len(items)
+            for _ in batch:
+                self.queue.task_done()
+
+    def stop(self, timeout=5.0):
+        """Drain what we can before exit; anything left stays in the outbox"""
+        if self._pid != os.getpid():
+            return
+        self._stopping.set()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+    def stats(self):
+        return {
+            'queue_depth': self.queue.qsize(),
+            'synced': self.synced,
+            'failed': self.failed,
+            'deferred': self.deferred,
+        }
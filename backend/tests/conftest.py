@@ -0,0 +1,81 @@
+import os
+import time
+import tempfile
+
+# The app reads its configuration at import time: point every store at a
+# scratch directory and turn off what would reach the network
+_scratch = tempfile.mkdtemp(prefix='zara-tests-')
+os.environ.update({
+    'DATABASE_URL': 'sqlite:///' + os.path.join(_scratch, 'zara.db'),
+    'CEREBRAS_API_KEY': 'test-key',
+    'SUPABASE_URL': '',
+    'SUPABASE_KEY': '',
+    'JWT_SECRET_KEY': 'test-secret-key-that-is-long-enough-for-hs256',
+    'RESPONSE_CACHE_PATH': os.path.join(_scratch, 'response_cache.db'),
+    'SEMANTIC_CACHE_PATH': os.path.join(_scratch, 'semantic_cache.npz'),
+    'SUPABASE_OUTBOX_DIR': os.path.join(_scratch, 'outbox'),
+    'RATE_LIMIT_PATH': os.path.join(_scratch, 'rate_limit.db'),
+    'RATE_LIMIT_ENABLED': 'false',
+    'JOBS_PATH': os.path.join(_scratch, 'jobs.db'),
+    'COALESCE_LOCK_DIR': os.path.join(_scratch, 'flights'),
+    'LOG_LEVEL': 'WARNING',
+})
+
+import pytest
+from tests.fakes import FakeClient
+
+
+def wait_until(condition, timeout=5.0):
+    """Poll `condition` until it is truthy (background threads, jobs)"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return bool(condition())
+
+
+@pytest.fixture(scope='session')
+def zara():
+    import app as zara
+    zara.bcrypt._log_rounds = 4  # the cheapest cost bcrypt allows; registration is on most tests' path
+    zara.init_db_if_needed()
+    return zara
+
+
+@pytest.fixture
+def fake_model(zara):
+    client = FakeClient()
+    zara.cerebras.set(client)
+    return client
+
+
+@pytest.fixture
+def client(zara, fake_model):
+    """Flask test client on an empty database with cold caches"""
+    from models import db, User, Chat, Message
+    from response_cache import MemoryBackend
+    from history import chat_history
+
+    with zara.app.app_context():
+        db.session.query(Message).delete()
+        db.session.query(Chat).delete()
+        db.session.query(User).delete()
+        db.session.commit()
+    zara.response_cache.backend = MemoryBackend()
+    zara.response_cache.hits = zara.response_cache.misses = 0
+    zara.semantic.set(None)
+    chat_history._entries.clear()
+    zara.model_health._models.clear()
+    return zara.app.test_client()
+
+
+@pytest.fixture
+def auth(client):
+    """Register a user; returns a function giving the headers for a username"""
+    def headers(username='user'):
+        response = client.post('/api/register', json={
+            'username': username, 'email': f'{username}@example.com', 'password': 'password'})
+        assert response.status_code == 201, response.json
+        return {'Authorization': f"Bearer {response.json['token']}"}
+    return headers
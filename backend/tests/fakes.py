@@ -0,0 +1,130 @@
+import time
+import asyncio
+import threading
+from types import SimpleNamespace
+
+
+def completion(text, total_tokens=15):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+        usage=SimpleNamespace(prompt_tokens=total_tokens - 5, completion_tokens=5, total_tokens=total_tokens),
+    )
+
+
+def chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))], usage=None)
+
+
+class FakeCompletions:
+    """
+    Stand-in for client.chat.completions. `reply` is the answer text or a
+    callable(model, messages) returning it; models in `fail` raise, `delay`
+    (seconds, or a dict per model) runs before the answer and `chunk_delay`
+    between streamed words. Every call is recorded in `calls` as (model,
+    messages, stream) and every streamed chunk counted in `streamed`.
+    """
+
+    def __init__(self, reply="Hello there friend", fail=(), delay=0.0, chunk_delay=0.0):
+        self.reply = reply
+        self.fail = dict.fromkeys(fail, "429 Rate limit") if not isinstance(fail, dict) else fail
+        self.delay = delay
+        self.chunk_delay = chunk_delay
+        self.streamed = 0
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _delay_for(self, model):
+        return self.delay.get(model, 0.0) if isinstance(self.delay, dict) else self.delay
+
+    def _text(self, model, messages):
+        return self.reply(model, messages) if callable(self.reply) else self.reply
+
+    def create(self, model, messages, stream=False, **params):
+        with self._lock:
+            self.calls.append((model, messages, stream))
+        time.sleep(self._delay_for(model))
+        if model in self.fail:
+            raise Exception(self.fail[model])
+        text = self._text(model, messages)
+        if stream:
+            return self._chunks(text)
+        return completion(text)
+
+    def _chunks(self, text):
+        for n, word in enumerate(text.split(' ')):
+            if n:
+                time.sleep(self.chunk_delay)
+            self.streamed += 1
+            yield chunk(word + ' ')
+
+
+class AsyncFakeCompletions(FakeCompletions):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cancelled = []
+
+    async def create(self, model, messages, stream=False, **params):
+        self.calls.append((model, messages, stream))
+        try:
+            await asyncio.sleep(self._delay_for(model))
+        except asyncio.CancelledError:
+            self.cancelled.append(model)
+            raise
+        if model in self.fail:
+            raise Exception(self.fail[model])
+        text = self._text(model, messages)
+        if stream:
+            async def chunks():
+                for n, word in enumerate(text.split(' ')):
+                    if n:
+                        await asyncio.sleep(self.chunk_delay)
+                    self.streamed += 1
+                    yield chunk(word + ' ')
+            return chunks()
+        return completion(text)
+
+
+class FakeClient:
+    def __init__(self, **kwargs):
+        self.chat = SimpleNamespace(completions=FakeCompletions(**kwargs))
+
+    @property
+    def calls(self):
+        return self.chat.completions.calls
+
+
+class AsyncFakeClient:
+    def __init__(self, **kwargs):
+        self.chat = SimpleNamespace(completions=AsyncFakeCompletions(**kwargs))
+
+    @property
+    def calls(self):
+        return self.chat.completions.calls
+
+
+class FakeSupabase:
+    """table(name).insert(rows).execute() recorder; fails while `down` is set"""
+
+    def __init__(self, down=False):
+        self.down = down
+        self.inserts = []  # (table, rows)
+
+    def table(self, name):
+        return _FakeTable(self, name)
+
+
+class _FakeTable:
+    def __init__(self, supabase, name):
+        self.supabase = supabase
+        self.name = name
+        self.rows = None
+
+    def insert(self, rows):
+        self.rows = rows
+        return self
+
+    def execute(self):
+        if self.supabase.down:
+            raise ConnectionError("Supabase unreachable")
+        self.supabase.inserts.append((self.name, self.rows))
+        return self
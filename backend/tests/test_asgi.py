@@ -0,0 +1,98 @@
+import json
+import asyncio
+import pytest
+from tests.fakes import AsyncFakeClient
+
+httpx = pytest.importorskip('httpx')  # comes with cerebras-cloud-sdk
+
+
+@pytest.fixture
+def asgi(zara, client):
+    import asgi
+    return asgi
+
+
+@pytest.fixture
+def async_model(asgi):
+    model = AsyncFakeClient()
+    asgi.async_cerebras.set(model)
+    return model
+
+
+@pytest.fixture
+def finished(asgi, monkeypatch):
+    """The replies handed to app.finish_chat_turn, the path the WSGI view saves through"""
+    replies = []
+    real = asgi.finish_chat_turn
+    monkeypatch.setattr(asgi, 'finish_chat_turn', lambda turn, text: replies.append(text) or real(turn, text))
+    return replies
+
+
+def post_chat(asgi, payload, headers=None):
+    async def send():
+        transport = httpx.ASGITransport(app=asgi.application)
+        async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as http:
+            return await http.post('/api/chat', json=payload, headers=headers)
+    return asyncio.run(send())
+
+
+@pytest.fixture
+def chat(client, auth):
+    headers = auth()
+    chat_id = client.post('/api/chats', json={'title': 'Async'}, headers=headers).json['id']
+    return headers, chat_id
+
+
+def saved(client, headers, chat_id):
+    return [(message['role'], message['content'])
+            for message in client.get(f'/api/chats/{chat_id}/messages', headers=headers).json]
+
+
+def test_a_json_reply_comes_from_the_async_client(asgi, client, chat, async_model, fake_model, finished):
+    headers, chat_id = chat
+    response = post_chat(asgi, {'messages': [{'role': 'user', 'content': 'hello'}], 'chatId': chat_id}, headers)
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('application/json')
+    assert response.json() == {'role': 'assistant', 'content': 'Hello there friend'}
+    assert len(async_model.calls) == 1 and fake_model.calls == []
+    assert finished == ['Hello there friend']
+    assert saved(client, headers, chat_id) == [('user', 'hello'), ('assistant', 'Hello there friend')]
+
+
+def test_a_stream_arrives_as_sse_frames(asgi, client, chat, async_model, finished):
+    headers, chat_id = chat
+    response = post_chat(asgi, {
+        'messages': [{'role': 'user', 'content': 'Tell me a story'}], 'chatId': chat_id, 'stream': True}, headers)
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/event-stream')
+    *tokens, done = [frame[len('data: '):] for frame in response.text.split('\n\n') if frame]
+    assert [json.loads(token)['content'] for token in tokens] == ['Hello ', 'there ', 'friend ']
+    assert done == '[DONE]'
+    assert async_model.calls[0][2] is True
+    assert finished == ['Hello there friend ']
+    assert saved(client, headers, chat_id) == [('user', 'Tell me a story'), ('assistant', 'Hello there friend ')]
+
+
+def test_server_history_mode_rebuilds_the_prompt(asgi, client, chat, async_model):
+    headers, chat_id = chat
+    post_chat(asgi, {'message': 'My name is Ada', 'chatId': chat_id}, headers)
+    post_chat(asgi, {'message': 'What is my name?', 'chatId': chat_id}, headers)
+    prompt = async_model.calls[-1][1][1:]
+    assert [message['content'] for message in prompt] == ['My name is Ada', 'Hello there friend', 'What is my name?']
+
+
+def test_a_model_failure_saves_the_fallback_reply(zara, asgi, client, chat, async_model, finished):
+    headers, chat_id = chat
+    async_model.chat.completions.fail = dict.fromkeys(zara.MODEL_NAMES, '500 Internal Server Error')
+    response = post_chat(asgi, {'messages': [{'role': 'user', 'content': 'hello'}], 'chatId': chat_id}, headers)
+    reply = response.json()['content']
+    assert reply.endswith(zara.FALLBACK_MODE_NOTE)
+    assert finished == []  # saved by save_chat_turn, without the Supabase mirror of a real reply
+    assert saved(client, headers, chat_id) == [('user', 'hello'), ('assistant', reply)]
+
+
+def test_an_expired_or_bad_token_is_rejected(asgi, async_model):
+    response = post_chat(asgi, {'messages': [{'role': 'user', 'content': 'hello'}]},
+                         {'Authorization': 'Bearer not-a-token'})
+    assert response.status_code == 422
+    assert async_model.calls == []
@@ -0,0 +1,108 @@
+import pytest
+from sqlalchemy import event, text
+import chat_turns
+from chat_turns import ChatTurnRecord
+from models import db, Chat, Message
+
+
+@pytest.fixture(autouse=True)
+def app_context(zara):
+    with zara.app.app_context():
+        yield
+
+
+@pytest.fixture
+def commits():
+    """Counts the transactions committed on the app's engine"""
+    counted = []
+    listener = lambda connection: counted.append(1)
+    event.listen(db.engine, 'commit', listener)
+    yield counted
+    event.remove(db.engine, 'commit', listener)
+
+
+def new_chat(client, headers, title='New Chat'):
+    return client.post('/api/chats', json={'title': title}, headers=headers).json['id']
+
+
+def turn(user_id, chat_id, text='Plan a weekend trip to the mountains'):
+    return ChatTurnRecord.load(user_id, chat_id, text)
+
+
+def stored(chat_id):
+    db.session.expire_all()
+    chat = db.session.get(Chat, chat_id)
+    messages = Message.query.filter_by(chat_id=chat_id).order_by(Message.id).all()
+    return chat.title, [(message.role, message.content) for message in messages]
+
+
+@pytest.fixture
+def owner(client, auth):
+    headers = auth()
+    user_id = client.get('/api/user/me', headers=headers).json['id']
+    return headers, user_id
+
+
+def test_a_turn_is_one_commit(zara, client, owner, commits):
+    headers, user_id = owner
+    chat_id = new_chat(client, headers)
+    record = turn(user_id, chat_id)
+    counted = len(commits)
+    assert record.save('Sounds fun') is True
+    assert len(commits) - counted == 1
+    assert stored(chat_id) == ('Plan a weekend trip to the mou', [
+        ('user', 'Plan a weekend trip to the mountains'), ('assistant', 'Sounds fun')])
+    assert record.titled
+
+
+def test_a_turn_is_saved_at_most_once(zara, client, owner, commits):
+    headers, user_id = owner
+    chat_id = new_chat(client, headers)
+    record = turn(user_id, chat_id)
+    record.save('Sounds fun')
+    counted = len(commits)
+    assert record.save('Again') is False
+    assert len(commits) == counted
+    assert len(stored(chat_id)[1]) == 2
+
+
+def test_a_named_chat_keeps_its_title(zara, client, owner):
+    headers, user_id = owner
+    chat_id = new_chat(client, headers, 'Trips')
+    record = turn(user_id, chat_id)
+    record.save('Sounds fun')
+    assert stored(chat_id)[0] == 'Trips'
+    assert not record.titled
+
+
+def test_a_rename_made_during_the_turn_is_kept(zara, client, owner):
+    headers, user_id = owner
+    chat_id = new_chat(client, headers)
+    record = turn(user_id, chat_id)  # read the title while it was still 'New Chat'
+    client.put(f'/api/chats/{chat_id}', json={'title': 'Renamed'}, headers=headers)
+    record.save('Sounds fun')
+    assert stored(chat_id)[0] == 'Renamed'
+    assert not record.titled
+
+
+def test_a_failing_write_rolls_back_both_messages(zara, client, owner, monkeypatch):
+    headers, user_id = owner
+    chat_id = new_chat(client, headers)
+    monkeypatch.setattr(chat_turns, 'bump_chat', lambda chat_id: text('UPDATE missing_table SET version = 1'))
+    record = turn(user_id, chat_id)
+    with pytest.raises(Exception):
+        record.save('Sounds fun')
+    assert stored(chat_id) == ('New Chat', [])
+    assert not record.titled
+
+
+def test_nothing_is_written_for_someone_elses_chat(zara, client, owner, auth, commits):
+    headers, user_id = owner
+    chat_id = new_chat(client, headers)
+    intruder_id = client.get('/api/user/me', headers=auth('mallory')).json['id']
+    record = turn(intruder_id, chat_id)
+    counted = len(commits)
+    assert record.chat_id is None
+    assert record.save('Sounds fun') is False
+    assert len(commits) == counted
+    assert stored(chat_id) == ('New Chat', [])
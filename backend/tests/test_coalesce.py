@@ -0,0 +1,172 @@
+import os
+import time
+import asyncio
+import threading
+import pytest
+import coalesce
+from coalesce import SingleFlight, AsyncSingleFlight, StreamFlights, FlightLock, worker_flight_lock
+from response_cache import MemoryBackend, SQLiteBackend
+
+
+def run_together(n, fn):
+    results = [None] * n
+    barrier = threading.Barrier(n)
+
+    def run(i):
+        barrier.wait()
+        results[i] = fn()
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_overlapping_calls_run_once():
+    flight = SingleFlight(enabled=True)
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.1)
+        return 'answer'
+    results = run_together(5, lambda: flight.do('k', slow))
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert {result for result, _ in results} == {'answer'}
+    assert flight.shared == 4
+
+
+def test_waiters_get_the_leaders_error():
+    flight = SingleFlight(enabled=True)
+
+    def boom():
+        time.sleep(0.1)
+        raise ValueError('upstream down')
+
+    def attempt():
+        try:
+            flight.do('k', boom)
+        except ValueError as e:
+            return str(e)
+    assert run_together(3, attempt) == ['upstream down'] * 3
+
+
+def test_disabled_or_uncacheable_calls_are_not_shared():
+    calls = []
+    assert SingleFlight(enabled=False).do('k', lambda: calls.append(1)) == (None, False)
+    assert SingleFlight(enabled=True).do(None, lambda: calls.append(1)) == (None, False)
+    assert len(calls) == 2
+
+
+def test_async_calls_share_one_task():
+    flight = AsyncSingleFlight(enabled=True)
+    calls = []
+
+    async def slow():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return 'answer'
+
+    async def main():
+        return await asyncio.gather(*(flight.do('k', slow) for _ in range(4)))
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert [shared for _, shared in results] == [False, True, True, True]
+
+
+def test_a_late_reader_gets_the_whole_stream():
+    flights = StreamFlights(enabled=True)
+    producer = {}
+    flight, leader = flights.join('k', lambda flight: producer.setdefault('flight', flight))
+    assert leader and producer['flight'] is flight
+    flight.publish('Hello ')
+    late, late_leader = flights.join('k', lambda flight: pytest.fail('second producer started'))
+    assert late is flight and not late_leader
+    flight.publish('there')
+    flights.finish('k', flight)
+    assert list(flight.follow()) == list(late.follow()) == ['Hello ', 'there']
+    # Finished flights aren't joined again
+    assert flights.join('k', lambda flight: None)[1]
+
+
+def test_an_abandoned_stream_is_unregistered():
+    flights = StreamFlights(enabled=True)
+    flight, _ = flights.join('k', lambda flight: None)
+    assert not flights.abandoned('k', flight)
+    flights.leave(flight)
+    assert flights.abandoned('k', flight)
+    assert flights.join('k', lambda flight: None)[0] is not flight
+
+
+@pytest.fixture
+def across_workers(monkeypatch, tmp_path):
+    if coalesce.fcntl is None:
+        pytest.skip('needs POSIX file locks')
+    monkeypatch.setattr(coalesce, 'COALESCE_ACROSS_WORKERS', True)
+    monkeypatch.setattr(coalesce, 'COALESCE_LOCK_DIR', str(tmp_path / 'flights'))
+    monkeypatch.setattr(coalesce, 'COALESCE_WAIT_SECONDS', 0.2)
+
+
+def test_worker_lock_is_skipped_with_a_per_worker_cache(across_workers, monkeypatch):
+    monkeypatch.setattr(coalesce.response_cache, 'backend', MemoryBackend())
+    started = time.monotonic()
+    with worker_flight_lock('k') as first:
+        with worker_flight_lock('k') as second:
+            pass
+    assert (first, second) == (False, False)
+    assert time.monotonic() - started < 0.1  # nobody waited on a cache they can't read
+    assert not os.path.exists(coalesce.COALESCE_LOCK_DIR)
+
+
+def test_worker_lock_is_held_with_the_shared_cache(across_workers, monkeypatch, tmp_path):
+    monkeypatch.setattr(coalesce.response_cache, 'backend', SQLiteBackend(str(tmp_path / 'cache.db')))
+    with worker_flight_lock('k') as held:
+        assert held
+        # Another worker (another open file) can't take it
+        other = FlightLock('k')
+        assert not other.try_acquire()
+        other.release(False)
+    other = FlightLock('k')
+    assert other.try_acquire()
+    other.release(True)
+
+
+def test_identical_concurrent_chats_make_one_model_call(zara, client, fake_model):
+    fake_model.chat.completions.delay = 0.2
+    payload = {'messages': [{'role': 'user', 'content': 'What is coalescing?'}]}
+
+    def ask():
+        response = zara.app.test_client().post('/api/chat', json=payload)
+        return response.status_code, response.json['content']
+    results = run_together(4, ask)
+    assert results == [(200, 'Hello there friend')] * 4
+    assert len(fake_model.calls) == 1
+
+
+@pytest.fixture
+def shared_cache(across_workers, client, monkeypatch, tmp_path):
+    monkeypatch.setattr(coalesce.response_cache, 'backend', SQLiteBackend(str(tmp_path / 'cache.db')))
+    locks = []
+    real = coalesce._flight_lock
+    monkeypatch.setattr(coalesce, '_flight_lock', lambda key: locks.append(key) or real(key))
+    return locks
+
+
+def test_a_cold_request_is_one_cache_miss(zara, client, shared_cache):
+    payload = {'messages': [{'role': 'user', 'content': 'What is coalescing?'}]}
+    assert client.post('/api/chat', json=payload).status_code == 200
+    assert len(shared_cache) == 1  # took the lock, then re-checked the cache under it
+    assert (zara.response_cache.hits, zara.response_cache.misses) == (0, 1)
+    assert client.post('/api/chat', json=payload).status_code == 200
+    assert (zara.response_cache.hits, zara.response_cache.misses) == (1, 1)
+
+
+def test_a_stream_does_not_take_the_worker_lock(zara, client, shared_cache, fake_model):
+    response = client.post('/api/chat', json={
+        'messages': [{'role': 'user', 'content': 'What is coalescing?'}], 'stream': True})
+    assert response.data.endswith(b'data: [DONE]\n\n')
+    assert shared_cache == []
+    assert len(fake_model.calls) == 1
+    assert zara.response_cache.misses == 1
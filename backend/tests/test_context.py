@@ -0,0 +1,120 @@
+import pytest
+import context
+from context import (
+    RollingSummaryCache, build_context, split_history, message_tokens, estimate_tokens, MESSAGE_OVERHEAD_TOKENS,
+)
+
+SYSTEM = 'You are Zara.'
+
+
+def turns(count, words=20):
+    return [{'role': 'user' if n % 2 == 0 else 'assistant',
+             'content': f'Turn {n}. ' + 'word ' * words} for n in range(count)]
+
+
+@pytest.fixture(autouse=True)
+def fresh_summaries(monkeypatch):
+    cache = RollingSummaryCache(budget=context.SUMMARY_TOKEN_BUDGET)
+    monkeypatch.setattr(context, 'rolling_summaries', cache)
+    return cache
+
+
+def budget_for(messages):
+    """A budget that keeps exactly `messages` (SUMMARY_TOKEN_BUDGET comes off the top)"""
+    return context.SUMMARY_TOKEN_BUDGET + sum(message_tokens(message) for message in messages)
+
+
+def test_a_history_that_fits_is_passed_through(fresh_summaries):
+    history = turns(6)
+    prompt = build_context(SYSTEM, history, summary_key='chat')
+    assert prompt == [{'role': 'system', 'content': SYSTEM}] + history
+    assert fresh_summaries._summaries == {}
+
+
+def test_roles_other_than_user_are_sent_as_assistant():
+    prompt = build_context(SYSTEM, [{'role': 'bot', 'content': 'hi', 'id': 7}, {'role': 'user', 'content': 'yo'}])
+    assert prompt[1:] == [{'role': 'assistant', 'content': 'hi'}, {'role': 'user', 'content': 'yo'}]
+
+
+def test_the_newest_turns_win_over_budget():
+    history = turns(20)
+    budget = budget_for(history[-5:])
+    dropped, kept = split_history(history, budget)
+    assert kept == history[-5:]
+    assert dropped == history[:-5]
+    prompt = build_context(SYSTEM, history, budget=budget)
+    assert prompt == [{'role': 'system', 'content': SYSTEM}] + history[-5:]
+
+
+def test_the_system_prompt_and_latest_message_are_always_kept():
+    huge = {'role': 'user', 'content': 'word ' * 5000}
+    prompt = build_context(SYSTEM, turns(4) + [huge], budget=10)
+    assert prompt == [{'role': 'system', 'content': SYSTEM}, huge]
+
+
+def test_dropped_turns_fold_into_the_summary():
+    history = turns(12)
+    budget = budget_for(history[-4:])
+    prompt = build_context(SYSTEM, history, summary_key='chat', budget=budget)
+    assert prompt[0] == {'role': 'system', 'content': SYSTEM}
+    assert prompt[1]['role'] == 'system'
+    summary = prompt[1]['content']
+    assert summary.startswith('Summary of the earlier conversation:\n')
+    assert summary.count('\n- ') == 8
+    assert '- user: Turn 0.' in summary and '- assistant: Turn 7.' in summary
+    assert prompt[2:] == history[-4:]
+
+
+def test_each_dropped_turn_is_summarized_once(monkeypatch):
+    summarized = []
+    real = context.summarize_message
+    monkeypatch.setattr(context, 'summarize_message', lambda message: summarized.append(message) or real(message))
+    history = turns(12)
+    budget = budget_for(history[-4:])
+    first = build_context(SYSTEM, history, summary_key='chat', budget=budget)
+    assert len(summarized) == 8
+    # The same request again, then one more exchange: only the newly dropped turns are summarized
+    assert build_context(SYSTEM, history, summary_key='chat', budget=budget) == first
+    assert len(summarized) == 8
+    build_context(SYSTEM, turns(14), summary_key='chat', budget=budget)
+    assert len(summarized) == 10
+
+
+def test_the_summary_keeps_lines_for_turns_no_longer_loaded():
+    history = turns(12)
+    budget = budget_for(history[-4:])
+    build_context(SYSTEM, history, summary_key='chat', budget=budget)
+    # The client only sends a window of recent turns now
+    prompt = build_context(SYSTEM, history[6:] + turns(14)[12:], summary_key='chat', budget=budget)
+    assert '- user: Turn 0.' in prompt[1]['content']
+
+
+def test_the_summary_drops_its_oldest_lines_over_its_own_budget():
+    cache = RollingSummaryCache(budget=60)
+    summary = cache.update('chat', turns(10, words=5))
+    lines = summary.split('\n')
+    assert sum(estimate_tokens(line) for line in lines) <= 60
+    assert lines[-1].startswith('- assistant: Turn 9.')
+    assert not summary.startswith('- user: Turn 0.')
+
+
+def test_summaries_are_per_chat_and_can_be_invalidated():
+    cache = RollingSummaryCache()
+    cache.update('a', turns(2))
+    assert cache.update('b', []) == ''
+    cache.invalidate('a')
+    assert cache.update('a', []) == ''
+
+
+def test_a_stored_summary_replaces_the_rolling_one(fresh_summaries):
+    history = turns(12)
+    budget = budget_for(history[-4:])
+    prompt = build_context(SYSTEM, history, summary_key='chat', budget=budget, summary='- they like cats')
+    assert prompt[1]['content'] == 'Summary of the earlier conversation:\n- they like cats'
+    assert fresh_summaries._summaries == {}
+
+
+def test_token_estimates():
+    assert estimate_tokens('') == 0
+    assert estimate_tokens('Hello, world!') == 6  # 2 + 1 + 2 + 1: words cost a token per 4 characters
+    assert message_tokens({'role': 'user', 'content': 'hi'}) == 1 + MESSAGE_OVERHEAD_TOKENS
@@ -0,0 +1,83 @@
+def new_chat(client, headers, title='New Chat'):
+    return client.post('/api/chats', json={'title': title}, headers=headers).json['id']
+
+
+def say(client, headers, chat_id, text):
+    response = client.post('/api/chat', json={
+        'messages': [{'role': 'user', 'content': text}], 'chatId': chat_id}, headers=headers)
+    assert response.status_code == 200
+
+
+def revalidate(client, url, headers, etag):
+    return client.get(url, headers={**headers, 'If-None-Match': f'"{etag}"'})
+
+
+def test_an_unchanged_list_is_not_modified(client, auth):
+    headers = auth()
+    chat_id = new_chat(client, headers)
+    say(client, headers, chat_id, 'hello')
+    for url in ('/api/chats', f'/api/chats/{chat_id}/messages'):
+        first = client.get(url, headers=headers)
+        assert first.status_code == 200
+        assert first.headers['Cache-Control'] == 'private, no-cache'
+        etag, _ = first.get_etag()
+        second = revalidate(client, url, headers, etag)
+        assert second.status_code == 304 and second.data == b''
+        assert second.get_etag()[0] == etag
+
+
+def test_weak_tags_from_a_compressing_proxy_match(client, auth):
+    headers = auth()
+    etag, _ = client.get('/api/chats', headers=headers).get_etag()
+    response = client.get('/api/chats', headers={**headers, 'If-None-Match': f'W/"{etag}"'})
+    assert response.status_code == 304
+
+
+def test_a_new_message_changes_only_the_message_list(client, auth):
+    headers = auth()
+    chat_id = new_chat(client, headers, 'Named')
+    url = f'/api/chats/{chat_id}/messages'
+    messages_etag, _ = client.get(url, headers=headers).get_etag()
+    chats_etag, _ = client.get('/api/chats', headers=headers).get_etag()
+    say(client, headers, chat_id, 'hello')
+    assert revalidate(client, url, headers, messages_etag).status_code == 200
+    # Messages don't bump user.chats_version (the chat keeps its title)
+    assert revalidate(client, '/api/chats', headers, chats_etag).status_code == 304
+
+
+def test_naming_a_new_chat_changes_the_chat_list(client, auth):
+    headers = auth()
+    chat_id = new_chat(client, headers)
+    etag, _ = client.get('/api/chats', headers=headers).get_etag()
+    say(client, headers, chat_id, 'hello')
+    response = revalidate(client, '/api/chats', headers, etag)
+    assert response.status_code == 200
+    assert [chat['title'] for chat in response.json] == ['hello']
+
+
+def test_rename_create_and_delete_change_the_chat_list(client, auth):
+    headers = auth()
+    chat_id = new_chat(client, headers)
+    for change in (
+        lambda: client.put(f'/api/chats/{chat_id}', json={'title': 'Renamed'}, headers=headers),
+        lambda: new_chat(client, headers),
+        lambda: client.delete(f'/api/chats/{chat_id}', headers=headers),
+    ):
+        etag, _ = client.get('/api/chats', headers=headers).get_etag()
+        change()
+        assert revalidate(client, '/api/chats', headers, etag).status_code == 200
+
+
+def test_each_page_has_its_own_tag(client, auth):
+    headers = auth()
+    chat_id = new_chat(client, headers)
+    say(client, headers, chat_id, 'hello')
+    url = f'/api/chats/{chat_id}/messages'
+    full, _ = client.get(url, headers=headers).get_etag()
+    assert revalidate(client, f'{url}?limit=1', headers, full).status_code == 200
+
+
+def test_tags_are_per_user(client, auth):
+    alice, bob = auth('alice'), auth('bob')
+    etag, _ = client.get('/api/chats', headers=alice).get_etag()
+    assert revalidate(client, '/api/chats', bob, etag).status_code == 200
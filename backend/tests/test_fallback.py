@@ -0,0 +1,69 @@
+import json
+import os
+import pytest
+import fallback
+from fallback import FallbackResponder, compile_intents
+
+TABLE = {
+    'default': "Tell me more about '{message}'",
+    'intents': [
+        {'name': 'greeting', 'patterns': ['hello', 'hi'], 'response': 'greeting'},
+        {'name': 'identity', 'patterns': ['who are you'], 'response': 'identity'},
+        {'name': 'help', 'patterns': ['help'], 'response': 'help'},
+    ],
+}
+
+
+def write(path, table, mtime):
+    path.write_text(json.dumps(table) if isinstance(table, dict) else table, encoding='utf-8')
+    os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def intents(tmp_path):
+    path = tmp_path / 'intents.json'
+    write(path, TABLE, 1000)
+    return path
+
+
+@pytest.fixture(params=['scan', 'index'])
+def responder(request, intents, monkeypatch):
+    # The shipped table is small enough to be scanned; bigger ones use the keyword index
+    if request.param == 'index':
+        monkeypatch.setattr(fallback, 'SCAN_MAX_INTENTS', 0)
+    return FallbackResponder(str(intents), reload_interval=0)
+
+
+@pytest.mark.parametrize('message, reply', [
+    ('Hi!', 'greeting'),
+    ('so, WHO are you?', 'identity'),
+    ('hi, can you help', 'greeting'),        # the first-listed intent wins
+    ('who   are...you', 'identity'),         # phrases match on words, not spacing
+    ('what is this thing', "Tell me more about 'what is this thing'"),  # "this" is not "hi"
+    ('helpful tips', "Tell me more about 'helpful tips'"),
+])
+def test_patterns_match_whole_words(responder, message, reply):
+    assert responder.respond(message) == reply
+
+
+def test_edited_table_is_picked_up(responder, intents):
+    write(intents, dict(TABLE, default='fallback'), 2000)
+    assert responder.respond('anything') == 'fallback'
+
+
+def test_broken_edit_keeps_the_last_good_table(responder, intents):
+    write(intents, '{"intents": [', 2000)
+    assert responder.respond('hello') == 'greeting'
+
+
+def test_scan_and_index_agree_on_the_shipped_table(monkeypatch):
+    with open(fallback.FALLBACK_INTENTS_PATH, encoding='utf-8') as f:
+        table = json.load(f)
+    scan = compile_intents(table)
+    monkeypatch.setattr(fallback, 'SCAN_MAX_INTENTS', 0)
+    index = compile_intents(table)
+    assert scan[0] is not None and index[0] is None
+    for message in ('Hello there!', 'who are you, really?', 'sri made you', 'please help',
+                    'some python code', 'so stressed', 'this is sriracha', 'pythonic helpers',
+                    'what is your  name', 'HI!!', 'unrelated question'):
+        assert FallbackResponder.intent_index(scan, message) == FallbackResponder.intent_index(index, message)
@@ -0,0 +1,77 @@
+import asyncio
+import pytest
+from hedging import HedgedDispatcher
+from model_health import ModelHealthTracker, ModelsUnavailableError
+from tests.fakes import FakeClient, AsyncFakeClient
+
+MESSAGES = [{'role': 'user', 'content': 'hi'}]
+
+
+@pytest.fixture
+def dispatcher():
+    return HedgedDispatcher(default_delay=0.05, max_workers=4, health=ModelHealthTracker())
+
+
+def test_first_model_answers_without_hedging(dispatcher):
+    client = FakeClient(reply='fast')
+    model, completion = dispatcher.complete(client, ['a', 'b'], MESSAGES)
+    assert (model, completion.choices[0].message.content) == ('a', 'fast')
+    assert [call[0] for call in client.calls] == ['a']
+
+
+def test_failure_hands_over_to_the_next_model_at_once(dispatcher):
+    client = FakeClient(fail=['a'])
+    model, _ = dispatcher.complete(client, ['a', 'b'], MESSAGES)
+    assert model == 'b'
+    assert [call[0] for call in client.calls] == ['a', 'b']
+
+
+def test_slow_model_is_hedged_and_the_faster_reply_wins(dispatcher):
+    client = FakeClient(reply=lambda model, messages: model, delay={'a': 0.5, 'b': 0.0})
+    model, completion = dispatcher.complete(client, ['a', 'b'], MESSAGES)
+    assert model == 'b' and completion.choices[0].message.content == 'b'
+
+
+def test_every_model_failing_raises_the_last_error(dispatcher):
+    client = FakeClient(fail={'a': 'boom a', 'b': 'boom b'})
+    with pytest.raises(Exception, match='boom b'):
+        dispatcher.complete(client, ['a', 'b'], MESSAGES)
+
+
+def test_no_healthy_model_raises_models_unavailable(dispatcher):
+    with pytest.raises(ModelsUnavailableError):
+        dispatcher.complete(FakeClient(), [], MESSAGES)
+
+
+def test_outcomes_feed_the_breaker(dispatcher):
+    dispatcher.complete(FakeClient(fail=['a']), ['a', 'b'], MESSAGES)
+    snapshot = dispatcher.health.snapshot()
+    assert snapshot['a']['error_rate'] == 1.0 and snapshot['b']['error_rate'] == 0.0
+
+
+def test_async_hedge_cancels_the_losing_call(dispatcher):
+    client = AsyncFakeClient(reply=lambda model, messages: model, delay={'a': 5.0, 'b': 0.0})
+    model, completion = asyncio.run(dispatcher.complete_async(client, ['a', 'b'], MESSAGES))
+    assert model == 'b'
+    assert client.chat.completions.cancelled == ['a']
+
+
+def test_async_caller_cancellation_cancels_every_call(dispatcher):
+    client = AsyncFakeClient(delay=5.0)
+
+    async def cancel_midway():
+        task = asyncio.ensure_future(dispatcher.complete_async(client, ['a', 'b'], MESSAGES))
+        await asyncio.sleep(0.2)  # both models in flight by now
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0)
+
+    asyncio.run(cancel_midway())
+    assert sorted(client.chat.completions.cancelled) == ['a', 'b']
+
+
+def test_async_failure_falls_through(dispatcher):
+    client = AsyncFakeClient(fail=['a'])
+    model, _ = asyncio.run(dispatcher.complete_async(client, ['a', 'b'], MESSAGES))
+    assert model == 'b'
@@ -0,0 +1,90 @@
+from datetime import datetime
+import pytest
+from history import ChatHistoryCache
+from models import db, Message
+
+
+@pytest.fixture
+def chat(client, auth):
+    headers = auth()
+    chat_id = client.post('/api/chats', json={'title': 'History'}, headers=headers).json['id']
+    return headers, chat_id
+
+
+def say(client, headers, chat_id, text):
+    """The web client's server-history mode: only the new message and the chat id"""
+    response = client.post('/api/chat', json={'message': text, 'chatId': chat_id}, headers=headers)
+    assert response.status_code == 200
+    return response.json['content']
+
+
+def prompt_turns(fake_model):
+    """The conversation part of the last prompt sent to the model"""
+    return [(message['role'], message['content']) for message in fake_model.calls[-1][1][1:]]
+
+
+def write_from_another_worker(zara, chat_id, role, content):
+    with zara.app.app_context():
+        db.session.add(Message(chat_id=chat_id, role=role, content=content, timestamp=datetime.utcnow()))
+        db.session.commit()
+
+
+def test_the_prompt_is_rebuilt_from_stored_messages(client, chat, fake_model):
+    headers, chat_id = chat
+    fake_model.chat.completions.reply = lambda model, messages: f'Answer {len(messages)}'
+    say(client, headers, chat_id, 'My name is Ada')
+    say(client, headers, chat_id, 'What is my name?')
+    assert prompt_turns(fake_model) == [
+        ('user', 'My name is Ada'), ('assistant', 'Answer 2'), ('user', 'What is my name?')]
+
+
+def test_a_write_from_another_worker_is_picked_up(zara, client, chat, fake_model):
+    headers, chat_id = chat
+    say(client, headers, chat_id, 'first question')
+    write_from_another_worker(zara, chat_id, 'user', 'asked elsewhere')
+    write_from_another_worker(zara, chat_id, 'assistant', 'answered elsewhere')
+    say(client, headers, chat_id, 'second question')
+    assert prompt_turns(fake_model)[-3:] == [
+        ('user', 'asked elsewhere'), ('assistant', 'answered elsewhere'), ('user', 'second question')]
+
+
+def test_the_cache_reloads_only_when_the_newest_message_changes(zara, client, chat, monkeypatch):
+    headers, chat_id = chat
+    say(client, headers, chat_id, 'hello')
+    cache = ChatHistoryCache()
+    loads = []
+    real_load = cache._load
+    monkeypatch.setattr(cache, '_load', lambda chat_id: loads.append(chat_id) or real_load(chat_id))
+    with zara.app.app_context():
+        first = cache.get(chat_id)
+        assert cache.get(chat_id) == first
+        assert len(loads) == 1
+        # Appended by this worker after its own commit: still a hit
+        last_id = db.session.query(db.func.max(Message.id)).scalar()
+        write_from_another_worker(zara, chat_id, 'user', 'mine')
+        cache.append(chat_id, last_id + 1, 'user', 'mine')
+        assert cache.get(chat_id)[-1] == {'role': 'user', 'content': 'mine'}
+        assert len(loads) == 1
+        # Another worker's write bumps MAX(message.id): reloaded
+        write_from_another_worker(zara, chat_id, 'assistant', 'theirs')
+        assert cache.get(chat_id)[-1] == {'role': 'assistant', 'content': 'theirs'}
+        assert len(loads) == 2
+
+
+def test_history_is_limited_to_the_newest_messages(zara, client, chat):
+    headers, chat_id = chat
+    for n in range(6):
+        write_from_another_worker(zara, chat_id, 'user', f'message {n}')
+    with zara.app.app_context():
+        assert [m['content'] for m in ChatHistoryCache(limit=3).get(chat_id)] == [
+            'message 3', 'message 4', 'message 5']
+
+
+def test_someone_elses_chat_gives_no_history_and_no_write(zara, client, chat, auth, fake_model):
+    headers, chat_id = chat
+    say(client, headers, chat_id, 'my secret plan')
+    intruder = auth('mallory')
+    say(client, intruder, chat_id, 'what did they say?')
+    assert prompt_turns(fake_model) == [('user', 'what did they say?')]
+    messages = client.get(f'/api/chats/{chat_id}/messages', headers=headers).json
+    assert [m['content'] for m in messages] == ['my secret plan', 'Hello there friend']
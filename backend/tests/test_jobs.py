@@ -0,0 +1,171 @@
+import os
+import pytest
+import context
+from jobs import Job, JobRunner, ThreadQueue, SQLiteQueue
+from tests.conftest import wait_until
+
+
+@pytest.fixture(params=['thread', 'sqlite'])
+def backend(request, tmp_path):
+    if request.param == 'sqlite':
+        return SQLiteQueue(str(tmp_path / 'jobs.db'), poll=0.01)
+    return ThreadQueue()
+
+
+@pytest.fixture
+def runner(backend):
+    runner = JobRunner(backend, workers=1, max_attempts=3, backoff=0.01)
+    # A web process only queues sqlite jobs; start the workers worker.py would run
+    runner._ensure_started()
+    yield runner
+    runner.stop()
+
+
+def test_jobs_run_with_their_arguments(runner):
+    seen = []
+    runner.task('note')(lambda text: seen.append(text))
+    runner.enqueue('note', text='hello')
+    assert wait_until(lambda: runner.completed == 1)
+    assert seen == ['hello']
+    assert runner.stats()['queue_depth'] == 0
+
+
+def test_a_failing_job_is_retried_until_it_succeeds(runner):
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RuntimeError('upstream down')
+    runner.task('flaky')(flaky)
+    runner.enqueue('flaky')
+    assert wait_until(lambda: runner.completed == 1)
+    assert len(attempts) == 3
+    assert (runner.retried, runner.failed) == (2, 0)
+
+
+def test_a_job_out_of_attempts_fails(runner):
+    def broken():
+        raise RuntimeError('always')
+    runner.task('broken')(broken)
+    runner.enqueue('broken')
+    assert wait_until(lambda: runner.failed == 1)
+    assert (runner.retried, runner.completed) == (2, 0)
+
+
+def test_failed_sqlite_jobs_are_kept_for_inspection(tmp_path):
+    backend = SQLiteQueue(str(tmp_path / 'jobs.db'), poll=0.01)
+    runner = JobRunner(backend, workers=1, max_attempts=1)
+    runner.task('broken')(lambda: 1 / 0)
+    runner.enqueue('broken')
+    job = backend.claim(timeout=0)
+    runner._execute(job)
+    assert backend._connect().execute("SELECT status, attempts, error FROM jobs").fetchall() == [
+        ('failed', 1, 'division by zero')]
+
+
+def test_a_crashed_workers_job_is_handed_out_again(tmp_path):
+    backend = SQLiteQueue(str(tmp_path / 'jobs.db'), lease=0.05, poll=0.01)
+    backend.put(Job('note', {'text': 'hello'}))
+    first = backend.claim(timeout=0)
+    assert backend.claim(timeout=0) is None  # leased
+    assert wait_until(lambda: (again := backend.claim(timeout=0)) and again.id == first.id, timeout=1)
+
+
+def test_a_full_queue_runs_the_job_inline():
+    runner = JobRunner(ThreadQueue(max_size=1), workers=1)
+    runner._pid = os.getpid()  # no worker threads: the queue stays full
+    seen = []
+    runner.task('note')(lambda text: seen.append(text))
+    runner.enqueue('note', text='queued')
+    runner.enqueue('note', text='inline')
+    assert seen == ['inline']
+    assert runner.stats()['queue_depth'] == 1
+
+
+def claim_all(backend):
+    claimed = []
+    while (job := backend.claim(timeout=0)) is not None:
+        claimed.append(job.args['chat_id'])
+    return claimed
+
+
+def test_a_unique_job_is_queued_once_until_claimed(backend):
+    runner = JobRunner(backend, workers=1)
+    runner._pid = os.getpid()  # no worker threads: jobs stay queued
+    for chat_id in (1, 1, 2, 1):
+        runner.enqueue('summarize', unique=True, chat_id=chat_id)
+    assert claim_all(backend) == [1, 2]
+    # The claimed jobs may have read their chat before the newer turns: queue another
+    runner.enqueue('summarize', unique=True, chat_id=1)
+    runner.enqueue('summarize', unique=True, chat_id=1)
+    runner.enqueue('summarize', chat_id=1)
+    assert claim_all(backend) == [1, 1]
+
+
+def test_an_unknown_job_fails_without_retrying(runner):
+    runner.enqueue('missing')
+    assert wait_until(lambda: runner.failed == 1)
+    assert runner.retried == 0
+
+
+def new_chat(client, headers):
+    return client.post('/api/chats', json={}, headers=headers).json['id']
+
+
+def chat_titles(client, headers):
+    return [chat['title'] for chat in client.get('/api/chats', headers=headers).json]
+
+
+def test_the_chat_list_has_the_title_as_soon_as_the_reply_returns(zara, client, auth, monkeypatch):
+    # No job may run before the client refetches the list
+    monkeypatch.setattr(zara.background_jobs, 'enqueue', lambda *args, **kwargs: None)
+    headers = auth()
+    chat_id = new_chat(client, headers)
+    reply = client.post('/api/chat', json={
+        'messages': [{'role': 'user', 'content': 'Plan a weekend trip to the mountains'}],
+        'chatId': chat_id}, headers=headers)
+    assert reply.status_code == 200
+    assert chat_titles(client, headers) == ['Plan a weekend trip to the mou']
+
+
+def test_a_renamed_chat_keeps_its_name(zara, client, auth):
+    headers = auth()
+    chat_id = new_chat(client, headers)
+    client.put(f'/api/chats/{chat_id}', json={'title': 'Mine'}, headers=headers)
+    client.post('/api/chat', json={
+        'messages': [{'role': 'user', 'content': 'hello'}], 'chatId': chat_id}, headers=headers)
+    assert chat_titles(client, headers) == ['Mine']
+
+
+def test_the_model_title_replaces_the_first_message_title(zara, client, auth, fake_model, monkeypatch):
+    monkeypatch.setattr(zara, 'LLM_TITLES_ENABLED', True)
+    fake_model.chat.completions.reply = lambda model, messages: (
+        '"Mountain Weekend"' if messages[0]['content'] == zara.TITLE_PROMPT else 'Sounds fun')
+    headers = auth()
+    chat_id = new_chat(client, headers)
+    client.post('/api/chat', json={
+        'messages': [{'role': 'user', 'content': 'Plan a weekend trip to the mountains'}],
+        'chatId': chat_id}, headers=headers)
+    assert wait_until(lambda: chat_titles(client, headers) == ['Mountain Weekend'])
+
+
+def test_a_chat_is_summarized_once_enough_turns_leave_the_prompt(zara, client, auth, monkeypatch):
+    monkeypatch.setattr(zara, 'LLM_SUMMARY_ENABLED', True)
+    monkeypatch.setattr(zara, 'SUMMARY_MIN_NEW_MESSAGES', 4)
+    summarized = []
+
+    def run_now(name, unique=False, **args):
+        if name == 'summarize_chat':
+            summarized.append(turn)
+            zara.summarize_chat(**args)
+    monkeypatch.setattr(zara.background_jobs, 'enqueue', run_now)
+    headers = auth()
+    chat_id = new_chat(client, headers)
+    # A user message takes about a fifth of the prompt budget; the replies are short
+    long_text = 'word ' * ((context.CONTEXT_TOKEN_BUDGET - context.SUMMARY_TOKEN_BUDGET) // 5)
+    for turn in range(11):
+        client.post('/api/chat', json={'message': f'{turn} {long_text}', 'chatId': chat_id}, headers=headers)
+    # Turns start leaving the prompt at the fifth; after that the summary trails by
+    # fewer than four messages, and each turn pushes two more out
+    assert summarized == [6, 8, 10]
@@ -0,0 +1,69 @@
+import json
+from datetime import datetime
+import pytest
+import json_provider
+from models import db, User, Chat, Message
+
+# Microseconds both set and zero: isoformat() leaves out a zero fraction
+TIMESTAMPS = [datetime(2026, 3, 14, 15, 9, 26, 535897), datetime(2026, 3, 14, 15, 9, 26)]
+
+
+@pytest.fixture(params=['orjson', 'stdlib'])
+def provider(request, zara, monkeypatch):
+    if request.param == 'orjson':
+        if json_provider.orjson is None:
+            pytest.skip('orjson is not installed')
+    else:
+        monkeypatch.setattr(json_provider, 'orjson', None)
+    return zara.app.json
+
+
+@pytest.fixture
+def rows(zara, client):
+    """A chat without a title and its messages, as ORM objects and as list rows"""
+    with zara.app.app_context():
+        user = User(username='json', email='json@example.com', password='x')
+        db.session.add(user)
+        db.session.flush()
+        chat = Chat(user_id=user.id, title=None, created_at=TIMESTAMPS[0])
+        db.session.add(chat)
+        db.session.flush()
+        db.session.add_all(Message(chat_id=chat.id, role=role, content=content, timestamp=timestamp)
+                           for role, content, timestamp in zip(('user', 'assistant'), ('hé', '"quoted"\n'), TIMESTAMPS))
+        db.session.commit()
+        yield (
+            [chat], db.session.query(*(getattr(Chat, column) for column in Chat.LIST_COLUMNS)).all(),
+            Message.query.order_by(Message.id).all(),
+            db.session.query(*(getattr(Message, column) for column in Message.LIST_COLUMNS)).order_by(Message.id).all(),
+        )
+
+
+def test_list_rows_serialize_like_to_dict(zara, provider, rows):
+    chats, chat_rows, messages, message_rows = rows
+    with zara.app.app_context():
+        for objects, list_rows, model in ((chats, chat_rows, Chat), (messages, message_rows, Message)):
+            expected = [obj.to_dict() for obj in objects]
+            body = provider.response([model.row_dict(row) for row in list_rows]).get_data(as_text=True)
+            assert json.loads(body) == expected
+            # Same keys in the same order
+            assert [list(item) for item in json.loads(body)] == [list(item) for item in expected]
+
+
+def test_a_datetime_is_written_in_isoformat(zara, provider):
+    with zara.app.app_context():
+        for timestamp in TIMESTAMPS:
+            assert json.loads(provider.dumps({'at': timestamp})) == {'at': timestamp.isoformat()}
+            body = provider.response(at=timestamp).get_data(as_text=True)
+            assert json.loads(body) == {'at': timestamp.isoformat()}
+        assert json.loads(json_provider.dumps_bytes([TIMESTAMPS[0]])) == [TIMESTAMPS[0].isoformat()]
+
+
+def test_the_api_returns_the_same_payload(zara, client, auth):
+    headers = auth()
+    chat_id = client.post('/api/chats', json={'title': 'Parity'}, headers=headers).json['id']
+    client.post('/api/chat', json={'message': 'hello', 'chatId': chat_id}, headers=headers)
+    chats = client.get('/api/chats', headers=headers).json
+    messages = client.get(f'/api/chats/{chat_id}/messages', headers=headers).json
+    with zara.app.app_context():
+        assert chats == [db.session.get(Chat, chat_id).to_dict()]
+        assert messages == [message.to_dict() for message in Message.query.order_by(Message.id)]
@@ -0,0 +1,45 @@
+import re
+
+SAMPLE = re.compile(r'^(\w+)(\{.*\})? (\S+)$')
+CHAT = '{method="POST",endpoint="/api/chat"'
+
+
+def scrape(client):
+    """{'name{labels}': value} from /metrics (samples are process-wide, so tests compare deltas)"""
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    samples = {}
+    for line in response.get_data(as_text=True).splitlines():
+        if line and not line.startswith('#'):
+            name, labels, value = SAMPLE.match(line).groups()
+            samples[name + (labels or '')] = float(value)
+    return samples
+
+
+def grew(before, after, sample):
+    return after.get(sample, 0) - before.get(sample, 0)
+
+
+def test_metrics_are_prometheus_text(client):
+    response = client.get('/metrics')
+    assert response.mimetype == 'text/plain'
+    assert response.mimetype_params['version'] == '0.0.4'
+    body = response.get_data(as_text=True)
+    assert '# TYPE zara_http_requests_total counter' in body
+    assert '# TYPE zara_http_request_duration_seconds histogram' in body
+    assert body.endswith('\n')
+
+
+def test_a_chat_request_is_counted_and_timed(client, fake_model):
+    before = scrape(client)
+    response = client.post('/api/chat', json={'messages': [{'role': 'user', 'content': 'Count me'}]})
+    assert response.status_code == 200
+    after = scrape(client)
+
+    assert grew(before, after, f'zara_http_requests_total{CHAT},status="200"}}') == 1
+    assert grew(before, after, f'zara_http_request_duration_seconds_count{CHAT}}}') == 1
+    assert grew(before, after, f'zara_http_request_duration_seconds_bucket{CHAT},le="+Inf"}}') == 1
+    assert grew(before, after, f'zara_http_request_duration_seconds_sum{CHAT}}}') > 0
+    assert grew(before, after, 'zara_model_call_duration_seconds_count{model="%s",outcome="success"}'
+                % fake_model.calls[0][0]) == 1
+    assert grew(before, after, 'zara_cache_lookups_total{cache="response",result="miss"}') == 1
@@ -0,0 +1,72 @@
+import sqlite3
+import pytest
+from sqlalchemy import create_engine, inspect, text, or_, and_
+from datetime import datetime
+from migrations import MIGRATIONS, run_migrations, current_version
+from models import Message
+import check_query_plan
+from check_query_plan import HOT_QUERIES, explain, plan_ok, bounded_on
+
+LATEST = max(version for version, _, _ in MIGRATIONS)
+
+# zara.db as created by db.create_all() before migrations existed
+PRE_MIGRATION_SCHEMA = """
+CREATE TABLE user (id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL UNIQUE,
+                   email VARCHAR(120) NOT NULL UNIQUE, password VARCHAR(200) NOT NULL);
+CREATE TABLE chat (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES user(id),
+                   title VARCHAR(200), created_at DATETIME);
+CREATE TABLE message (id INTEGER PRIMARY KEY, chat_id INTEGER NOT NULL REFERENCES chat(id),
+                      role VARCHAR(20) NOT NULL, content TEXT NOT NULL, timestamp DATETIME);
+INSERT INTO user VALUES (1, 'old', 'old@example.com', 'x');
+INSERT INTO chat VALUES (1, 1, 'Old chat', '2025-01-01 10:00:00');
+INSERT INTO message VALUES (1, 1, 'user', 'remember the blue umbrella', '2025-01-01 10:00:01');
+"""
+
+
+@pytest.fixture
+def old_database(tmp_path):
+    path = tmp_path / 'old.db'
+    conn = sqlite3.connect(path)
+    conn.executescript(PRE_MIGRATION_SCHEMA)
+    conn.close()
+    engine = create_engine(f'sqlite:///{path}')
+    yield engine
+    engine.dispose()
+
+
+def test_old_database_is_upgraded_in_place(old_database):
+    assert run_migrations(old_database) == list(range(1, LATEST + 1))
+    assert current_version(old_database) == LATEST
+
+    inspector = inspect(old_database)
+    assert {'summary', 'summary_message_id', 'version'} <= {c['name'] for c in inspector.get_columns('chat')}
+    assert 'chats_version' in {c['name'] for c in inspector.get_columns('user')}
+    assert 'ix_message_chat_id_timestamp' in {i['name'] for i in inspector.get_indexes('message')}
+    with old_database.connect() as conn:
+        assert conn.execute(text("SELECT title, version FROM chat")).one() == ('Old chat', 0)
+        # Migration 3 indexed the messages that were already there
+        assert conn.execute(text("SELECT rowid FROM message_fts WHERE message_fts MATCH 'umbrella'")).scalar() == 1
+
+
+def test_migrations_run_once(old_database):
+    run_migrations(old_database)
+    assert run_migrations(old_database) == []
+
+
+def test_hot_queries_are_served_by_their_indexes(zara):
+    with zara.app.app_context():
+        for name, build, index_name, bound in HOT_QUERIES:
+            plan = explain(build())
+            assert plan_ok(plan, index_name, bound), (name, plan)
+
+
+def test_cursor_without_a_row_value_bound_fails_the_check(zara):
+    # The OR form only matches the chat_id prefix of the index: every older row is scanned
+    with zara.app.app_context():
+        ts = datetime(2026, 1, 1)
+        query = check_query_plan.message_list_query(1).filter(
+            or_(Message.timestamp < ts, and_(Message.timestamp == ts, Message.id < 5))
+        ).order_by(Message.timestamp.desc(), Message.id.desc()).limit(51)
+        plan = explain(query)
+    assert not bounded_on(plan, 'ix_message_chat_id_timestamp', 'timestamp')
+    assert not plan_ok(plan, 'ix_message_chat_id_timestamp', 'timestamp')
@@ -0,0 +1,88 @@
+import pytest
+import model_health
+from model_health import ModelHealthTracker, CLOSED, OPEN, HALF_OPEN
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(model_health, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def health(clock):
+    return ModelHealthTracker()
+
+
+def fail(health, model, times, error='500 server error'):
+    for _ in range(times):
+        health.record_failure(model, Exception(error))
+
+
+def test_breaker_stays_closed_below_the_minimum_samples(health):
+    fail(health, 'a', model_health.HEALTH_MIN_SAMPLES - 1)
+    assert health.order(['a', 'b']) == ['b', 'a']  # degraded, not skipped
+    assert health.snapshot()['a']['state'] == CLOSED
+
+
+def test_breaker_opens_on_error_rate_and_skips_the_model(health):
+    fail(health, 'a', model_health.HEALTH_MIN_SAMPLES)
+    assert health.snapshot()['a']['state'] == OPEN
+    assert health.order(['a', 'b']) == ['b']
+
+
+def test_half_open_lets_one_probe_through(health, clock):
+    fail(health, 'a', model_health.HEALTH_MIN_SAMPLES)
+    clock.now += model_health.BREAKER_COOLDOWN_SECONDS + 1
+    assert health.order(['a']) == ['a']
+    assert health.snapshot()['a']['state'] == HALF_OPEN
+    assert health.order(['a']) == []  # the probe is still out
+
+    health.record_success('a', 0.1)
+    assert health.snapshot()['a']['state'] == CLOSED
+
+
+def test_failed_probe_reopens_the_breaker(health, clock):
+    fail(health, 'a', model_health.HEALTH_MIN_SAMPLES)
+    clock.now += model_health.BREAKER_COOLDOWN_SECONDS + 1
+    health.order(['a'])
+    fail(health, 'a', 1)
+    assert health.snapshot()['a']['state'] == OPEN
+    assert health.order(['a']) == []
+
+
+def test_rate_limits_back_off_exponentially(health, clock):
+    base = model_health.RATE_LIMIT_BACKOFF_SECONDS
+    fail(health, 'a', 1, '429 Rate limit exceeded')
+    assert health.snapshot()['a']['rate_limited_for_s'] == base
+    fail(health, 'a', 1, '429 Rate limit exceeded')
+    assert health.snapshot()['a']['rate_limited_for_s'] == base * 2
+
+    clock.now += base * 2 + 1
+    assert 'a' in health.order(['a'])
+
+
+def test_retry_after_header_sets_the_backoff(health):
+    class Response:
+        headers = {'retry-after': '7'}
+
+    error = Exception('429 Rate limit')
+    error.response = Response()
+    health.record_failure('a', error)
+    assert health.snapshot()['a']['rate_limited_for_s'] == 7
+
+
+def test_old_outcomes_leave_the_window(health, clock):
+    fail(health, 'a', 2)
+    clock.now += model_health.HEALTH_WINDOW_SECONDS + 1
+    assert health.snapshot()['a']['samples'] == 0
+    assert health.order(['a', 'b']) == ['a', 'b']
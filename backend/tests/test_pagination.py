@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import insert
+from models import db, Message
+from pagination import encode_cursor, decode_cursor, InvalidCursor
+
+START = datetime(2026, 1, 1)
+
+
+@pytest.fixture
+def chat(client, auth, zara):
+    headers = auth()
+    chat_id = client.post('/api/chats', json={'title': 'Long chat'}, headers=headers).json['id']
+    # Three messages per timestamp, so pages have to break ties on id
+    with zara.app.app_context():
+        db.session.execute(insert(Message), [{
+            'chat_id': chat_id, 'role': 'user', 'content': f'm{n}',
+            'timestamp': START + timedelta(seconds=n // 3),
+        } for n in range(25)])
+        db.session.commit()
+    return chat_id, headers
+
+
+def walk(client, url, headers, field, limit=4):
+    """Follow X-Before-Cursor from the newest page to the oldest"""
+    pages, cursor = [], None
+    while True:
+        query = f'?limit={limit}' + (f'&before={cursor}' if cursor else '')
+        response = client.get(url + query, headers=headers)
+        assert response.status_code == 200
+        pages.append([item[field] for item in response.json])
+        cursor = response.headers.get('X-Before-Cursor')
+        if not cursor:
+            return pages
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(START, 42)) == (START, 42)
+    with pytest.raises(InvalidCursor):
+        decode_cursor('not-a-cursor')
+
+
+def test_walking_back_visits_every_message_once_in_order(client, chat):
+    chat_id, headers = chat
+    pages = walk(client, f'/api/chats/{chat_id}/messages', headers, 'content')
+    assert pages[0] == ['m21', 'm22', 'm23', 'm24']
+    assert [content for page in reversed(pages) for content in page] == [f'm{n}' for n in range(25)]
+
+
+def test_after_cursor_returns_only_newer_messages(client, chat):
+    chat_id, headers = chat
+    url = f'/api/chats/{chat_id}/messages'
+    first = client.get(url + '?limit=5', headers=headers)
+    older = client.get(url + f"?limit=5&before={first.headers['X-Before-Cursor']}", headers=headers)
+    newer = client.get(url + f"?limit=5&after={older.headers['X-After-Cursor']}", headers=headers)
+    assert [m['content'] for m in newer.json] == [m['content'] for m in first.json]
+
+
+def test_without_paging_parameters_the_whole_chat_is_returned(client, chat):
+    chat_id, headers = chat
+    response = client.get(f'/api/chats/{chat_id}/messages', headers=headers)
+    assert len(response.json) == 25 and 'X-Before-Cursor' not in response.headers
+
+
+def test_chat_list_pages_newest_first(client, auth):
+    headers = auth()
+    for n in range(5):
+        client.post('/api/chats', json={'title': f'c{n}'}, headers=headers)
+    pages = walk(client, '/api/chats', headers, 'title', limit=2)
+    assert pages == [['c4', 'c3'], ['c2', 'c1'], ['c0']]
+
+
+def test_bad_cursor_and_limit_are_rejected(client, chat):
+    chat_id, headers = chat
+    assert client.get(f'/api/chats/{chat_id}/messages?before=xyz', headers=headers).status_code == 400
+    assert client.get(f'/api/chats/{chat_id}/messages?limit=ten', headers=headers).status_code == 400
@@ -0,0 +1,113 @@
+import os
+import sys
+import subprocess
+import pytest
+import rate_limit
+from rate_limit import RateLimiter, MemoryBackend, SQLiteBackend, client_ip, utc_day, DAY_SECONDS
+
+PROXY = '10.0.0.1'  # the reverse proxy every request arrives from
+NOW = 1_800_000_000.0
+
+
+@pytest.fixture
+def limiter():
+    return RateLimiter(MemoryBackend(), enabled=True)
+
+
+def guest_chat(client, forwarded_for=None):
+    headers = {'X-Forwarded-For': forwarded_for} if forwarded_for else {}
+    return client.post('/api/chat', json={'messages': [{'role': 'user', 'content': 'hello'}]},
+                       headers=headers, environ_base={'REMOTE_ADDR': PROXY})
+
+
+def test_the_proxy_appended_entry_is_the_client(monkeypatch):
+    monkeypatch.setattr(rate_limit, 'RATE_LIMIT_PROXY_HOPS', 1)
+    assert client_ip(PROXY, '203.0.113.7') == '203.0.113.7'
+    # Whatever the client sent comes first; the proxy appends the real address
+    assert client_ip(PROXY, '1.2.3.4, 203.0.113.7') == '203.0.113.7'
+    assert client_ip(PROXY, None) == PROXY
+
+
+def test_multi_hop_takes_the_outermost_trusted_proxy_entry(monkeypatch):
+    monkeypatch.setattr(rate_limit, 'RATE_LIMIT_PROXY_HOPS', 2)
+    # spoofed, client (added by the CDN), CDN (added by the load balancer)
+    assert client_ip(PROXY, '1.2.3.4, 203.0.113.7, 198.51.100.2') == '203.0.113.7'
+    # Fewer entries than trusted hops: the header can't be trusted at all
+    assert client_ip(PROXY, '203.0.113.7') == PROXY
+
+
+def test_no_proxy_ignores_the_header(monkeypatch):
+    monkeypatch.setattr(rate_limit, 'RATE_LIMIT_PROXY_HOPS', 0)
+    assert client_ip('203.0.113.7', '1.2.3.4') == '203.0.113.7'
+
+
+def test_rotating_a_spoofed_header_shares_one_bucket(zara, client, monkeypatch, limiter):
+    monkeypatch.setattr(zara, 'rate_limiter', limiter)
+    monkeypatch.setattr(rate_limit, 'RATE_LIMIT_PROXY_HOPS', 1)
+    statuses = [guest_chat(client, f'1.2.3.{n}, 203.0.113.7').status_code for n in range(6)]
+    assert statuses[:rate_limit.GUEST_LIMITS.burst] == [200] * rate_limit.GUEST_LIMITS.burst
+    assert set(statuses[rate_limit.GUEST_LIMITS.burst:]) == {429}
+    # A different client behind the same proxy has its own bucket
+    assert guest_chat(client, '198.51.100.9').status_code == 200
+
+
+def test_guests_behind_the_proxy_are_not_throttled_together(zara, client, monkeypatch, limiter):
+    monkeypatch.setattr(zara, 'rate_limiter', limiter)
+    monkeypatch.setattr(rate_limit, 'RATE_LIMIT_PROXY_HOPS', 1)
+    assert all(guest_chat(client, f'203.0.113.{n}').status_code == 200 for n in range(10))
+
+
+def test_empty_bucket_rejects_with_retry_after(zara, client, monkeypatch, limiter):
+    monkeypatch.setattr(zara, 'rate_limiter', limiter)
+    for _ in range(rate_limit.GUEST_LIMITS.burst):
+        assert guest_chat(client, '203.0.113.7').status_code == 200
+    response = guest_chat(client, '203.0.113.7')
+    assert response.status_code == 429
+    assert response.json['reason'] == 'rate'
+    assert int(response.headers['Retry-After']) >= 1
+
+
+def test_bucket_refills_at_the_sustained_rate(limiter):
+    key = limiter.key_for(None, '203.0.113.7')
+    limits = limiter.limits_for(key)
+    for _ in range(limits.burst):
+        assert limiter.check(key, now=NOW) is None
+    assert limiter.check(key, now=NOW).reason == 'rate'
+    assert limiter.check(key, now=NOW + 1 / limits.rate) is None
+
+
+def test_daily_quota_resets_at_midnight_utc(limiter):
+    key = limiter.key_for('42', None)
+    limiter.charge(key, rate_limit.USER_LIMITS.daily_tokens, now=NOW)
+    rejection = limiter.check(key, now=NOW)
+    assert rejection.reason == 'quota'
+    assert rejection.retry_after == int((utc_day(NOW) + 1) * DAY_SECONDS - NOW + 0.999)
+    assert limiter.check(key, now=(utc_day(NOW) + 1) * DAY_SECONDS) is None
+
+
+def test_users_and_guests_have_separate_limits(limiter):
+    assert limiter.key_for('42', '203.0.113.7') == 'user:42'
+    assert limiter.key_for(None, '203.0.113.7') == 'ip:203.0.113.7'
+    assert limiter.limits_for('user:42') is rate_limit.USER_LIMITS
+    assert limiter.limits_for('ip:203.0.113.7') is rate_limit.GUEST_LIMITS
+
+
+def test_sqlite_backend_is_shared_across_instances(tmp_path):
+    path = str(tmp_path / 'rate_limit.db')
+    first, second = RateLimiter(SQLiteBackend(path), True), RateLimiter(SQLiteBackend(path), True)
+    key = 'ip:203.0.113.7'
+    burst = first.limits_for(key).burst
+    for n in range(burst):
+        assert (first if n % 2 else second).check(key, now=NOW) is None
+    assert first.check(key, now=NOW).reason == 'rate'
+    assert second.check(key, now=NOW).reason == 'rate'
+
+
+def test_importing_the_app_opens_no_store(tmp_path):
+    # A fresh interpreter: the test session imported the app long ago
+    env = dict(os.environ, RATE_LIMIT_BACKEND='sqlite', RATE_LIMIT_PATH=str(tmp_path / 'rate_limit.db'),
+               RESPONSE_CACHE_BACKEND='sqlite', RESPONSE_CACHE_PATH=str(tmp_path / 'response_cache.db'),
+               LAZY_INIT='true')
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, '-c', 'import app'], cwd=backend_dir, env=env, check=True, capture_output=True)
+    assert sorted(os.listdir(tmp_path)) == []
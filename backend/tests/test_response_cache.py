@@ -0,0 +1,70 @@
+import time
+from response_cache import ResponseCache, MemoryBackend, SQLiteBackend, normalize_prompt
+
+MODELS = ['a', 'b']
+GREETING = {'role': 'assistant', 'content': "Hello! I'm Zara ✨. How can I help you today? 😊"}
+
+
+def user(text):
+    return {'role': 'user', 'content': text}
+
+
+def test_normalize_prompt_folds_case_spacing_and_trailing_punctuation():
+    assert normalize_prompt('  Who   are you?? ') == normalize_prompt('who are you')
+
+
+def test_single_prompt_and_greeting_prefixed_prompt_are_cacheable():
+    assert ResponseCache.key_for(MODELS, [user('hi')])
+    assert ResponseCache.key_for(MODELS, [GREETING, user('hi')])
+
+
+def test_the_opening_turns_are_part_of_the_key():
+    plain = ResponseCache.key_for(MODELS, [user('hi')])
+    greeted = ResponseCache.key_for(MODELS, [GREETING, user('hi')])
+    preamble = {'role': 'assistant', 'content': 'Answer in French'}
+    other = ResponseCache.key_for(MODELS, [preamble, user('hi')])
+    assert len({plain, greeted, other}) == 3
+    assert ResponseCache.scope_for([user('hi')]) == ''
+    assert ResponseCache.scope_for([GREETING, user('hi')]) != ResponseCache.scope_for([preamble, user('hi')])
+
+
+def test_history_bypasses_the_cache():
+    assert ResponseCache.key_for(MODELS, [user('hi'), {'role': 'assistant', 'content': 'hello'}, user('hi')]) is None
+    assert ResponseCache.key_for(MODELS, [GREETING, user('hi'), GREETING]) is None
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryBackend(max_entries=2)
+    backend.set('a', 'A', 0.1, 60)
+    backend.set('b', 'B', 0.1, 60)
+    backend.get('a')
+    backend.set('c', 'C', 0.1, 60)
+    assert backend.get('b') is None and backend.get('a') == ('A', 0.1)
+
+
+def test_sqlite_backend_expires_and_caps_entries(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'cache.db'), max_entries=2)
+    backend.set('old', 'x', 0.1, -1)
+    assert backend.get('old') is None
+    for key in ('a', 'b', 'c'):
+        backend.set(key, key.upper(), 0.1, 60)
+        time.sleep(0.01)
+    assert backend.get('a') is None and backend.get('c') == ('C', 0.1)
+
+
+def test_frontend_payload_is_answered_from_the_cache(client, fake_model, zara):
+    # The web client always sends its canned greeting ahead of the first question
+    payload = {'messages': [GREETING, user('What can you do?')]}
+    first = client.post('/api/chat', json=payload)
+    second = client.post('/api/chat', json=payload)
+    assert first.status_code == second.status_code == 200
+    assert first.json['content'] == second.json['content'] == 'Hello there friend'
+    assert len(fake_model.calls) == 1
+    assert zara.response_cache.stats()['hits'] == 1
+
+
+def test_a_different_preamble_does_not_reuse_the_answer(client, fake_model):
+    client.post('/api/chat', json={'messages': [GREETING, user('What can you do?')]})
+    client.post('/api/chat', json={'messages': [
+        {'role': 'assistant', 'content': 'I only answer in French.'}, user('What can you do?')]})
+    assert len(fake_model.calls) == 2
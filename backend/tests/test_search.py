@@ -0,0 +1,79 @@
+import pytest
+from sqlalchemy import insert, update
+from models import db, Message
+from search import fts5_query
+
+
+def add_chat(client, zara, headers, title, *contents):
+    chat_id = client.post('/api/chats', json={'title': title}, headers=headers).json['id']
+    with zara.app.app_context():
+        db.session.execute(insert(Message), [
+            {'chat_id': chat_id, 'role': 'user', 'content': content} for content in contents])
+        db.session.commit()
+    return chat_id
+
+
+def search(client, headers, q, **params):
+    return client.get('/api/search', query_string={'q': q, **params}, headers=headers)
+
+
+@pytest.fixture
+def alice(client, auth, zara):
+    headers = auth('alice')
+    add_chat(client, zara, headers, 'Trips', 'We are running late for the train to Lisbon',
+             'Pack the blue umbrella', 'Lisbon trams are yellow')
+    return headers
+
+
+def test_words_match_with_stemming_and_snippets(client, alice):
+    response = search(client, alice, 'run')
+    assert response.status_code == 200
+    [hit] = response.json
+    assert hit['chat_title'] == 'Trips' and '[running]' in hit['snippet']
+
+
+def test_last_word_matches_as_a_prefix(client, alice):
+    assert [hit['snippet'] for hit in search(client, alice, 'umbr').json] == ['Pack the blue [umbrella]']
+
+
+def test_every_word_must_match(client, alice):
+    assert len(search(client, alice, 'lisbon').json) == 2
+    assert len(search(client, alice, 'lisbon trams').json) == 1
+
+
+def test_other_users_messages_are_never_returned(client, alice, auth, zara):
+    bob = auth('bob')
+    add_chat(client, zara, bob, 'Bob', 'my own umbrella story')
+    assert search(client, bob, 'umbrella').json[0]['chat_title'] == 'Bob'
+    assert len(search(client, bob, 'lisbon').json) == 0
+
+
+def test_query_syntax_is_searched_for_not_parsed(client, alice):
+    for q in ('"lisbon', 'lisbon OR', 'NEAR(lisbon', 'owner:u1', '*'):
+        assert search(client, alice, q).status_code == 200
+    assert fts5_query(7, 'a* OR "b"') == 'owner:"u7" AND content:("a" "OR" "b"*)'
+    assert fts5_query(7, '!!!') is None
+
+
+def test_results_page_with_next_offset(client, alice):
+    first = search(client, alice, 'lisbon', limit=1)
+    assert len(first.json) == 1 and first.headers['X-Next-Offset'] == '1'
+    second = search(client, alice, 'lisbon', limit=1, offset=1)
+    assert len(second.json) == 1 and 'X-Next-Offset' not in second.headers
+    assert first.json[0]['id'] != second.json[0]['id']
+
+
+def test_index_follows_edits_and_deletes(client, alice, zara):
+    [hit] = search(client, alice, 'umbrella').json
+    with zara.app.app_context():
+        db.session.execute(update(Message).where(Message.id == hit['id']).values(content='Pack the red raincoat'))
+        db.session.commit()
+    assert search(client, alice, 'umbrella').json == []
+    assert len(search(client, alice, 'raincoat').json) == 1
+
+    client.delete(f"/api/chats/{hit['chat_id']}", headers=alice)
+    assert search(client, alice, 'lisbon').json == []
+
+
+def test_empty_query_is_rejected(client, alice):
+    assert search(client, alice, '  ').status_code == 400
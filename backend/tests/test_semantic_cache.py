@@ -0,0 +1,75 @@
+import pytest
+from semantic_cache import SemanticCache, content_signature
+
+PARAPHRASES = [
+    ("Who are you?", "who are you"),
+    ("What is the capital of France", "what's the capital of france"),
+    ("how do I sort a list in python", "how can I sort a list in python"),
+    ("what is machine learning", "what's machine learning"),
+    ("Explain recursion.", "explain  recursion please"),
+    ("write a haiku about the sea", "write me a haiku about the sea"),
+    ("tell me a joke", "tell me a joke please"),
+]
+
+# One meaningful word, number or symbol apart; several embed above 0.85
+NEAR_MISSES = [
+    ("sort a list in ascending order", "sort a list in descending order"),
+    ("how do I sort a list in ascending order in python", "how do I sort a list in descending order in python"),
+    ("what is 2 + 2", "what is 2 + 3"),
+    ("what is 2 + 2", "what is 2 * 2"),
+    ("convert 10 km to miles", "convert 100 km to miles"),
+    ("convert km to miles", "convert miles to km"),
+    ("how do I sort a list in python", "how do I sort a list in java"),
+    ("what year did world war 1 end", "what year did world war 2 end"),
+    ("is it safe to eat raw eggs", "is it not safe to eat raw eggs"),
+    ("what is my name", "what is your name"),
+    ("can you help me", "can i help you"),
+]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SemanticCache(path=str(tmp_path / 'semantic.npz'), capacity=16)
+
+
+@pytest.mark.parametrize('stored, asked', PARAPHRASES)
+def test_paraphrase_reuses_the_answer(cache, stored, asked):
+    cache.set(stored, 'answer', 0.5)
+    assert cache.get(asked) == 'answer'
+
+
+@pytest.mark.parametrize('stored, asked', NEAR_MISSES)
+def test_one_word_apart_is_a_miss(cache, stored, asked):
+    cache.set(stored, 'answer', 0.5)
+    assert cache.get(asked) is None
+
+
+def test_signature_keeps_content_words_numbers_and_operators():
+    assert content_signature("What's 2 + 2?") == "what 2 + 2"
+    assert content_signature("How can I sort a list") == content_signature("how do i sort the list")
+
+
+def test_entries_only_match_within_their_scope(cache):
+    cache.set('what can you do', 'greeted answer', 0.5, scope='greeting')
+    assert cache.get('what can you do', scope='greeting') == 'greeted answer'
+    assert cache.get('what can you do') is None
+    assert cache.get('what can you do', scope='crafted preamble') is None
+
+
+def test_least_recently_used_entry_is_replaced(tmp_path):
+    cache = SemanticCache(path=str(tmp_path / 'semantic.npz'), capacity=2)
+    cache.set('first question', 'one', 0.1)
+    cache.set('second question', 'two', 0.1)
+    cache.get('first question')
+    cache.set('third question', 'three', 0.1)
+    assert cache.get('second question') is None
+    assert cache.get('first question') == 'one'
+
+
+def test_index_survives_a_restart(tmp_path):
+    path = str(tmp_path / 'semantic.npz')
+    cache = SemanticCache(path=path, capacity=4)
+    cache.set('how do I sort a list in python', 'sorted()', 0.5, scope='greeting')
+    cache.persist()
+    reloaded = SemanticCache(path=path, capacity=4)
+    assert reloaded.get('how can I sort a list in python', scope='greeting') == 'sorted()'
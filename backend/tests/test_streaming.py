@@ -0,0 +1,80 @@
+import json
+import pytest
+from coalesce import stream_flights
+from tests.conftest import wait_until
+
+
+@pytest.fixture
+def chat(client, auth):
+    headers = auth()
+    chat_id = client.post('/api/chats', json={'title': 'Streams'}, headers=headers).json['id']
+    return headers, chat_id
+
+
+def stream(client, headers, chat_id, text='Tell me a story', **kwargs):
+    return client.post('/api/chat', json={
+        'messages': [{'role': 'user', 'content': text}], 'chatId': chat_id, 'stream': True,
+    }, headers=headers, **kwargs)
+
+
+def frames(body):
+    return [frame[len('data: '):] for frame in body.decode('utf-8').split('\n\n') if frame]
+
+
+def saved(client, headers, chat_id):
+    return [(message['role'], message['content'])
+            for message in client.get(f'/api/chats/{chat_id}/messages', headers=headers).json]
+
+
+def test_tokens_arrive_as_sse_frames(client, chat, fake_model):
+    headers, chat_id = chat
+    response = stream(client, headers, chat_id)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    *tokens, done = frames(response.data)
+    assert [json.loads(token)['content'] for token in tokens] == ['Hello ', 'there ', 'friend ']
+    assert done == '[DONE]'
+    assert fake_model.calls[0][2] is True  # asked the model for a stream
+
+
+def test_one_question_and_answer_are_saved(client, chat):
+    headers, chat_id = chat
+    stream(client, headers, chat_id).get_data()
+    assert saved(client, headers, chat_id) == [('user', 'Tell me a story'), ('assistant', 'Hello there friend ')]
+
+
+def test_a_client_that_leaves_mid_stream_keeps_the_partial_reply(client, chat, fake_model):
+    headers, chat_id = chat
+    fake_model.chat.completions.reply = 'one two three four five six seven eight'
+    fake_model.chat.completions.chunk_delay = 0.05
+    response = stream(client, headers, chat_id, buffered=False)
+    body = iter(response.response)
+    assert json.loads(frames(next(body))[0]) == {'content': 'one '}
+    response.close()  # the client disconnects
+
+    assert saved(client, headers, chat_id) == [('user', 'Tell me a story'), ('assistant', 'one ')]
+    # Nobody reads the flight any more: the producer stops and unregisters it
+    assert wait_until(lambda: not stream_flights._flights)
+    assert fake_model.chat.completions.streamed < 8
+
+
+def test_a_model_failure_saves_the_fallback_reply(zara, client, chat, fake_model):
+    headers, chat_id = chat
+    fake_model.chat.completions.fail = dict.fromkeys(zara.MODEL_NAMES, '500 Internal Server Error')
+    response = stream(client, headers, chat_id, text='hello')
+    *replies, done = frames(response.data)
+    assert done == '[DONE]'
+    assert len(replies) == 1
+    reply = json.loads(replies[0])['content']
+    assert reply.endswith(zara.FALLBACK_MODE_NOTE)
+    assert saved(client, headers, chat_id) == [('user', 'hello'), ('assistant', reply)]
+
+
+def test_a_cached_reply_is_replayed_as_one_frame(client, chat, fake_model):
+    headers, chat_id = chat
+    stream(client, headers, chat_id).get_data()
+    replay = frames(stream(client, headers, chat_id).data)
+    assert replay == [json.dumps({'content': 'Hello there friend '}), '[DONE]']
+    assert len(fake_model.calls) == 1
+    assert len(saved(client, headers, chat_id)) == 4
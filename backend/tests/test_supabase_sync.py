@@ -0,0 +1,104 @@
+import json
+import pytest
+import supabase_sync
+from supabase_sync import Outbox, SupabaseSyncWorker
+from tests.conftest import wait_until
+from tests.fakes import FakeSupabase
+
+DEAD_PID = 2 ** 30  # above any pid_max, so never a live process
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(supabase_sync, 'SYNC_MAX_ATTEMPTS', 2)
+    monkeypatch.setattr(supabase_sync, 'SYNC_BACKOFF_SECONDS', 0.01)
+    monkeypatch.setattr(supabase_sync, 'SYNC_FLUSH_INTERVAL_SECONDS', 0.05)
+
+
+def journal(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_acked_rows_are_compacted_away(tmp_path):
+    outbox = Outbox(str(tmp_path))
+    outbox.append('r1', 'messages', {'n': 1})
+    outbox.append('r2', 'messages', {'n': 2})
+    outbox.ack(['r1'])
+    assert [record.get('id') for record in journal(outbox.path)] == ['r1', 'r2', None]
+    outbox.ack(['r2'])
+    assert journal(outbox.path) == []
+
+
+def test_rows_of_a_dead_process_are_adopted(tmp_path):
+    orphan = tmp_path / f'supabase_outbox.{DEAD_PID}.jsonl'
+    orphan.write_text(
+        '{"id":"r1","table":"messages","row":{"n":1}}\n'
+        '{"id":"r2","table":"users","row":{"n":2}}\n'
+        '{"ack":["r1"]}\n'
+        '{"id":"r3","table":"mess'  # torn final line from a crash
+    )
+    outbox = Outbox(str(tmp_path))
+    assert outbox.adopt_orphans() == [('r2', 'users', {'n': 2})]
+    assert not orphan.exists()
+    assert [record['id'] for record in journal(outbox.path)] == ['r2']
+
+
+def test_live_process_outbox_is_left_alone(tmp_path):
+    outbox = Outbox(str(tmp_path))
+    other = Outbox(str(tmp_path))  # same pid: our own file
+    other.append('r1', 'messages', {})
+    assert outbox.adopt_orphans() == []
+
+
+def test_rows_are_batched_per_table(tmp_path):
+    client = FakeSupabase()
+    worker = SupabaseSyncWorker(client, workers=1, batch_size=10, outbox_dir=str(tmp_path))
+    for n in range(3):
+        worker.enqueue('messages', {'n': n})
+    worker.enqueue('users', {'email': 'a@example.com'})
+    assert wait_until(lambda: worker.synced == 4)
+    worker.stop()
+    assert sorted((table, len(rows)) for table, rows in client.inserts) == [('messages', 3), ('users', 1)]
+    assert journal(worker.outbox.path) == []
+
+
+def test_failed_batch_stays_in_the_outbox_for_the_next_start(tmp_path):
+    client = FakeSupabase(down=True)
+    worker = SupabaseSyncWorker(client, workers=1, outbox_dir=str(tmp_path))
+    worker.enqueue('messages', {'n': 1})
+    assert wait_until(lambda: worker.failed == 1)
+    worker.stop()
+    assert [record['row'] for record in journal(worker.outbox.path)] == [{'n': 1}]
+    assert worker.stats()['failed'] == 1
+
+
+@pytest.fixture
+def configured(zara, monkeypatch):
+    """Supabase settings present; returns a function installing the client factory"""
+    from clients import LazyClient
+    monkeypatch.setattr(zara, 'SUPABASE_URL', 'https://project.supabase.co')
+    monkeypatch.setattr(zara, 'SUPABASE_KEY', 'key')
+
+    def install(factory):
+        monkeypatch.setattr(zara, 'supabase', LazyClient('Supabase client', factory))
+        monkeypatch.setattr(zara, 'supabase_sync', LazyClient('Supabase sync', zara.create_supabase_sync))
+    return install
+
+
+def test_sync_is_disabled_when_the_client_cannot_be_built(zara, configured):
+    def missing_package():
+        raise ImportError("No module named 'supabase'")
+    configured(missing_package)
+    zara.mirror_to_supabase({'n': 1})
+    # No worker, so no outbox collecting rows that could never drain
+    assert zara.supabase_sync.get() is None
+
+
+def test_registration_is_mirrored_through_a_job(client, zara, configured):
+    fake = FakeSupabase()
+    configured(lambda: fake)
+    client.post('/api/register', json={'username': 'sam', 'email': 'sam@example.com', 'password': 'password'})
+    assert wait_until(lambda: fake.inserts)
+    assert fake.inserts[0][0] == 'users' and fake.inserts[0][1][0]['email'] == 'sam@example.com'
+    zara.supabase_sync.get().stop()
@@ -0,0 +1,85 @@
+import gzip
+import json
+import pytest
+
+HEADER = {'type': 'zara-export', 'version': 1}
+
+
+def jsonl(*items):
+    return ''.join(json.dumps(item) + '\n' for item in items).encode('utf-8')
+
+
+def import_file(client, headers, body, mimetype='application/x-ndjson'):
+    return client.post('/api/import', data=body, headers={**headers, 'Content-Type': mimetype})
+
+
+def chat_titles(client, headers):
+    return sorted(chat['title'] for chat in client.get('/api/chats', headers=headers).json)
+
+
+def test_export_then_import_copies_every_chat(client, auth):
+    headers = auth()
+    client.post('/api/chat', json={'messages': [{'role': 'user', 'content': 'hello'}],
+                                   'chatId': client.post('/api/chats', json={'title': 'First'},
+                                                         headers=headers).json['id']},
+                headers=headers)
+    export = client.get('/api/export', headers=headers)
+    assert export.status_code == 200 and export.mimetype == 'application/gzip'
+    lines = [json.loads(line) for line in gzip.decompress(export.data).decode().splitlines()]
+    assert [line['type'] for line in lines] == ['zara-export', 'chat', 'message', 'message']
+
+    other = auth('other')
+    response = import_file(client, other, export.data, 'application/gzip')
+    assert response.status_code == 201
+    assert response.json['imported'] == {'chats': 1, 'messages': 2}
+    chat_id = client.get('/api/chats', headers=other).json[0]['id']
+    messages = client.get(f'/api/chats/{chat_id}/messages', headers=other).json
+    assert [m['content'] for m in messages] == ['hello', 'Hello there friend']
+
+
+def test_missing_title_becomes_new_chat(client, auth):
+    headers = auth()
+    response = import_file(client, headers, jsonl(HEADER, {'type': 'chat', 'id': 'a'}))
+    assert response.status_code == 201
+    assert chat_titles(client, headers) == ['New Chat']
+
+
+@pytest.mark.parametrize('line', [
+    {'type': 'chat', 'id': [1]},
+    {'type': 'chat', 'id': {'n': 1}},
+    {'type': 'chat', 'id': True},
+    {'type': 'chat'},
+    {'type': 'chat', 'id': 2, 'title': 42},
+    {'type': 'chat', 'id': 2, 'title': {'text': 'x'}},
+    {'type': 'chat', 'id': 2, 'title': ['x']},
+    {'type': 'chat', 'id': 2, 'created_at': 'yesterday'},
+    {'type': 'chat', 'id': 1},  # duplicate of the chat on line 2
+    {'type': 'message', 'chat_id': [1], 'role': 'user', 'content': 'x'},
+    {'type': 'message', 'chat_id': 99, 'role': 'user', 'content': 'x'},
+    {'type': 'message', 'chat_id': 1, 'role': ['user'], 'content': 'x'},
+    {'type': 'message', 'chat_id': 1, 'role': 'system', 'content': 'x'},
+    {'type': 'message', 'chat_id': 1, 'role': 'user', 'content': 5},
+    {'type': 'message', 'chat_id': 1, 'role': 'user', 'content': 'x', 'timestamp': 17},
+    {'type': 'mystery'},
+    ['not', 'an', 'object'],
+])
+def test_malformed_line_is_rejected_with_its_line_number(client, auth, line):
+    headers = auth()
+    body = jsonl(HEADER, {'type': 'chat', 'id': 1, 'title': 'Kept out'}, line)
+    response = import_file(client, headers, body)
+    assert response.status_code == 400
+    assert response.json['msg'].startswith('Line 3:')
+    # One transaction: nothing from the file was imported
+    assert chat_titles(client, headers) == []
+
+
+def test_invalid_json_and_version_are_rejected(client, auth):
+    headers = auth()
+    assert import_file(client, headers, b'{"type": "zara-export", "version": 1}\n{oops\n').json['msg'] == \
+        'Line 2: not valid JSON'
+    assert import_file(client, headers, jsonl({'type': 'zara-export', 'version': 9})).status_code == 400
+
+
+def test_upload_that_is_not_gzip_is_rejected(client, auth):
+    response = import_file(client, auth(), b'plain text', 'application/gzip')
+    assert response.status_code == 400
@@ -0,0 +1,173 @@
+import json
+import zlib
+from datetime import datetime
+from sqlalchemy import insert, select
+from models import db, Chat, Message
+from etags import bump_user_chats
+
+# Account export/import as gzip'd JSON Lines. Line 1 is a header, then one
+# line per chat, then every message (ordered by chat and time):
+#   {"type": "zara-export", "version": 1, "exported_at": "..."}
+#   {"type": "chat", "id": 7, "title": "...", "created_at": "..."}
+#   {"type": "message", "chat_id": 7, "role": "user", "content": "...", "timestamp": "..."}
+# Chat ids are only references inside the file; an import creates new chats.
+EXPORT_VERSION = 1
+# Rows fetched per server-side cursor round-trip, and rows per executemany on import
+BATCH_SIZE = 1000
+# Uncompressed bytes gathered before a chunk is compressed and sent
+CHUNK_BYTES = 64 * 1024
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def export_lines(user_id):
+    """Every export line for a user, read through server-side cursors"""
+    yield {'type': 'zara-export', 'version': EXPORT_VERSION, 'exported_at': datetime.utcnow().isoformat()}
+
+    chats = db.session.execute(
+        select(Chat.id, Chat.title, Chat.created_at)
+        .where(Chat.user_id == user_id)
+        .order_by(Chat.created_at, Chat.id)
+        .execution_options(yield_per=BATCH_SIZE)
+    )
+    for row in chats:
+        yield {'type': 'chat', 'id': row.id, 'title': row.title, 'created_at': _iso(row.created_at)}
+
+    messages = db.session.execute(
+        select(Message.chat_id, Message.role, Message.content, Message.timestamp)
+        .join(Chat, Message.chat_id == Chat.id)
+        .where(Chat.user_id == user_id)
+        .order_by(Message.chat_id, Message.timestamp, Message.id)
+        .execution_options(yield_per=BATCH_SIZE)
+    )
+    for row in messages:
+        yield {'type': 'message', 'chat_id': row.chat_id, 'role': row.role,
+               'content': row.content, 'timestamp': _iso(row.timestamp)}
+
+
+def export_gzip(user_id):
+    """
+    Generator of gzip bytes for a user's whole history. Rows are serialized
+    and compressed as they come off the cursor, so memory stays flat however
+    many messages the account holds.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    buffer = []
+    size = 0
+    for line in export_lines(user_id):
+        encoded = (json.dumps(line, ensure_ascii=False) + '\n').encode('utf-8')
+        buffer.append(encoded)
+        size += len(encoded)
+        if size >= CHUNK_BYTES:
+            chunk = compressor.compress(b''.join(buffer))
+            buffer, size = [], 0
+            if chunk:
+                yield chunk
+    yield compressor.compress(b''.join(buffer)) + compressor.flush()
+
+
+def _parse_time(value, line_number):
+    if value is None:
+        return datetime.utcnow()
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ImportFormatError(f"Line {line_number}: invalid timestamp {value!r}")
+
+
+def _is_reference(value):
+    """Chat ids in a file are JSON numbers or strings; anything else can't be a dict key or matched"""
+    return isinstance(value, (int, str)) and not isinstance(value, bool)
+
+
+def _insert_chats(user_id, pending, chat_ids):
+    """Insert a batch of chats in one statement and map file ids to the new ids"""
+    if not pending:
+        return
+    new_ids = db.session.execute(
+        insert(Chat).returning(Chat.id, sort_by_parameter_order=True),
+        [{'user_id': user_id, 'title': title, 'created_at': created_at} for _, title, created_at in pending],
+    ).scalars().all()
+    for (file_id, _, _), new_id in zip(pending, new_ids):
+        chat_ids[file_id] = new_id
+    pending.clear()
+
+
+def _insert_messages(pending):
+    if pending:
+        db.session.execute(insert(Message), pending)
+        pending.clear()
+
+
+def import_lines(user_id, lines):
+    """
+    Import an export into the user's account with batched executemany
+    inserts, in one transaction: a malformed file imports nothing.
+    Returns {'chats': n, 'messages': n}.
+    """
+    chat_ids = {}  # chat id in the file -> new chat id
+    pending_chats, pending_messages = [], []
+    counts = {'chats': 0, 'messages': 0}
+    try:
+        for line_number, raw in enumerate(lines, 1):
+            if not raw.strip():
+                continue
+            try:
+                item = json.loads(raw)
+            except ValueError:
+                raise ImportFormatError(f"Line {line_number}: not valid JSON")
+            if not isinstance(item, dict):
+                raise ImportFormatError(f"Line {line_number}: expected a JSON object")
+
+            kind = item.get('type')
+            if kind == 'zara-export':
+                if item.get('version') != EXPORT_VERSION:
+                    raise ImportFormatError(f"Unsupported export version: {item.get('version')}")
+            elif kind == 'chat':
+                if not _is_reference(item.get('id')) or item['id'] in chat_ids:
+                    raise ImportFormatError(f"Line {line_number}: chat needs a unique id (number or string)")
+                title = item.get('title')
+                if title is not None and not isinstance(title, str):
+                    raise ImportFormatError(f"Line {line_number}: chat title must be a string")
+                # Reserve the id now so duplicates inside one batch are caught too
+                chat_ids[item['id']] = None
+                pending_chats.append((item['id'], (title or 'New Chat')[:200],
+                                      _parse_time(item.get('created_at'), line_number)))
+                counts['chats'] += 1
+                if len(pending_chats) >= BATCH_SIZE:
+                    _insert_chats(user_id, pending_chats, chat_ids)
+            elif kind == 'message':
+                if not _is_reference(item.get('chat_id')) or item['chat_id'] not in chat_ids:
+                    raise ImportFormatError(f"Line {line_number}: message for unknown chat {item.get('chat_id')!r}")
+                role, content = item.get('role'), item.get('content')
+                if not isinstance(role, str) or role not in ('user', 'assistant') or not isinstance(content, str):
+                    raise ImportFormatError(f"Line {line_number}: message needs a role and string content")
+                # Messages follow all chats, so any chats still buffered go in first
+                _insert_chats(user_id, pending_chats, chat_ids)
+                pending_messages.append({
+                    'chat_id': chat_ids[item['chat_id']],
+                    'role': role,
+                    'content': content,
+                    'timestamp': _parse_time(item.get('timestamp'), line_number),
+                })
+                counts['messages'] += 1
+                if len(pending_messages) >= BATCH_SIZE:
+                    _insert_messages(pending_messages)
+            else:
+                raise ImportFormatError(f"Line {line_number}: unknown line type {kind!r}")
+
+        _insert_chats(user_id, pending_chats, chat_ids)
+        _insert_messages(pending_messages)
+        if counts['chats']:
+            db.session.execute(bump_user_chats(user_id))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return counts
@@ -0,0 +1,23 @@
+"""
+Background job worker for JOBS_BACKEND=sqlite.
+
+    JOBS_BACKEND=sqlite python worker.py
+
+Web workers record post-response jobs (chat titles, summaries, Supabase
+mirroring) in the shared SQLite queue at JOBS_PATH; this process runs them,
+JOBS_WORKERS at a time, with the same environment as the app. Run one or more
+next to gunicorn/uvicorn on the same host.
+"""
+import sys
+from app import background_jobs, init_db_if_needed
+from jobs import JOBS_BACKEND
+from logs import get_logger
+
+log = get_logger('worker')
+
+if __name__ == '__main__':
+    if background_jobs.in_process:
+        log.error("JOBS_BACKEND is not 'sqlite'; the web workers run their own jobs", backend=JOBS_BACKEND)
+        sys.exit(1)
+    init_db_if_needed()
+    background_jobs.work()
@@ -39,6 +39,8 @@ export default function Home() {
     const [chats, setChats] = useState<Chat[]>([]);
     const [searchTerm, setSearchTerm] = useState('');
     const [chatId, setChatId] = useState<number | null>(null);
+    // X-Before-Cursor of the oldest loaded page; null once the whole chat is loaded
+    const [olderCursor, setOlderCursor] = useState<string | null>(null);
     const [selectedFile, setSelectedFile] = useState<{ name: string, type: string, base64: string } | null>(null);
 
     const [isSidebarCollapsed, setIsSidebarCollapsed] = useState(false);
@@ -122,16 +124,39 @@ export default function Home() {
         const authToken = token || localStorage.getItem('zara_token');
         if (!authToken) return;
         try {
-            const res = await fetch(`${API_URL}/chats/${id}/messages`, {
+            const res = await fetch(`${API_URL}/chats/${id}/messages?limit=100`, {
                 headers: { Authorization: `Bearer ${authToken}` }
             });
             if (res.ok) {
                 const data = await res.json();
+                setOlderCursor(res.headers.get('X-Before-Cursor'));
                 setMessages(data.length > 0 ? data : [{ role: 'assistant', content: "Hello! I'm Zara ✨. How can I help you today? 😊" }]);
             }
         } catch (error) { console.error(error); }
     };
 
+    const loadOlderMessages = async () => {
+        const authToken = localStorage.getItem('zara_token');
+        if (!authToken || !chatId || !olderCursor) return;
+        try {
+            const res = await fetch(`${API_URL}/chats/${chatId}/messages?limit=100&before=${encodeURIComponent(olderCursor)}`, {
+                headers: { Authorization: `Bearer ${authToken}` }
+            });
+            if (res.ok) {
+                const data = await res.json();
+                const container = messagesContainerRef.current;
+                const distanceFromBottom = container ? container.scrollHeight - container.scrollTop : 0;
+                shouldAutoScrollRef.current = false;
+                setOlderCursor(res.headers.get('X-Before-Cursor'));
+                setMessages(prev => [...data, ...prev]);
+                // Keep the message the user was reading in place
+                requestAnimationFrame(() => {
+                    if (container) container.scrollTop = container.scrollHeight - distanceFromBottom;
+                });
+            }
+        } catch (error) { console.error(error); }
+    };
+
     const loadChat = (id: number) => {
         setChatId(id);
         fetchMessages(id);
@@ -149,6 +174,7 @@ export default function Home() {
             if (res.ok) {
                 const newChat = await res.json();
                 setChatId(newChat.id);
+                setOlderCursor(null);
                 setChats(prev => [newChat, ...prev]);
                 setMessages([{ role: 'assistant', content: "Hello! I'm Zara ✨. How can I help you today? 😊" }]);
             }
@@ -166,6 +192,7 @@ export default function Home() {
                 setChats(prev => prev.filter(c => c.id !== id));
                 if (chatId === id) {
                     setChatId(null);
+                    setOlderCursor(null);
                     setMessages([{ role: 'assistant', content: "Hello! I'm Zara ✨. How can I help you today? 😊" }]);
                 }
             }
@@ -450,6 +477,11 @@ export default function Home() {
 
                 <div ref={messagesContainerRef} className={styles.messagesArea}>
                     <div className={styles.messagesContainer}>
+                        {chatId && olderCursor && (
+                            <button className={styles.loadOlderBtn} onClick={loadOlderMessages}>
+                                Load older messages
+                            </button>
+                        )}
                         {messages.map((msg, idx) => (
                             <div key={idx} className={clsx(
                                 styles.messageRow,